@@ -45,7 +45,7 @@ class TelegramSourceAdapter:
         result = await self._parser.parse_channel(
             channel_identifier=channel_identifier,
             output_dir=output_dir,
-            **{k: v for k, v in kwargs.items() if k in ("mode", "date_from", "date_to", "keyword_filter", "max_media_size_mb", "dry_run", "zip_output", "cleanup_temp", "run_id")},
+            **{k: v for k, v in kwargs.items() if k in ("mode", "date_from", "date_to", "keyword_filter", "max_media_size_mb", "dry_run", "zip_output", "cleanup_temp", "run_id", "materialize_export", "media_concurrency", "state_backend", "backfill")},
         )
         channel_id = result.get("summary", {}).get("channel_id") or ""
         username = result.get("summary", {}).get("channel_username") or ""
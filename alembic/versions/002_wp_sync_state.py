@@ -0,0 +1,35 @@
+"""WordPress Source: wp_sync_state (watermark incremental sync)
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "002"
+down_revision: Union[str, Sequence[str], None] = "001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS wp_sync_state (
+            site_id             VARCHAR(64) PRIMARY KEY REFERENCES wp_sites(site_id),
+            last_modified_gmt   TIMESTAMPTZ,
+            last_run_id         VARCHAR(32),
+            updated_at          TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+    op.execute(
+        "COMMENT ON TABLE wp_sync_state IS "
+        "'Watermark incremental sync: последняя дата изменения контента на WP по сайту'"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS wp_sync_state")
@@ -0,0 +1,28 @@
+"""WordPress Source: wp_content.content_hash (пропуск неизменённых строк при upsert)
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "003"
+down_revision: Union[str, Sequence[str], None] = "002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE wp_content ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)")
+    op.execute(
+        "COMMENT ON COLUMN wp_content.content_hash IS "
+        "'sha256 исходного JSON объекта WP; совпал — строка не перезаписывается'"
+    )
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE wp_content DROP COLUMN IF EXISTS content_hash")
@@ -0,0 +1,28 @@
+"""WordPress Source: wp_content.raw_json_z (сжатый исходный JSON, политика compressed)
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "004"
+down_revision: Union[str, Sequence[str], None] = "003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE wp_content ADD COLUMN IF NOT EXISTS raw_json_z BYTEA")
+    op.execute(
+        "COMMENT ON COLUMN wp_content.raw_json_z IS "
+        "'Исходный JSON объекта WP, сжатый zstd/gzip (политика compressed); raw_json при этом NULL'"
+    )
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE wp_content DROP COLUMN IF EXISTS raw_json_z")
@@ -0,0 +1,40 @@
+"""WordPress Source: wp_media (зеркало медиафайлов постов и страниц)
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "005"
+down_revision: Union[str, Sequence[str], None] = "004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS wp_media (
+            site_id             VARCHAR(64) NOT NULL REFERENCES wp_sites(site_id),
+            source_url          TEXT NOT NULL,
+            sha256              CHAR(64) NOT NULL,
+            local_path          TEXT NOT NULL,
+            size_bytes          BIGINT,
+            mime_type           VARCHAR(128),
+            synced_at           TIMESTAMPTZ NOT NULL,
+            PRIMARY KEY (site_id, source_url)
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS idx_wp_media_sha256 ON wp_media(sha256)")
+    op.execute(
+        "COMMENT ON TABLE wp_media IS "
+        "'Локальные копии медиа постов/страниц: source_url -> local_path (относительно каталога зеркала)'"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS wp_media")
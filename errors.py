@@ -17,3 +17,4 @@ WP_AUTH_ERROR = "WP_AUTH_ERROR"  # 401/403 при обращении к WP REST
 WP_RATE_LIMIT = "WP_RATE_LIMIT"  # 429 или превышение лимита запросов
 WP_NETWORK_ERROR = "WP_NETWORK_ERROR"  # таймаут, 5xx, соединение отклонено
 WP_DATA_FORMAT_ERROR = "WP_DATA_FORMAT_ERROR"  # неожиданная структура ответа или невалидный JSON
+WP_INCREMENTAL_STATE_ERROR = "WP_INCREMENTAL_STATE_ERROR"  # чтение/запись wp_sync_state (watermark incremental sync)
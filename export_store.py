@@ -0,0 +1,397 @@
+"""Сегментированное append-only хранилище сообщений экспорта.
+
+Каждый батч сообщений (страница GetHistoryRequest) пишется отдельным
+JSONL-сегментом в `segments/`, а в `manifest.json` хранятся список сегментов
+и счётчики. Запись батча — O(размер батча), а не O(размер канала).
+`export.json` собирается из сегментов только по запросу (`materialize`).
+
+Рядом лежат `state.json` и `media-index.json`; вместо всех трёх можно вести
+один SQLite-файл (`export_store_sqlite.SqliteExportStore`), см. `open_export_store`.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, MutableMapping, Optional, Set
+
+from jsonio import dumps, loads
+
+log = logging.getLogger("tg_parser.export_store")
+
+MANIFEST_NAME = "manifest.json"
+SEGMENTS_DIR = "segments"
+MANIFEST_VERSION = 1
+STATE_NAME = "state.json"
+MEDIA_INDEX_NAME = "media-index.json"
+
+STATE_BACKENDS = ("json", "sqlite")
+
+
+def _utc_now_iso() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _atomic_write_text(path: Path, text: str) -> None:
+    """Записать файл через временный файл и os.replace (без полузаписанных файлов)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def _msg_id(m: Dict[str, Any]) -> int:
+    return int(m.get("id", 0))
+
+
+def _read_json(path: Path, default: Any) -> Any:
+    if not path.exists():
+        return default
+    try:
+        return loads(path.read_bytes())
+    except (OSError, ValueError):
+        return default
+
+
+def write_export_json(
+    path: Path,
+    channel_info: Optional[Dict[str, Any]],
+    messages: Iterable[Dict[str, Any]],
+    export_date: Optional[str] = None,
+) -> int:
+    """Потоково записать export.json (формат совпадает с `json.dump(..., indent=2)`).
+
+    Args:
+        path: Путь к export.json.
+        channel_info: Блок channel_info.
+        messages: Сообщения в порядке возрастания id.
+        export_date: Значение export_date (по умолчанию — текущее время).
+
+    Returns:
+        Число записанных сообщений.
+    """
+    tmp = path.with_name(path.name + ".tmp")
+    total = 0
+    with tmp.open("w", encoding="utf-8") as f:
+        f.write("{\n")
+        f.write('  "channel_info": ' + dumps(channel_info, pretty=True).replace("\n", "\n  "))
+        f.write(',\n  "messages": [')
+        for m in messages:
+            f.write(",\n    " if total else "\n    ")
+            f.write(dumps(m, pretty=True).replace("\n", "\n    "))
+            total += 1
+        f.write("\n  ]" if total else "]")
+        f.write(',\n  "export_date": ' + dumps(export_date or _utc_now_iso()))
+        f.write(',\n  "total_messages": ' + str(total))
+        f.write("\n}")
+    os.replace(tmp, path)
+    return total
+
+
+class SegmentedExportStore:
+    """Append-only хранилище сообщений канала: JSONL-сегменты + manifest.json.
+
+    Структура внутри каталога экспорта:
+    - `segments/seg-000001.jsonl` — сообщения одного батча, по одному JSON на строку (по возрастанию id);
+    - `manifest.json` — channel_info, список сегментов (name, count, min_id, max_id) и счётчики.
+
+    Если в каталоге есть только `export.json` старого формата, при первой записи
+    он импортируется как начальный сегмент.
+    """
+
+    backend = "json"
+
+    def __init__(self, export_dir: Path, channel_info: Optional[Dict[str, Any]] = None) -> None:
+        self.export_dir = export_dir
+        self.segments_dir = export_dir / SEGMENTS_DIR
+        self.manifest_path = export_dir / MANIFEST_NAME
+        self.export_json_path = export_dir / "export.json"
+        self.state_path = export_dir / STATE_NAME
+        self.media_index_path = export_dir / MEDIA_INDEX_NAME
+        self._manifest = self._load_manifest()
+        if channel_info and not self._manifest.get("channel_info"):
+            self._manifest["channel_info"] = channel_info
+
+    # --- manifest ---
+
+    def _empty_manifest(self) -> Dict[str, Any]:
+        return {
+            "version": MANIFEST_VERSION,
+            "channel_info": None,
+            "segments": [],
+            "next_segment": 1,
+            "messages_total": 0,
+            "media_total": 0,
+            "last_message_id": 0,
+            "updated_at": None,
+            "materialized_at": None,
+        }
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        if not self.manifest_path.exists():
+            return self._empty_manifest()
+        try:
+            data = loads(self.manifest_path.read_bytes())
+        except (OSError, ValueError) as e:
+            log.warning("manifest.json повреждён (%s), сегменты будут пересканированы", e)
+            return self._rebuild_manifest_from_segments()
+        manifest = self._empty_manifest()
+        manifest.update(data if isinstance(data, dict) else {})
+        return manifest
+
+    def _rebuild_manifest_from_segments(self) -> Dict[str, Any]:
+        """Восстановить manifest по файлам сегментов (если manifest потерян или битый)."""
+        manifest = self._empty_manifest()
+        max_seq = 0
+        for seg_path in sorted(self.segments_dir.glob("seg-*.jsonl")):
+            messages = list(self._read_segment(seg_path))
+            if not messages:
+                continue
+            max_seq = max(max_seq, int(seg_path.stem.split("-")[-1]))
+            manifest["segments"].append(self._segment_entry(seg_path.name, messages))
+        manifest["next_segment"] = max_seq + 1
+        self._recount(manifest)
+        return manifest
+
+    def _save_manifest(self) -> None:
+        self._manifest["updated_at"] = _utc_now_iso()
+        _atomic_write_text(self.manifest_path, dumps(self._manifest, pretty=True))
+
+    @staticmethod
+    def _segment_entry(name: str, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        ids = [_msg_id(m) for m in messages]
+        return {
+            "name": name,
+            "count": len(messages),
+            "media_count": sum(len(m.get("media_files") or []) for m in messages),
+            "min_id": min(ids),
+            "max_id": max(ids),
+        }
+
+    @staticmethod
+    def _recount(manifest: Dict[str, Any]) -> None:
+        segs = manifest["segments"]
+        manifest["messages_total"] = sum(s["count"] for s in segs)
+        manifest["media_total"] = sum(s.get("media_count", 0) for s in segs)
+        manifest["last_message_id"] = max((s["max_id"] for s in segs), default=0)
+
+    # --- свойства ---
+
+    @property
+    def has_segments(self) -> bool:
+        return bool(self._manifest["segments"])
+
+    @property
+    def has_messages(self) -> bool:
+        return self.has_segments
+
+    @property
+    def index_path(self) -> Path:
+        """Файл-индекс хранилища (manifest.json)."""
+        return self.manifest_path
+
+    @property
+    def channel_info(self) -> Optional[Dict[str, Any]]:
+        return self._manifest.get("channel_info")
+
+    @property
+    def messages_total(self) -> int:
+        return int(self._manifest["messages_total"])
+
+    @property
+    def media_total(self) -> int:
+        return int(self._manifest["media_total"])
+
+    @property
+    def last_message_id(self) -> int:
+        return int(self._manifest["last_message_id"])
+
+    @property
+    def segments_count(self) -> int:
+        return len(self._manifest["segments"])
+
+    # --- чтение ---
+
+    @staticmethod
+    def _read_segment(path: Path) -> Iterator[Dict[str, Any]]:
+        with path.open("r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield loads(line)
+                except ValueError:
+                    # Хвост, оборванный аварийным завершением: пропускаем строку.
+                    log.warning("Пропущена повреждённая строка в сегменте %s", path.name)
+
+    def _legacy_export(self) -> Optional[Dict[str, Any]]:
+        """export.json старого формата, если сегментов ещё нет."""
+        if self.has_segments or not self.export_json_path.exists():
+            return None
+        try:
+            data = loads(self.export_json_path.read_bytes())
+        except (OSError, ValueError):
+            return None
+        return data if isinstance(data, dict) else None
+
+    def iter_messages(self) -> Iterator[Dict[str, Any]]:
+        """Все сообщения в порядке сегментов (без сортировки и дедупликации)."""
+        legacy = self._legacy_export()
+        if legacy is not None:
+            yield from legacy.get("messages") or []
+            return
+        for seg in self._manifest["segments"]:
+            yield from self._read_segment(self.segments_dir / seg["name"])
+
+    def message_ids(self) -> Set[int]:
+        """Множество id сохранённых сообщений (для пропуска уже выгруженных)."""
+        return {_msg_id(m) for m in self.iter_messages() if "id" in m}
+
+    # --- запись ---
+
+    def ensure_initialized(self) -> None:
+        """Импортировать export.json старого формата в первый сегмент (однократно)."""
+        legacy = self._legacy_export()
+        if legacy is None:
+            return
+        messages = [m for m in legacy.get("messages") or [] if "id" in m]
+        if legacy.get("channel_info"):
+            self._manifest["channel_info"] = legacy["channel_info"]
+        if messages:
+            log.info("Импорт export.json в сегментированное хранилище: %s сообщений", len(messages))
+            self.append_batch(messages)
+        else:
+            self._save_manifest()
+
+    def append_batch(self, messages: List[Dict[str, Any]]) -> Optional[str]:
+        """Дописать батч сообщений новым сегментом. Возвращает имя сегмента (None для пустого батча)."""
+        if not messages:
+            return None
+        ordered = sorted(messages, key=_msg_id)
+        seq = int(self._manifest["next_segment"])
+        name = f"seg-{seq:06d}.jsonl"
+        body = "".join(dumps(m) + "\n" for m in ordered)
+        _atomic_write_text(self.segments_dir / name, body)
+
+        entry = self._segment_entry(name, ordered)
+        self._manifest["segments"].append(entry)
+        self._manifest["next_segment"] = seq + 1
+        self._manifest["messages_total"] += entry["count"]
+        self._manifest["media_total"] += entry["media_count"]
+        self._manifest["last_message_id"] = max(self.last_message_id, entry["max_id"])
+        self._save_manifest()
+        return name
+
+    def load_state(self, defaults: Dict[str, Any]) -> Dict[str, Any]:
+        """Состояние канала из state.json (или defaults, если файла нет)."""
+        state = _read_json(self.state_path, None)
+        return state if isinstance(state, dict) else dict(defaults)
+
+    def media_index(self) -> MutableMapping[str, str]:
+        """Индекс SHA-256 → относительный путь из media-index.json."""
+        data = _read_json(self.media_index_path, {})
+        index = data.get("sha256_to_path") if isinstance(data, dict) else None
+        return index if isinstance(index, dict) else {}
+
+    def commit_batch(
+        self,
+        messages: List[Dict[str, Any]],
+        state: Dict[str, Any],
+        media_index: MutableMapping[str, str],
+    ) -> None:
+        """Зафиксировать батч: сегмент, затем state.json и media-index.json.
+
+        `state` обновляется на месте счётчиками хранилища.
+        """
+        self.append_batch(messages)
+        state["last_message_id"] = self.last_message_id
+        state["last_update_at"] = _utc_now_iso()
+        state["messages_total"] = self.messages_total
+        state["media_total"] = self.media_total
+        _atomic_write_text(self.state_path, dumps(state, pretty=True))
+        _atomic_write_text(
+            self.media_index_path,
+            dumps({"sha256_to_path": dict(media_index)}, pretty=True),
+        )
+
+    def close(self) -> None:
+        """Для совместимости с SQLite-хранилищем (файлы уже записаны)."""
+
+    def _segments_overlap(self) -> bool:
+        segs = sorted(self._manifest["segments"], key=lambda s: s["min_id"])
+        return any(a["max_id"] >= b["min_id"] for a, b in zip(segs, segs[1:]))
+
+    def compact(self) -> int:
+        """Слить все сегменты в один: дедупликация по id (последняя запись побеждает) и сортировка.
+
+        Returns:
+            Число сообщений после компактизации.
+        """
+        self.ensure_initialized()
+        if self.segments_count <= 1 and not self._segments_overlap():
+            return self.messages_total
+        by_id: Dict[int, Dict[str, Any]] = {}
+        for m in self.iter_messages():
+            by_id[_msg_id(m)] = m
+        old_names = [s["name"] for s in self._manifest["segments"]]
+        self._manifest["segments"] = []
+        self._recount(self._manifest)
+        self.append_batch(list(by_id.values()))
+        for name in old_names:
+            (self.segments_dir / name).unlink(missing_ok=True)
+        log.info("Компактизация: %s сегментов -> 1 (%s сообщений)", len(old_names), len(by_id))
+        return len(by_id)
+
+    def materialize(self, export_date: Optional[str] = None) -> Path:
+        """Собрать export.json из сегментов (потоково, по возрастанию id).
+
+        Формат файла совпадает с прежним `json.dump(..., indent=2)`.
+        При пересекающихся диапазонах id сегменты предварительно компактизируются.
+
+        Returns:
+            Путь к export.json.
+        """
+        self.ensure_initialized()
+        if self._segments_overlap():
+            self.compact()
+        segs = sorted(self._manifest["segments"], key=lambda s: s["min_id"])
+        messages = (m for seg in segs for m in self._read_segment(self.segments_dir / seg["name"]))
+        write_export_json(self.export_json_path, self.channel_info, messages, export_date)
+        self._manifest["materialized_at"] = _utc_now_iso()
+        self._save_manifest()
+        return self.export_json_path
+
+
+def open_export_store(
+    export_dir: Path,
+    channel_info: Optional[Dict[str, Any]] = None,
+    backend: str = "json",
+    create: bool = True,
+):
+    """Открыть хранилище экспорта канала.
+
+    Если в каталоге уже есть SQLite-база экспорта, используется она — иначе
+    сообщения из неё не были бы видны инкрементальному запуску. Без `create`
+    (dry-run) база не создаётся: читается JSON-хранилище.
+
+    Args:
+        export_dir: Каталог экспорта канала.
+        channel_info: Блок channel_info для нового хранилища.
+        backend: `json` (сегменты + state.json + media-index.json) или `sqlite`.
+        create: Можно ли создать SQLite-базу (False для dry-run).
+
+    Returns:
+        SegmentedExportStore или SqliteExportStore.
+    """
+    if backend not in STATE_BACKENDS:
+        raise ValueError(f"Unknown state backend: {backend}")
+    from export_store_sqlite import DB_NAME, SqliteExportStore
+
+    db_exists = (export_dir / DB_NAME).exists()
+    if db_exists or (backend == "sqlite" and create):
+        return SqliteExportStore(export_dir, channel_info=channel_info)
+    return SegmentedExportStore(export_dir, channel_info=channel_info)
@@ -0,0 +1,325 @@
+"""SQLite-хранилище экспорта канала: сообщения, медиа, индекс SHA-256 и state в одном файле.
+
+Альтернатива связке сегменты + `state.json` + `media-index.json`
+(`export_store.SegmentedExportStore`) с тем же интерфейсом. База `export.sqlite3`
+в каталоге экспорта работает в режиме WAL; батч фиксируется одной транзакцией,
+проверка «сообщение уже выгружено» и поиск по SHA-256 — запросы по ключу,
+поэтому старт инкрементального запуска не зависит от размера канала.
+"""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, MutableMapping, Optional, Set
+
+from export_store import MEDIA_INDEX_NAME, STATE_NAME, SegmentedExportStore, write_export_json
+from jsonio import dumps, loads
+
+log = logging.getLogger("tg_parser.export_store_sqlite")
+
+DB_NAME = "export.sqlite3"
+SCHEMA_VERSION = 1
+IMPORT_BATCH_SIZE = 1000
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY,
+        date TEXT,
+        payload TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS media (
+        message_id INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        type TEXT,
+        path TEXT,
+        sha256 TEXT,
+        size INTEGER,
+        error TEXT,
+        PRIMARY KEY (message_id, position)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_media_sha256 ON media (sha256)",
+    """
+    CREATE TABLE IF NOT EXISTS media_index (
+        sha256 TEXT PRIMARY KEY,
+        path TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )
+    """,
+)
+
+
+def _utc_now_iso() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class SqliteMessageIds:
+    """Множество id сообщений с проверкой `in` запросом по первичному ключу.
+
+    Id, добавленные в текущем запуске до фиксации батча, держатся в памяти.
+    """
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self._conn = conn
+        self._pending: Set[int] = set()
+
+    def __contains__(self, msg_id: object) -> bool:
+        if msg_id in self._pending:
+            return True
+        row = self._conn.execute("SELECT 1 FROM messages WHERE id = ?", (msg_id,)).fetchone()
+        return row is not None
+
+    def add(self, msg_id: int) -> None:
+        self._pending.add(int(msg_id))
+
+    def __len__(self) -> int:
+        row = self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()
+        return int(row[0]) + len(self._pending)
+
+    def __iter__(self) -> Iterator[int]:
+        for (msg_id,) in self._conn.execute("SELECT id FROM messages ORDER BY id"):
+            yield msg_id
+        yield from sorted(self._pending)
+
+
+class SqliteMediaIndex(MutableMapping[str, str]):
+    """Индекс SHA-256 → путь поверх таблицы media_index (фиксируется вместе с батчем)."""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self._conn = conn
+
+    def __getitem__(self, sha256: str) -> str:
+        row = self._conn.execute("SELECT path FROM media_index WHERE sha256 = ?", (sha256,)).fetchone()
+        if row is None:
+            raise KeyError(sha256)
+        return row[0]
+
+    def __setitem__(self, sha256: str, path: str) -> None:
+        self._conn.execute(
+            "INSERT INTO media_index (sha256, path) VALUES (?, ?) "
+            "ON CONFLICT(sha256) DO UPDATE SET path = excluded.path",
+            (sha256, path),
+        )
+
+    def __delitem__(self, sha256: str) -> None:
+        cur = self._conn.execute("DELETE FROM media_index WHERE sha256 = ?", (sha256,))
+        if cur.rowcount == 0:
+            raise KeyError(sha256)
+
+    def __iter__(self) -> Iterator[str]:
+        for (sha256,) in self._conn.execute("SELECT sha256 FROM media_index"):
+            yield sha256
+
+    def __len__(self) -> int:
+        return int(self._conn.execute("SELECT COUNT(*) FROM media_index").fetchone()[0])
+
+
+class SqliteExportStore:
+    """Хранилище экспорта канала в `export.sqlite3` (WAL).
+
+    Интерфейс совпадает с `SegmentedExportStore`: `message_ids`, `iter_messages`,
+    `load_state`, `media_index`, `commit_batch`, `compact`, `materialize`.
+
+    Args:
+        export_dir: Каталог экспорта канала.
+        channel_info: Блок channel_info для новой базы.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, export_dir: Path, channel_info: Optional[Dict[str, Any]] = None) -> None:
+        self.export_dir = export_dir
+        self.db_path = export_dir / DB_NAME
+        self.export_json_path = export_dir / "export.json"
+        self._is_new = not self.db_path.exists()
+        export_dir.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for stmt in _SCHEMA:
+            self._conn.execute(stmt)
+        if self._get_meta("schema_version") is None:
+            self._set_meta("schema_version", SCHEMA_VERSION)
+        if channel_info and not self.channel_info:
+            self._set_meta("channel_info", channel_info)
+        self._conn.commit()
+
+    # --- meta ---
+
+    def _get_meta(self, key: str) -> Any:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return loads(row[0]) if row else None
+
+    def _set_meta(self, key: str, value: Any) -> None:
+        self._conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, dumps(value)),
+        )
+
+    # --- свойства ---
+
+    @property
+    def index_path(self) -> Path:
+        return self.db_path
+
+    @property
+    def channel_info(self) -> Optional[Dict[str, Any]]:
+        return self._get_meta("channel_info")
+
+    @property
+    def messages_total(self) -> int:
+        return int(self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0])
+
+    @property
+    def media_total(self) -> int:
+        return int(self._conn.execute("SELECT COUNT(*) FROM media").fetchone()[0])
+
+    @property
+    def last_message_id(self) -> int:
+        return int(self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM messages").fetchone()[0])
+
+    @property
+    def has_messages(self) -> bool:
+        return self._conn.execute("SELECT 1 FROM messages LIMIT 1").fetchone() is not None
+
+    # --- чтение ---
+
+    def iter_messages(self) -> Iterator[Dict[str, Any]]:
+        """Все сообщения по возрастанию id (потоково)."""
+        for (payload,) in self._conn.execute("SELECT payload FROM messages ORDER BY id"):
+            yield loads(payload)
+
+    def message_ids(self) -> SqliteMessageIds:
+        """Ленивое множество id: проверка `in` — запрос по ключу, без загрузки всего экспорта."""
+        return SqliteMessageIds(self._conn)
+
+    def load_state(self, defaults: Dict[str, Any]) -> Dict[str, Any]:
+        state = self._get_meta("state")
+        return state if isinstance(state, dict) else dict(defaults)
+
+    def media_index(self) -> SqliteMediaIndex:
+        return SqliteMediaIndex(self._conn)
+
+    # --- запись ---
+
+    def _insert_messages(self, messages: List[Dict[str, Any]]) -> None:
+        for m in messages:
+            msg_id = int(m["id"])
+            self._conn.execute(
+                "INSERT INTO messages (id, date, payload) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET date = excluded.date, payload = excluded.payload",
+                (msg_id, m.get("date"), dumps(m)),
+            )
+            self._conn.execute("DELETE FROM media WHERE message_id = ?", (msg_id,))
+            self._conn.executemany(
+                "INSERT INTO media (message_id, position, type, path, sha256, size, error) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        msg_id,
+                        pos,
+                        mf.get("type"),
+                        mf.get("path"),
+                        mf.get("sha256"),
+                        mf.get("size"),
+                        mf.get("error"),
+                    )
+                    for pos, mf in enumerate(m.get("media_files") or [])
+                ],
+            )
+
+    def ensure_initialized(self) -> None:
+        """Однократно импортировать JSON-экспорт (сегменты/export.json, state.json, media-index.json)."""
+        if not self._is_new or self.has_messages:
+            return
+        self._is_new = False
+        legacy = SegmentedExportStore(self.export_dir)
+        batch: List[Dict[str, Any]] = []
+        imported = 0
+        for m in legacy.iter_messages():
+            if "id" not in m:
+                continue
+            batch.append(m)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                self._insert_messages(batch)
+                imported += len(batch)
+                batch = []
+        if batch:
+            self._insert_messages(batch)
+            imported += len(batch)
+        if legacy.channel_info:
+            self._set_meta("channel_info", legacy.channel_info)
+        legacy_index = legacy.media_index()
+        if legacy_index:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO media_index (sha256, path) VALUES (?, ?)",
+                list(legacy_index.items()),
+            )
+        if (self.export_dir / STATE_NAME).exists():
+            self._set_meta("state", legacy.load_state({}))
+        self._conn.commit()
+        if imported or legacy_index:
+            log.info(
+                "Импорт JSON-экспорта в %s: %s сообщений, %s записей %s",
+                DB_NAME,
+                imported,
+                len(legacy_index),
+                MEDIA_INDEX_NAME,
+            )
+
+    def append_batch(self, messages: List[Dict[str, Any]]) -> None:
+        """Записать батч сообщений одной транзакцией."""
+        if not messages:
+            return
+        with self._conn:
+            self._insert_messages(messages)
+
+    def commit_batch(
+        self,
+        messages: List[Dict[str, Any]],
+        state: Dict[str, Any],
+        media_index: MutableMapping[str, str],
+    ) -> None:
+        """Зафиксировать батч, state и новые записи индекса SHA-256 одной транзакцией.
+
+        `state` обновляется на месте счётчиками хранилища. `media_index` должен
+        быть индексом этой же базы (его записи уже в открытой транзакции).
+        """
+        with self._conn:
+            self._insert_messages(messages)
+            state["last_message_id"] = self.last_message_id
+            state["last_update_at"] = _utc_now_iso()
+            state["messages_total"] = self.messages_total
+            state["media_total"] = self.media_total
+            self._set_meta("state", state)
+
+    def compact(self) -> int:
+        """Перенести WAL в основной файл и уплотнить базу. Возвращает число сообщений."""
+        self.ensure_initialized()
+        self._conn.commit()
+        self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self._conn.execute("VACUUM")
+        return self.messages_total
+
+    def materialize(self, export_date: Optional[str] = None) -> Path:
+        """Собрать export.json из базы (потоково, по возрастанию id, прежний формат)."""
+        self.ensure_initialized()
+        write_export_json(self.export_json_path, self.channel_info, self.iter_messages(), export_date)
+        with self._conn:
+            self._set_meta("materialized_at", _utc_now_iso())
+        return self.export_json_path
+
+    def close(self) -> None:
+        self._conn.commit()
+        self._conn.close()
@@ -0,0 +1,87 @@
+"""JSON-сериализация горячих путей: orjson, если установлен, иначе stdlib `json`.
+
+Экспорт Telegram (сегменты, state.json, media-index.json, export.json),
+JSONL-лог медиа, колонки JSON в SQLite и итоговый вывод CLI идут через
+`dumps` / `loads`. orjson в разы быстрее на больших объёмах и сразу отдаёт
+UTF-8 bytes (`dumps_bytes`) — запись в файл без промежуточной строки.
+
+Формат совпадает у обоих бэкендов: `pretty=True` — как
+`json.dumps(..., ensure_ascii=False, indent=2)`, компактный — без пробелов
+(`separators=(",", ":")`). Расхождения возможны только в записи float с
+экспонентой (`1e-7` у orjson против `1e-07`), значение при чтении то же.
+
+Объекты, которые orjson не сериализует (int вне 64 бит, `default` с
+особыми типами), уходят в stdlib. `JSON_BACKEND=json` принудительно
+включает stdlib (сравнение вывода, отладка).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, Callable, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # orjson — необязательная зависимость
+    orjson = None
+
+JSON_BACKEND_ENV = "JSON_BACKEND"  # orjson | json
+
+BACKEND = "orjson" if orjson is not None and os.environ.get(JSON_BACKEND_ENV, "").strip().lower() != "json" else "json"
+
+
+def _orjson_option(pretty: bool, sort_keys: bool) -> int:
+    option = orjson.OPT_NON_STR_KEYS  # как stdlib: ключи int/float/bool пишутся строками
+    if pretty:
+        option |= orjson.OPT_INDENT_2
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    return option
+
+
+def _stdlib_dumps(value: Any, pretty: bool, sort_keys: bool, default: Optional[Callable[[Any], Any]]) -> str:
+    if pretty:
+        return json.dumps(value, ensure_ascii=False, indent=2, sort_keys=sort_keys, default=default)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), sort_keys=sort_keys, default=default)
+
+
+def dumps_bytes(
+    value: Any,
+    *,
+    pretty: bool = False,
+    sort_keys: bool = False,
+    default: Optional[Callable[[Any], Any]] = None,
+) -> bytes:
+    """Значение -> JSON в UTF-8 (pretty — отступ 2 пробела)."""
+    if BACKEND == "orjson":
+        try:
+            return orjson.dumps(value, default=default, option=_orjson_option(pretty, sort_keys))
+        except TypeError:
+            pass  # orjson.JSONEncodeError — подкласс TypeError; stdlib справится или даст понятную ошибку
+    return _stdlib_dumps(value, pretty, sort_keys, default).encode("utf-8")
+
+
+def dumps(
+    value: Any,
+    *,
+    pretty: bool = False,
+    sort_keys: bool = False,
+    default: Optional[Callable[[Any], Any]] = None,
+) -> str:
+    """Значение -> JSON-строка (pretty — отступ 2 пробела)."""
+    if BACKEND == "orjson":
+        try:
+            return orjson.dumps(value, default=default, option=_orjson_option(pretty, sort_keys)).decode("utf-8")
+        except TypeError:
+            pass
+    return _stdlib_dumps(value, pretty, sort_keys, default)
+
+
+def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+    """JSON (str или bytes) -> значение. Ошибка разбора — ValueError у обоих бэкендов."""
+    if BACKEND == "orjson":
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = bytes(data)
+    return json.loads(data)
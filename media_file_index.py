@@ -0,0 +1,125 @@
+"""Индекс медиа по Telegram file id: дедупликация до загрузки.
+
+У фото и документов Telegram стабильный `id`, одинаковый во всех каналах,
+куда медиа переслано. Индекс `media-file-index.jsonl` в корне `output_dir`
+(рядом с каталогами экспорта и их `media-index.json`) хранит соответствие
+`"<photo|document>:<id>"` → путь к уже скачанному файлу и его SHA-256, чтобы
+повторно встреченное медиа не качать — ни в этом канале, ни в другом.
+
+Файл — журнал: строка JSON на запись, `save` дописывает только новые записи
+в режиме append (несколько запусков пишут в один файл, ничего не теряя),
+при чтении более поздняя строка для ключа важнее. Стоимость сохранения
+после батча — O(новых записей), а не O(размера индекса).
+Прежний `media-file-index.json` читается как начальное состояние.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from jsonio import dumps_bytes, loads
+
+log = logging.getLogger("tg_parser.media_file_index")
+
+INDEX_NAME = "media-file-index.jsonl"
+LEGACY_INDEX_NAME = "media-file-index.json"
+
+
+class MediaFileIndex:
+    """Персистентный индекс `(тип медиа, telegram id) → (путь, sha256)`.
+
+    Пути хранятся относительно корня индекса (`output_dir`), поэтому запись
+    из одного каталога экспорта находится и при парсинге другого канала.
+
+    Args:
+        root: Корневой каталог экспорта (`output_dir`).
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.path = root / INDEX_NAME
+        self._entries: Dict[str, Dict[str, str]] = self._load()
+        self._dirty: Dict[str, Dict[str, str]] = {}
+
+    @staticmethod
+    def make_key(kind: str, file_id: int) -> str:
+        return f"{kind}:{int(file_id)}"
+
+    def _load(self) -> Dict[str, Dict[str, str]]:
+        entries: Dict[str, Dict[str, str]] = {}
+        legacy = self.root / LEGACY_INDEX_NAME
+        if legacy.exists():
+            try:
+                data = json.loads(legacy.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as e:
+                log.warning("Не удалось прочитать %s (%s); пропущен", legacy, e)
+                data = None
+            files = data.get("files") if isinstance(data, dict) else None
+            if isinstance(files, dict):
+                entries.update(files)
+        try:
+            lines = self.path.read_bytes().splitlines() if self.path.exists() else []
+        except OSError as e:
+            log.warning("Не удалось прочитать %s (%s); индекс начат заново", self.path, e)
+            return entries
+        skipped = 0
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                record = loads(line)
+                entries[record["key"]] = {"path": record["path"], "sha256": record.get("sha256", "")}
+            except (ValueError, TypeError, KeyError):
+                skipped += 1  # оборванная строка после сбоя или чужой мусор
+        if skipped:
+            log.warning("%s: пропущено битых строк: %s", self.path, skipped)
+        return entries
+
+    def lookup(self, key: str) -> Optional[Tuple[Path, str]]:
+        """Найти ранее скачанный файл по ключу.
+
+        Returns:
+            (абсолютный путь, sha256) или None, если записи нет или файл удалён.
+        """
+        entry = self._entries.get(key)
+        if not entry:
+            return None
+        abs_path = self.root / entry.get("path", "")
+        if not entry.get("path") or not abs_path.is_file():
+            self._entries.pop(key, None)
+            return None
+        return abs_path, entry.get("sha256", "")
+
+    def put(self, key: str, abs_path: Path, sha256: str) -> None:
+        """Запомнить файл для ключа (дописывается на диск в `save`)."""
+        try:
+            rel = abs_path.resolve().relative_to(self.root.resolve())
+        except ValueError:
+            return
+        entry = {"path": str(rel).replace("\\", "/"), "sha256": sha256}
+        if self._entries.get(key) != entry:
+            self._entries[key] = entry
+            self._dirty[key] = entry
+
+    def save(self) -> None:
+        """Дописать новые записи в журнал; без изменений файл не трогается."""
+        if not self._dirty:
+            return
+        data = b"".join(
+            dumps_bytes({"key": key, **entry}) + b"\n" for key, entry in self._dirty.items()
+        )
+        self.root.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a+b") as f:
+            if f.seek(0, os.SEEK_END):
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    data = b"\n" + data  # хвост оборван сбоем: новая запись — с новой строки
+            f.write(data)
+        self._dirty = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
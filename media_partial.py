@@ -0,0 +1,157 @@
+"""Докачка больших медиа: `.part`-файл и sidecar с прогрессом.
+
+Документ качается частями через `client.iter_download(offset=...)` в
+`<export_dir>/.partial/<ключ>.part`; рядом лежит `<ключ>.part.json` с числом
+байт, гарантированно записанных на диск. Повтор после таймаута и новый запуск
+продолжают с этого смещения, а не с нулевого байта.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+log = logging.getLogger("tg_parser.media_partial")
+
+PARTIAL_DIR_NAME = ".partial"
+PARTIAL_VERSION = 1
+
+# Размер запроса upload.getFile (максимум API — 512 КБ).
+REQUEST_SIZE = 512 * 1024
+# Как часто фиксировать прогресс в sidecar.
+PROGRESS_EVERY_BYTES = 4 * 1024 * 1024
+# Документы меньше этого размера качаются целиком, без .part.
+RESUMABLE_MIN_BYTES = 5 * 1024 * 1024
+# Сколько ждать очередную часть: таймаут на «зависание», а не на весь файл.
+CHUNK_TIMEOUT_SEC = 120
+
+
+def _sha256_prefix(path: Path, size: int) -> "hashlib._Hash":
+    h = hashlib.sha256()
+    left = size
+    with path.open("rb") as f:
+        while left > 0:
+            chunk = f.read(min(1024 * 1024, left))
+            if not chunk:
+                break
+            h.update(chunk)
+            left -= len(chunk)
+    return h
+
+
+class PartialDownload:
+    """`.part`-файл одного медиа и его sidecar с прогрессом.
+
+    Args:
+        partial_dir: Каталог недокачанных файлов (`<export_dir>/.partial`).
+        file_key: Ключ медиа (`document:<id>`), он же имя файла.
+        size: Ожидаемый размер файла в байтах.
+    """
+
+    def __init__(self, partial_dir: Path, file_key: str, size: int) -> None:
+        name = file_key.replace(":", "_")
+        self.file_key = file_key
+        self.size = int(size)
+        self.part_path = partial_dir / f"{name}.part"
+        self.sidecar_path = partial_dir / f"{name}.part.json"
+
+    def resume_offset(self) -> int:
+        """Смещение, с которого можно продолжить (0 — качать заново)."""
+        try:
+            data = json.loads(self.sidecar_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return 0
+        if not isinstance(data, dict) or data.get("file_key") != self.file_key or data.get("size") != self.size:
+            return 0
+        try:
+            on_disk = self.part_path.stat().st_size
+        except OSError:
+            return 0
+        offset = int(data.get("offset") or 0)
+        return offset if 0 < offset <= min(on_disk, self.size) else 0
+
+    def save_progress(self, offset: int) -> None:
+        self.sidecar_path.parent.mkdir(parents=True, exist_ok=True)
+        record = {"version": PARTIAL_VERSION, "file_key": self.file_key, "size": self.size, "offset": offset}
+        tmp = self.sidecar_path.with_name(self.sidecar_path.name + ".tmp")
+        tmp.write_text(json.dumps(record), encoding="utf-8")
+        os.replace(tmp, self.sidecar_path)
+
+    def finish(self) -> None:
+        """Файл скачан: sidecar больше не нужен (сам .part забирает вызывающий)."""
+        self.sidecar_path.unlink(missing_ok=True)
+
+    def discard(self) -> None:
+        self.part_path.unlink(missing_ok=True)
+        self.sidecar_path.unlink(missing_ok=True)
+
+
+async def download_resumable(
+    client: Any,
+    media: Any,
+    partial: PartialDownload,
+    *,
+    chunk_timeout: float = CHUNK_TIMEOUT_SEC,
+    stats: Optional[Dict[str, int]] = None,
+) -> Tuple[Path, str]:
+    """Скачать медиа в `partial.part_path`, продолжив с сохранённого смещения.
+
+    SHA-256 считается по ходу загрузки; уже скачанный префикс при продолжении
+    хешируется с диска один раз.
+
+    Returns:
+        (путь к полному .part-файлу, sha256).
+
+    Raises:
+        asyncio.TimeoutError: Очередная часть не пришла за `chunk_timeout` (прогресс сохранён).
+    """
+    offset = partial.resume_offset()
+    partial.part_path.parent.mkdir(parents=True, exist_ok=True)
+    if offset:
+        log.info("Докачка %s с %s из %s байт", partial.file_key, offset, partial.size)
+        if stats is not None:
+            stats["media_resumed"] += 1
+        hasher = _sha256_prefix(partial.part_path, offset)
+        f = partial.part_path.open("r+b")
+        f.truncate(offset)
+        f.seek(offset)
+    else:
+        hasher = hashlib.sha256()
+        f = partial.part_path.open("wb")
+    saved = offset
+    stream = client.iter_download(media, offset=offset, request_size=REQUEST_SIZE, file_size=partial.size)
+    try:
+        while True:
+            try:
+                chunk = await asyncio.wait_for(stream.__anext__(), timeout=chunk_timeout)
+            except StopAsyncIteration:
+                break
+            f.write(chunk)
+            hasher.update(chunk)
+            offset += len(chunk)
+            if offset - saved >= PROGRESS_EVERY_BYTES:
+                f.flush()
+                os.fsync(f.fileno())
+                partial.save_progress(offset)
+                saved = offset
+    finally:
+        f.flush()
+        f.close()
+        if offset > saved:
+            partial.save_progress(offset)
+        aclose = getattr(stream, "aclose", None) or getattr(stream, "close", None)
+        if aclose is not None:
+            result = aclose()
+            if asyncio.iscoroutine(result):
+                await result
+    if offset != partial.size:
+        # Размер не сошёлся — продолжать такой .part нельзя.
+        partial.discard()
+        raise IOError(f"Downloaded {offset} of {partial.size} bytes for {partial.file_key}")
+    partial.finish()
+    return partial.part_path, hasher.hexdigest()
@@ -0,0 +1,147 @@
+"""Ограниченный пул asyncio-воркеров для загрузки медиа.
+
+Продюсер (листание истории) кладёт задания в очередь ограниченного размера и
+получает Future на результат; N воркеров (`media_concurrency`) выполняют их
+параллельно. Когда очередь заполнена, `submit` ждёт — это backpressure для
+листания истории. Порядок фиксации результатов задаёт вызывающий код,
+дожидаясь Future в порядке сообщений.
+
+С `key` задания с одинаковым ключом (один и тот же Telegram-документ в
+нескольких сообщениях окна) выполняются по очереди: следующее начинается,
+когда предыдущее закончилось, и находит готовый файл в индексе вместо того,
+чтобы писать в тот же `.part` параллельно.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Generic, Hashable, List, Optional, Tuple, TypeVar
+
+log = logging.getLogger("tg_parser.media_pipeline")
+
+JobT = TypeVar("JobT")
+ResultT = TypeVar("ResultT")
+
+_STOP = object()
+
+
+class KeyedLocks:
+    """asyncio.Lock на ключ; запись удаляется, когда lock никто не держит и не ждёт."""
+
+    def __init__(self) -> None:
+        self._locks: Dict[Hashable, List[Any]] = {}  # ключ -> [lock, держащих или ждущих]
+
+    @asynccontextmanager
+    async def hold(self, key: Hashable) -> AsyncIterator[None]:
+        slot = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        slot[1] += 1
+        try:
+            async with slot[0]:
+                yield
+        finally:
+            slot[1] -= 1
+            if slot[1] == 0:
+                self._locks.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+
+class MediaPipeline(Generic[JobT, ResultT]):
+    """Пул из `concurrency` воркеров над общей очередью заданий.
+
+    Args:
+        worker: Корутина-обработчик одного задания.
+        concurrency: Число одновременно работающих воркеров (>= 1).
+        queue_size: Размер очереди; по умолчанию 2 * concurrency.
+        key: Ключ задания; задания с одинаковым ключом не выполняются одновременно (None — без ограничения).
+    """
+
+    def __init__(
+        self,
+        worker: Callable[[JobT], Awaitable[ResultT]],
+        concurrency: int,
+        queue_size: Optional[int] = None,
+        key: Optional[Callable[[JobT], Optional[Hashable]]] = None,
+    ) -> None:
+        self._worker = worker
+        self._key = key
+        self._key_locks = KeyedLocks()
+        self.concurrency = max(1, int(concurrency))
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size or self.concurrency * 2)
+        self._tasks: List[asyncio.Task] = []
+
+    async def __aenter__(self) -> "MediaPipeline[JobT, ResultT]":
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            await self.close()
+        else:
+            await self.cancel()
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._tasks = [
+            asyncio.create_task(self._run(), name=f"media-worker-{i}") for i in range(self.concurrency)
+        ]
+
+    async def submit(self, job: JobT) -> "asyncio.Future[ResultT]":
+        """Поставить задание в очередь (ждёт при заполненной очереди) и вернуть Future результата."""
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        await self._queue.put((job, fut))
+        return fut
+
+    async def _run(self) -> None:
+        while True:
+            item = await self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                job, fut = item
+                if fut.cancelled():
+                    continue
+                try:
+                    result = await self._run_job(job)
+                except asyncio.CancelledError:
+                    fut.cancel()
+                    raise
+                except BaseException as e:  # noqa: BLE001 — исключение передаём ожидающему Future
+                    if not fut.done():
+                        fut.set_exception(e)
+                else:
+                    if not fut.done():
+                        fut.set_result(result)
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job: JobT) -> ResultT:
+        key = self._key(job) if self._key is not None else None
+        if key is None:
+            return await self._worker(job)
+        async with self._key_locks.hold(key):
+            return await self._worker(job)
+
+    async def close(self) -> None:
+        """Дождаться выполнения всех заданий и остановить воркеров."""
+        for _ in self._tasks:
+            await self._queue.put(_STOP)
+        if self._tasks:
+            await asyncio.gather(*self._tasks)
+        self._tasks = []
+
+    async def cancel(self) -> None:
+        """Прервать воркеров; невыполненные задания помечаются отменёнными."""
+        for t in self._tasks:
+            t.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while not self._queue.empty():
+            item: Tuple[Any, asyncio.Future] = self._queue.get_nowait()
+            if item is not _STOP and not item[1].done():
+                item[1].cancel()
@@ -0,0 +1,9 @@
+-- WordPress Source: watermark incremental sync (WP_SYNC_MODE=incremental), одна строка на сайт
+CREATE TABLE IF NOT EXISTS wp_sync_state (
+    site_id             VARCHAR(64) PRIMARY KEY REFERENCES wp_sites(site_id),
+    last_modified_gmt   TIMESTAMPTZ,
+    last_run_id         VARCHAR(32),
+    updated_at          TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+COMMENT ON TABLE wp_sync_state IS 'Watermark incremental sync: последняя дата изменения контента на WP по сайту';
@@ -0,0 +1,4 @@
+-- WordPress Source: отпечаток контента — upsert не переписывает неизменённые строки
+ALTER TABLE wp_content ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
+
+COMMENT ON COLUMN wp_content.content_hash IS 'sha256 исходного JSON объекта WP; совпал — строка не перезаписывается';
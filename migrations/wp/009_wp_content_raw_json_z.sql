@@ -0,0 +1,4 @@
+-- WordPress Source: сжатый исходный JSON (WP_RAW_JSON_POLICY=compressed)
+ALTER TABLE wp_content ADD COLUMN IF NOT EXISTS raw_json_z BYTEA;
+
+COMMENT ON COLUMN wp_content.raw_json_z IS 'Исходный JSON объекта WP, сжатый zstd/gzip (политика compressed); raw_json при этом NULL';
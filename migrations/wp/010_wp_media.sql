@@ -0,0 +1,15 @@
+-- WordPress Source: зеркало медиафайлов (WP_MEDIA_MIRROR), файл адресуется по sha256
+CREATE TABLE IF NOT EXISTS wp_media (
+    site_id             VARCHAR(64) NOT NULL REFERENCES wp_sites(site_id),
+    source_url          TEXT NOT NULL,
+    sha256              CHAR(64) NOT NULL,
+    local_path          TEXT NOT NULL,
+    size_bytes          BIGINT,
+    mime_type           VARCHAR(128),
+    synced_at           TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (site_id, source_url)
+);
+
+CREATE INDEX IF NOT EXISTS idx_wp_media_sha256 ON wp_media(sha256);
+
+COMMENT ON TABLE wp_media IS 'Локальные копии медиа постов/страниц: source_url -> local_path (относительно каталога зеркала)';
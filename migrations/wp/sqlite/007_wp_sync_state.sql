@@ -0,0 +1,7 @@
+-- WordPress Source (SQLite): watermark incremental sync, одна строка на сайт
+CREATE TABLE IF NOT EXISTS wp_sync_state (
+    site_id             TEXT PRIMARY KEY REFERENCES wp_sites(site_id),
+    last_modified_gmt   TEXT,
+    last_run_id         TEXT,
+    updated_at          TEXT NOT NULL DEFAULT (datetime('now'))
+);
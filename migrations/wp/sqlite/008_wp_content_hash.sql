@@ -0,0 +1,2 @@
+-- WordPress Source (SQLite): отпечаток контента — upsert не переписывает неизменённые строки
+ALTER TABLE wp_content ADD COLUMN content_hash TEXT;
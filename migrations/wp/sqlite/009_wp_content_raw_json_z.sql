@@ -0,0 +1,2 @@
+-- WordPress Source (SQLite): сжатый исходный JSON (WP_RAW_JSON_POLICY=compressed)
+ALTER TABLE wp_content ADD COLUMN raw_json_z BLOB;
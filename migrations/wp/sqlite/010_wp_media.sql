@@ -0,0 +1,13 @@
+-- WordPress Source (SQLite): зеркало медиафайлов (WP_MEDIA_MIRROR)
+CREATE TABLE IF NOT EXISTS wp_media (
+    site_id             TEXT NOT NULL REFERENCES wp_sites(site_id),
+    source_url          TEXT NOT NULL,
+    sha256              TEXT NOT NULL,
+    local_path          TEXT NOT NULL,
+    size_bytes          INTEGER,
+    mime_type           TEXT,
+    synced_at           TEXT NOT NULL,
+    PRIMARY KEY (site_id, source_url)
+);
+
+CREATE INDEX IF NOT EXISTS idx_wp_media_sha256 ON wp_media(sha256);
@@ -0,0 +1,253 @@
+"""Парсинг списка каналов в одном процессе: один event loop и один TelegramClient.
+
+Каналы обрабатываются параллельно (не больше `concurrency` одновременно),
+запросы всех каналов идут через общий `FloodAwareTokenBucket` парсера.
+С пулом сессий (`session_pool.SessionPool`) каналы распределяются по
+аккаунтам, и `concurrency` ограничивает число каналов на одну сессию.
+Статус каждого канала пишется в checkpoint-файл: прерванный или частично
+упавший прогон при повторном запуске продолжается с необработанных каналов.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from exit_codes import EXIT_FAILURE, EXIT_PARTIAL, EXIT_SUCCESS
+
+log = logging.getLogger("tg_parser.multi_channel")
+
+CHECKPOINT_NAME = "parse-many-checkpoint.json"
+SUMMARY_NAME = "parse-many-summary.json"
+CHECKPOINT_VERSION = 1
+
+STATUS_OK = "ok"
+STATUS_PARTIAL = "partial"
+STATUS_FAILED = "failed"
+STATUS_SKIPPED = "skipped"
+STATUS_RUNNING = "running"
+
+# Статусы, при которых канал при продолжении прогона повторно не парсится.
+_DONE_STATUSES = (STATUS_OK, STATUS_PARTIAL)
+
+
+def _utc_now_iso() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _atomic_write_json(path: Path, value: Any) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(value, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def read_channel_list(path: Path) -> List[str]:
+    """Прочитать файл со списком каналов: по одному на строку, `#` — комментарий, дубли отбрасываются.
+
+    Args:
+        path: Путь к файлу (UTF-8).
+
+    Returns:
+        Каналы в порядке файла.
+    """
+    channels: List[str] = []
+    seen = set()
+    for raw in path.read_text(encoding="utf-8-sig").splitlines():
+        line = raw.split("#", 1)[0].strip()
+        if line and line not in seen:
+            seen.add(line)
+            channels.append(line)
+    return channels
+
+
+class ParseManyCheckpoint:
+    """Checkpoint прогона parse-many: статус и итоги по каждому каналу.
+
+    Завершённый без ошибок прогон помечается `completed`, и следующий запуск
+    начинает новый круг по всем каналам; иначе уже обработанные каналы пропускаются.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._data = self._load()
+
+    def _load(self) -> Dict[str, Any]:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            data = None
+        if not isinstance(data, dict) or not isinstance(data.get("channels"), dict):
+            return self._new_round()
+        return data
+
+    @staticmethod
+    def _new_round() -> Dict[str, Any]:
+        return {"version": CHECKPOINT_VERSION, "round_started_at": _utc_now_iso(), "completed": False, "channels": {}}
+
+    def start(self, resume: bool) -> None:
+        """Начать прогон: продолжить незавершённый круг или открыть новый."""
+        if not resume or self._data.get("completed"):
+            self._data = self._new_round()
+        self.save()
+
+    def is_done(self, channel: str) -> bool:
+        return (self._data["channels"].get(channel) or {}).get("status") in _DONE_STATUSES
+
+    def get(self, channel: str) -> Dict[str, Any]:
+        return dict(self._data["channels"].get(channel) or {})
+
+    def mark(self, channel: str, status: str, **info: Any) -> None:
+        entry = {"status": status, "updated_at": _utc_now_iso()}
+        entry.update(info)
+        self._data["channels"][channel] = entry
+        self.save()
+
+    def finish(self, channels: List[str]) -> None:
+        self._data["completed"] = all(self.is_done(c) for c in channels)
+        self.save()
+
+    def save(self) -> None:
+        _atomic_write_json(self.path, self._data)
+
+
+def _channel_record(channel: str, result: Dict[str, Any], duration: float) -> Dict[str, Any]:
+    summary = result.get("summary") or {}
+    partial = bool(result.get("partial_failure"))
+    return {
+        "channel": channel,
+        "status": STATUS_PARTIAL if partial else STATUS_OK,
+        "exit_code": EXIT_PARTIAL if partial else EXIT_SUCCESS,
+        "export_dir": result.get("export_dir"),
+        "new_messages": summary.get("new_messages", 0),
+        "media_saved": summary.get("media_saved", 0),
+        "media_errors_count": summary.get("media_errors_count", 0),
+        "flood_wait_events": summary.get("flood_wait_events", 0),
+        "duration_sec": round(duration, 2),
+        "error": None,
+    }
+
+
+def aggregate_exit_code(records: List[Dict[str, Any]]) -> int:
+    """Итоговый код выхода: 0 — все каналы успешны, 1 — ни один не обработан, иначе 2."""
+    statuses = [r["status"] for r in records if r["status"] != STATUS_SKIPPED]
+    if all(s == STATUS_OK for s in statuses):
+        return EXIT_SUCCESS
+    if all(s == STATUS_FAILED for s in statuses):
+        return EXIT_FAILURE
+    return EXIT_PARTIAL
+
+
+async def parse_many(
+    parser: Any,
+    channels: List[str],
+    output_dir: str,
+    *,
+    concurrency: int = 3,
+    checkpoint_path: Optional[Path] = None,
+    resume: bool = True,
+    run_id: Optional[str] = None,
+    parse_kwargs: Optional[Dict[str, Any]] = None,
+    pool: Optional[Any] = None,
+) -> Dict[str, Any]:
+    """Распарсить список каналов параллельно на одном клиенте или на пуле сессий.
+
+    Args:
+        parser: TelegramParser (общий клиент и лимитер запросов); не используется при `pool`.
+        channels: Каналы: ссылки, @username или id.
+        output_dir: Корневой каталог экспорта.
+        concurrency: Сколько каналов парсится одновременно.
+        checkpoint_path: Файл checkpoint (по умолчанию `<output_dir>/parse-many-checkpoint.json`).
+        resume: Пропускать каналы, уже обработанные в незавершённом прогоне.
+        run_id: Correlation id запуска.
+        parse_kwargs: Доп. параметры parse_channel (mode, dry_run, ...).
+        pool: SessionPool — канал парсится закреплённой за ним сессией.
+
+    Returns:
+        Сводка: счётчики по статусам, exit_code и записи по каждому каналу.
+    """
+    t0 = time.monotonic()
+    checkpoint = ParseManyCheckpoint(checkpoint_path or Path(output_dir) / CHECKPOINT_NAME)
+    checkpoint.start(resume)
+    concurrency = max(1, int(concurrency))
+    if pool is not None:
+        semaphores = {id(p): asyncio.Semaphore(concurrency) for p in pool}
+    else:
+        semaphores = {id(parser): asyncio.Semaphore(concurrency)}
+    kwargs = dict(parse_kwargs or {})
+
+    async def run_one(channel: str) -> Dict[str, Any]:
+        if checkpoint.is_done(channel):
+            prev = checkpoint.get(channel)
+            log.info("parse-many: канал %s уже обработан в этом прогоне, пропуск", channel)
+            return {
+                "channel": channel,
+                "status": STATUS_SKIPPED,
+                "exit_code": EXIT_SUCCESS,
+                "export_dir": prev.get("export_dir"),
+                "error": None,
+            }
+        channel_parser = pool.parser_for(channel) if pool is not None else parser
+        async with semaphores[id(channel_parser)]:
+            checkpoint.mark(channel, STATUS_RUNNING, started_at=_utc_now_iso())
+            started = time.monotonic()
+            try:
+                result = await channel_parser.parse_channel(
+                    channel_identifier=channel,
+                    output_dir=output_dir,
+                    run_id=run_id,
+                    **kwargs,
+                )
+            except Exception as e:
+                log.exception("parse-many: ошибка канала %s: %s", channel, e)
+                record = {
+                    "channel": channel,
+                    "status": STATUS_FAILED,
+                    "exit_code": EXIT_FAILURE,
+                    "export_dir": None,
+                    "duration_sec": round(time.monotonic() - started, 2),
+                    "error": str(e) or e.__class__.__name__,
+                    "error_code": getattr(e, "error_code", None),
+                }
+            else:
+                record = _channel_record(channel, result, time.monotonic() - started)
+            if pool is not None:
+                record["session"] = pool.session_name(channel_parser)
+            checkpoint.mark(
+                channel,
+                record["status"],
+                export_dir=record.get("export_dir"),
+                new_messages=record.get("new_messages"),
+                error=record.get("error"),
+            )
+            log.info("parse-many: канал %s — %s", channel, record["status"])
+            return record
+
+    records = list(await asyncio.gather(*(run_one(c) for c in channels)))
+    checkpoint.finish(channels)
+
+    counts = {s: sum(1 for r in records if r["status"] == s) for s in (STATUS_OK, STATUS_PARTIAL, STATUS_FAILED, STATUS_SKIPPED)}
+    limiter = getattr(parser, "rate_limiter", None) if pool is None else None
+    governor = getattr(parser, "governor", None) if pool is None else None
+    summary: Dict[str, Any] = {
+        "run_at": _utc_now_iso(),
+        "run_id": run_id,
+        "channels_total": len(channels),
+        **counts,
+        "concurrency": concurrency,
+        "rate_limiter": limiter.stats() if limiter else None,
+        "rate_governor": governor.stats() if governor else None,
+        "sessions": pool.stats() if pool is not None else None,
+        "duration_sec": round(time.monotonic() - t0, 2),
+        "exit_code": aggregate_exit_code(records),
+        "checkpoint": str(checkpoint.path),
+        "channels": records,
+    }
+    _atomic_write_json(Path(output_dir) / SUMMARY_NAME, summary)
+    return summary
@@ -0,0 +1,210 @@
+"""Лимитеры запросов к Telegram API.
+
+FloodAwareTokenBucket — общий лимит для нескольких каналов в одном процессе:
+`rate` запросов в секунду с запасом `capacity` на всплеск. FloodWait по любому
+каналу ставит на паузу всех ожидающих — продолжать запросы с той же сессии
+до окончания FloodWait бессмысленно.
+
+RateGovernor — адаптивный (AIMD) лимит клиента по классам запросов
+(history, download, get_entity): FloodWait останавливает все классы на время
+ожидания и вдвое снижает темп класса, получившего flood; каждый успешный
+запрос понемногу поднимает темп обратно до потолка.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+log = logging.getLogger("tg_parser.rate_governor")
+
+
+class FloodAwareTokenBucket:
+    """Асинхронный token bucket с глобальной паузой по FloodWait.
+
+    Args:
+        rate: Токенов (запросов) в секунду; 0 или меньше — без ограничения.
+        capacity: Размер всплеска; по умолчанию max(1, rate).
+        clock: Источник монотонного времени (для тестов).
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity else max(1.0, self.rate)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+        self.acquired = 0
+        self.waited_sec = 0.0
+        self.flood_pauses = 0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        """Дождаться разрешения на запрос (FIFO среди ожидающих)."""
+        if self.rate <= 0 and self._paused_until <= self._clock():
+            self.acquired += 1
+            return
+        started = self._clock()
+        async with self._lock:
+            while True:
+                now = self._clock()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                if self.rate <= 0:
+                    break
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    break
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+        self.acquired += 1
+        self.waited_sec += self._clock() - started
+
+    def pause(self, seconds: float) -> None:
+        """Остановить выдачу токенов на `seconds` (FloodWait); запас всплеска обнуляется."""
+        if self._hold(seconds):
+            log.warning("FloodWait: все запросы приостановлены на %.0f с", seconds)
+        self.flood_pauses += 1
+
+    def _hold(self, seconds: float) -> bool:
+        """Пауза без учёта в статистике; True, если пауза продлена."""
+        until = self._clock() + max(0.0, float(seconds))
+        extended = until > self._paused_until
+        if extended:
+            self._paused_until = until
+        self._tokens = 0.0
+        self._updated = max(self._updated, until)
+        return extended
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "rate_per_sec": self.rate,
+            "acquired": self.acquired,
+            "waited_sec": round(self.waited_sec, 3),
+            "flood_pauses": self.flood_pauses,
+        }
+
+
+class AimdTokenBucket(FloodAwareTokenBucket):
+    """Token bucket с AIMD-темпом: +`increase` запроса/с за успех, ×`decrease` за FloodWait.
+
+    Args:
+        max_rate: Потолок (и начальный темп), запросов в секунду.
+        min_rate: Нижняя граница темпа после снижений.
+        increase: Прибавка к темпу за каждый успешный запрос.
+        decrease: Множитель темпа при FloodWait.
+        clock: Источник монотонного времени (для тестов).
+    """
+
+    def __init__(
+        self,
+        max_rate: float,
+        min_rate: float,
+        increase: float,
+        decrease: float = 0.5,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if not 0 < min_rate <= max_rate:
+            raise ValueError("AIMD bucket requires 0 < min_rate <= max_rate")
+        super().__init__(max_rate, clock=clock)
+        self.max_rate = float(max_rate)
+        self.min_rate = float(min_rate)
+        self.increase = float(increase)
+        self.decrease = float(decrease)
+        self.rate_decreases = 0
+
+    def on_success(self) -> None:
+        self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_flood(self) -> None:
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self.rate_decreases += 1
+
+    def stats(self) -> Dict[str, float]:
+        out = super().stats()
+        out["rate_per_sec"] = round(self.rate, 3)
+        out["max_rate_per_sec"] = self.max_rate
+        out["rate_decreases"] = self.rate_decreases
+        return out
+
+
+# Класс запроса → (потолок, минимум, прибавка за успех), запросов в секунду.
+# Потолки не ниже темпа, который даёт пауза между страницами истории в режиме normal.
+DEFAULT_CLASS_LIMITS: Dict[str, Tuple[float, float, float]] = {
+    "history": (3.0, 0.2, 0.05),
+    "download": (5.0, 0.5, 0.1),
+    "get_entity": (1.0, 0.1, 0.05),
+}
+
+
+class RateGovernor:
+    """Адаптивный лимит запросов клиента: AIMD token bucket на каждый класс запросов.
+
+    Args:
+        limits: Класс → (max_rate, min_rate, increase); по умолчанию DEFAULT_CLASS_LIMITS.
+        clock: Источник монотонного времени (для тестов).
+    """
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, Tuple[float, float, float]]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.buckets: Dict[str, AimdTokenBucket] = {
+            name: AimdTokenBucket(max_rate, min_rate, increase, clock=clock)
+            for name, (max_rate, min_rate, increase) in (limits or DEFAULT_CLASS_LIMITS).items()
+        }
+        self.flood_pauses = 0
+        self.flood_wait_sec = 0.0
+
+    def bucket(self, request_class: str) -> AimdTokenBucket:
+        try:
+            return self.buckets[request_class]
+        except KeyError:
+            raise ValueError(f"Unknown request class: {request_class}") from None
+
+    async def acquire(self, request_class: str) -> None:
+        """Дождаться разрешения на запрос класса (и окончания FloodWait, если он идёт)."""
+        await self.bucket(request_class).acquire()
+
+    def on_success(self, request_class: str) -> None:
+        self.bucket(request_class).on_success()
+
+    def on_flood(self, request_class: str, seconds: float) -> None:
+        """FloodWait: пауза для всех классов, снижение темпа класса-виновника."""
+        bucket = self.bucket(request_class)
+        bucket.on_flood()
+        bucket.flood_pauses += 1
+        extended = False
+        for b in self.buckets.values():
+            extended = b._hold(seconds) or extended
+        self.flood_pauses += 1
+        self.flood_wait_sec += max(0.0, float(seconds))
+        if extended:
+            log.warning(
+                "FloodWait (%s): все запросы приостановлены на %.0f с, темп %s снижен до %.2f/с",
+                request_class,
+                seconds,
+                request_class,
+                bucket.rate,
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "flood_pauses": self.flood_pauses,
+            "flood_wait_sec": round(self.flood_wait_sec, 3),
+            "classes": {name: b.stats() for name, b in self.buckets.items()},
+        }
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк JSON-слоя (jsonio) на экспорте из 100k сообщений: stdlib json против orjson.
+
+Замеры (лучшее из --repeat прогонов):
+  segments  — JSONL-сегменты (компактная строка на сообщение, как SegmentedExportStore.append_batch);
+  export    — export.json с отступами (по сообщению, как write_export_json);
+  loads     — чтение сегментов обратно.
+
+Запуск из корня проекта:
+  python scripts/bench_json.py
+  python scripts/bench_json.py --messages 20000 --repeat 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import jsonio  # noqa: E402
+
+
+def _messages(n: int) -> List[dict]:
+    return [
+        {
+            "id": i,
+            "date": "2026-02-17T12:00:00Z",
+            "text": f"Сообщение {i}: " + "текст канала " * 12,
+            "media_files": [
+                {"type": "photo", "path": f"media/photos/{i}.jpg", "filename": f"{i}.jpg", "size": 123456 + i,
+                 "sha256": f"{i:064x}"}
+            ] if i % 3 == 0 else [],
+            "forwarded": None,
+            "reply_to_msg_id": i - 1 if i % 5 == 0 else None,
+            "views": i * 7,
+            "forwards": i % 11,
+        }
+        for i in range(1, n + 1)
+    ]
+
+
+def _best(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _run(messages: List[dict], repeat: int) -> Dict[str, float]:
+    segments = "".join(jsonio.dumps(m) + "\n" for m in messages)
+    lines = segments.splitlines()
+    return {
+        "segments": _best(lambda: "".join(jsonio.dumps(m) + "\n" for m in messages), repeat),
+        "export": _best(lambda: [jsonio.dumps(m, pretty=True).replace("\n", "\n    ") for m in messages], repeat),
+        "loads": _best(lambda: [jsonio.loads(line) for line in lines], repeat),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк jsonio: stdlib json vs orjson")
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    messages = _messages(args.messages)
+    backends = ["json"] + (["orjson"] if jsonio.orjson is not None else [])
+    results: Dict[str, Dict[str, float]] = {}
+    saved = jsonio.BACKEND
+    try:
+        for backend in backends:
+            jsonio.BACKEND = backend
+            results[backend] = _run(messages, args.repeat)
+    finally:
+        jsonio.BACKEND = saved
+
+    print(f"messages={args.messages} repeat={args.repeat}")
+    print(f"{'case':<10}" + "".join(f"{b:>12}" for b in backends) + ("     speedup" if len(backends) > 1 else ""))
+    for case in ("segments", "export", "loads"):
+        row = f"{case:<10}" + "".join(f"{results[b][case]:>11.3f}s" for b in backends)
+        if len(backends) > 1:
+            row += f"{results['json'][case] / results['orjson'][case]:>11.1f}x"
+        print(row)
+    if len(backends) == 1:
+        print("orjson не установлен: pip install orjson")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""Пул сессий Telegram: шардирование каналов по нескольким аккаунтам.
+
+Каждая сессия арендуется своим `session_lock` и получает собственный
+TelegramParser с отдельным лимитером запросов — FloodWait одного аккаунта
+не останавливает остальные. Канал закрепляется за сессией (sticky affinity,
+`session-affinity.json` в output_dir): access_hash сущностей и сообщений
+привязан к аккаунту, поэтому история и медиа канала всегда идут через одну сессию.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from rate_governor import FloodAwareTokenBucket
+from session_lock import session_lock
+
+log = logging.getLogger("tg_parser.session_pool")
+
+AFFINITY_NAME = "session-affinity.json"
+
+
+def session_key(session_file: str) -> str:
+    """Имя сессии для affinity-файла и сводок (без каталога и расширения .session)."""
+    name = Path(session_file).name
+    return name[: -len(".session")] if name.endswith(".session") else name
+
+
+class SessionAffinity:
+    """Персистентное закрепление каналов за сессиями: канал → имя сессии."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            data = {}
+        channels = data.get("channels") if isinstance(data, dict) else None
+        self._map: Dict[str, str] = dict(channels) if isinstance(channels, dict) else {}
+
+    def get(self, channel: str) -> Optional[str]:
+        return self._map.get(channel)
+
+    def set(self, channel: str, session: str) -> None:
+        if self._map.get(channel) != session:
+            self._map[channel] = session
+            self.save()
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps({"channels": self._map}, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+class SessionPool:
+    """Набор арендованных сессий с парсером и лимитером на каждую.
+
+    Args:
+        session_files: Файлы сессий Telethon (по одному на аккаунт).
+        parser_factory: Создаёт парсер: `parser_factory(session_file, rate_limiter)`.
+        affinity_path: Файл закрепления каналов за сессиями.
+        rate_limit: Лимит запросов в секунду на одну сессию (0 — без лимита).
+    """
+
+    def __init__(
+        self,
+        session_files: List[str],
+        parser_factory: Callable[[str, FloodAwareTokenBucket], Any],
+        affinity_path: Path,
+        rate_limit: float = 1.0,
+    ) -> None:
+        if not session_files:
+            raise ValueError("Session pool requires at least one session file")
+        self.session_files = list(dict.fromkeys(session_files))
+        self._factory = parser_factory
+        self._rate_limit = rate_limit
+        self.affinity = SessionAffinity(affinity_path)
+        self.parsers: Dict[str, Any] = {}
+        self.assigned: Dict[str, int] = {}
+        self._stack: Optional[ExitStack] = None
+
+    def __enter__(self) -> "SessionPool":
+        """Арендовать все свободные сессии; занятые другим процессом пропускаются."""
+        self._stack = ExitStack()
+        for session_file in self.session_files:
+            acquired = self._stack.enter_context(session_lock(session_file))
+            if not acquired:
+                log.warning("Сессия %s занята другим процессом, в пул не входит", session_file)
+                continue
+            key = session_key(session_file)
+            self.parsers[key] = self._factory(session_file, FloodAwareTokenBucket(self._rate_limit))
+            self.assigned[key] = 0
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self._stack is not None:
+            self._stack.close()
+            self._stack = None
+
+    def __len__(self) -> int:
+        return len(self.parsers)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.parsers.values())
+
+    async def connect_all(self) -> None:
+        """Подключить все сессии; неавторизованные и сбойные исключаются из пула."""
+        for key, parser in list(self.parsers.items()):
+            try:
+                await parser.connect()
+            except Exception as e:
+                log.error("Сессия %s исключена из пула: %s", key, e)
+                await self._disconnect(parser)
+                del self.parsers[key]
+                del self.assigned[key]
+        if not self.parsers:
+            raise RuntimeError("No usable Telegram session in pool (all locked or not authorized)")
+
+    async def disconnect_all(self) -> None:
+        for parser in self.parsers.values():
+            await self._disconnect(parser)
+
+    @staticmethod
+    async def _disconnect(parser: Any) -> None:
+        try:
+            await parser.disconnect()
+        except Exception as e:
+            log.warning("Ошибка отключения сессии: %s", e)
+
+    def parser_for(self, channel: str) -> Any:
+        """Парсер сессии, закреплённой за каналом; новый канал — на наименее загруженную сессию."""
+        if not self.parsers:
+            raise RuntimeError("Session pool is empty")
+        key = self.affinity.get(channel)
+        if key not in self.parsers:
+            if key is not None:
+                log.info("Сессия %s канала %s недоступна, канал переназначен", key, channel)
+            key = min(self.parsers, key=lambda k: (self.assigned[k], self.session_files.index(self._file_of(k))))
+            self.affinity.set(channel, key)
+        self.assigned[key] += 1
+        return self.parsers[key]
+
+    def _file_of(self, key: str) -> str:
+        return next(f for f in self.session_files if session_key(f) == key)
+
+    def session_name(self, parser: Any) -> Optional[str]:
+        return next((k for k, p in self.parsers.items() if p is parser), None)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """По сессии: число каналов в прогоне, статистика лимитера и адаптивного governor."""
+        return {
+            key: {
+                "channels": self.assigned[key],
+                "rate_limiter": parser.rate_limiter.stats() if getattr(parser, "rate_limiter", None) else None,
+                "rate_governor": parser.governor.stats() if getattr(parser, "governor", None) else None,
+            }
+            for key, parser in self.parsers.items()
+        }
@@ -1,6 +1,6 @@
 """
 Telegram Channel Parser
-- Exports text + media to JSON
+- Exports text + media to JSON (append-only segments, export.json materialized at the end)
 - Stores media on disk with channel/type structure
 - Supports incremental updates via state.json
 """
@@ -8,8 +8,8 @@ Telegram Channel Parser
 from __future__ import annotations
 
 import asyncio
+import functools
 import hashlib
-import json
 import logging
 import os
 import random
@@ -18,11 +18,12 @@ import shutil
 import sqlite3
 import time
 import zipfile
+from collections import deque
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Deque, Dict, List, MutableMapping, Optional, Tuple
 
 from telethon import TelegramClient
 from telethon.errors import FloodWaitError, SessionPasswordNeededError
@@ -31,6 +32,12 @@ from telethon.tl.functions.messages import GetHistoryRequest
 from telethon.tl.types import MessageMediaDocument, MessageMediaPhoto, MessageMediaPoll
 
 from errors import EXTERNAL_API_ERROR, PARTIAL_FAILURE, RATE_LIMIT, SESSION_LOCKED
+from export_store import open_export_store
+from jsonio import dumps, dumps_bytes, loads
+from media_file_index import MediaFileIndex
+from media_partial import PARTIAL_DIR_NAME, RESUMABLE_MIN_BYTES, PartialDownload, download_resumable
+from media_pipeline import KeyedLocks, MediaPipeline
+from rate_governor import FloodAwareTokenBucket, RateGovernor
 
 
 WINDOWS_BAD_CHARS = r'<>:"/\\|?*'
@@ -131,6 +138,64 @@ MODE_PRESETS = {
     "normal": ModeConfig(0.3, 0.8, 3, 3, 2, 900),
 }
 
+# Сколько страниц истории может ждать загрузки медиа, прежде чем листание остановится.
+MAX_PENDING_MEDIA_PAGES = 3
+
+# Размер страницы GetHistoryRequest (максимум API).
+HISTORY_PAGE_LIMIT = 100
+
+
+@dataclass
+class MediaJob:
+    """Задание пулу загрузки: медиа одного сообщения и куда его положить."""
+
+    msg_id: int
+    media: Any
+    mtype: str
+    known_size: int
+    target_dir: Path
+    final_name: str
+    file_key: Optional[str] = None
+
+
+class HashingSink:
+    """Файловый приёмник для `download_media(file=...)`: пишет на диск и считает SHA-256 на лету.
+
+    Дайджест готов сразу после загрузки — повторно читать файл не нужно.
+    Каждая попытка загрузки открывает новый приёмник (файл перезаписывается).
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._f = path.open("wb")
+
+    def write(self, data: bytes) -> int:
+        self._f.write(data)
+        self._hash.update(data)
+        self.size += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.size
+
+    def flush(self) -> None:
+        self._f.flush()
+
+    def close(self) -> None:
+        if not self._f.closed:
+            self._f.close()
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+    def __enter__(self) -> "HashingSink":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
 
 class JsonLogger:
     """JSONL-логгер с ротацией файлов.
@@ -195,10 +260,7 @@ class JsonLogger:
             data["run_id"] = self._run_id
         if error_code is not None:
             data["error_code"] = error_code
-        return json.dumps(
-            {"ts": utc_now_iso(), "level": level, "event": event, "data": data},
-            ensure_ascii=False,
-        )
+        return dumps({"ts": utc_now_iso(), "level": level, "event": event, "data": data})
 
     def info(
         self,
@@ -224,13 +286,21 @@ class TelegramParser:
         api_hash: str,
         session_file: str = "telegram_session",
         auth_state_dir: Optional[Path] = None,
+        rate_limiter: Optional[FloodAwareTokenBucket] = None,
+        governor: Optional[RateGovernor] = None,
     ):
         self.api_id = api_id
         self.api_hash = api_hash
         self.session_file = session_file
         self.auth_state_dir = auth_state_dir
+        # Общий лимитер запросов (parse-many: несколько каналов на одной сессии).
+        self.rate_limiter = rate_limiter
+        # Адаптивный темп по классам запросов; FloodWait останавливает все корутины клиента.
+        self.governor = governor or RateGovernor()
         self.client: Optional[TelegramClient] = None
         self._log = logging.getLogger("tg_parser.core")
+        # Копия медиа из другого канала: проверка hash_index и запись в него — под lock по sha256.
+        self._reuse_locks = KeyedLocks()
 
     def _auth_state_path(self) -> Optional[Path]:
         if not self.auth_state_dir:
@@ -382,17 +452,39 @@ class TelegramParser:
             out["post_id"] = post_id
         return out
 
-    async def _with_retries(self, coro_factory, logger: JsonLogger, mode_cfg: ModeConfig):
+    async def _with_retries(
+        self,
+        coro_factory,
+        logger: JsonLogger,
+        mode_cfg: ModeConfig,
+        request_class: str = "history",
+        stats: Optional[Dict[str, int]] = None,
+    ):
         retries = 0
         while True:
             try:
-                return await coro_factory()
+                await self.governor.acquire(request_class)
+                if self.rate_limiter:
+                    await self.rate_limiter.acquire()
+                result = await coro_factory()
+                self.governor.on_success(request_class)
+                return result
             except FileReferenceExpiredError:
                 raise
             except FloodWaitError as e:
                 wait_for = int(e.seconds) + mode_cfg.flood_extra_delay + random.randint(0, 2)
-                logger.error("flood_wait", {"seconds": int(e.seconds), "sleep": wait_for}, error_code=RATE_LIMIT)
-                await asyncio.sleep(wait_for)
+                logger.error(
+                    "flood_wait",
+                    {"seconds": int(e.seconds), "sleep": wait_for, "request_class": request_class},
+                    error_code=RATE_LIMIT,
+                )
+                if stats is not None:
+                    stats["flood_wait_events"] += 1
+                # FloodWait относится ко всей сессии: пауза для всех корутин клиента,
+                # повтор дождётся её окончания в acquire().
+                self.governor.on_flood(request_class, wait_for)
+                if self.rate_limiter:
+                    self.rate_limiter.pause(wait_for)
             except asyncio.TimeoutError as e:
                 retries += 1
                 if retries > mode_cfg.max_retries:
@@ -427,6 +519,9 @@ class TelegramParser:
         """Резолв канала/чата по ссылке t.me/..., @username или числовому id."""
         assert self.client
         normalized, _ = channel_identifier_from_input(channel_identifier)
+        await self.governor.acquire("get_entity")
+        if self.rate_limiter:
+            await self.rate_limiter.acquire()
         try:
             if re.fullmatch(r"-?\d+", normalized or ""):
                 return await self.client.get_entity(int(normalized))
@@ -453,16 +548,14 @@ class TelegramParser:
         if not path.exists():
             return default
         try:
-            with path.open("r", encoding="utf-8") as f:
-                return json.load(f)
+            return loads(path.read_bytes())
         except Exception:
             return default
 
     @staticmethod
     def _save_json(path: Path, value: Any) -> None:
         path.parent.mkdir(parents=True, exist_ok=True)
-        with path.open("w", encoding="utf-8") as f:
-            json.dump(value, f, ensure_ascii=False, indent=2)
+        path.write_bytes(dumps_bytes(value, pretty=True))
 
     @staticmethod
     def _media_type_and_ext(msg) -> Tuple[Optional[str], str, int]:
@@ -507,7 +600,32 @@ class TelegramParser:
         zip_output: bool = False,
         cleanup_temp: bool = True,
         run_id: Optional[str] = None,
+        materialize_export: bool = True,
+        media_concurrency: Optional[int] = None,
+        state_backend: str = "json",
+        backfill: bool = False,
     ) -> Dict[str, Any]:
+        """Выгрузить сообщения и медиа канала в каталог экспорта.
+
+        Сообщения каждого батча дописываются сегментом в append-only хранилище
+        (`segments/` + `manifest.json`); `export.json` собирается один раз в конце.
+
+        Args:
+            channel_identifier: Ссылка t.me/..., @username или числовой id.
+            output_dir: Корневой каталог экспорта.
+            mode: Режим скорости (`safe` | `normal`).
+            materialize_export: Собрать `export.json` в конце прогона. При False
+                export.json можно собрать позже командой `compact`.
+            media_concurrency: Число параллельных загрузок медиа; по умолчанию из режима.
+            state_backend: `json` (сегменты + state.json + media-index.json) или `sqlite`
+                (`export.sqlite3`, WAL). Каталог с уже созданной базой всегда открывается через SQLite.
+            backfill: Пролистать всю историю и дописать сообщения, которых нет в экспорте
+                (пропуски). По умолчанию повторный запуск запрашивает только id новее
+                `last_message_id` (min_id) и не листает старую историю.
+
+        Returns:
+            Словарь с summary, путями к файлам экспорта и списком new_messages.
+        """
         await self.connect()
         assert self.client
 
@@ -537,34 +655,33 @@ class TelegramParser:
         media_index_path = export_dir / "media-index.json"
         summary_path = export_dir / "summary.json"
 
-        export_data = self._load_json(
-            export_json_path,
-            {
-                "channel_info": {
-                    "id": channel_id,
-                    "username": username,
-                    "title": getattr(entity, "title", None),
-                },
-                "messages": [],
-                "export_date": utc_now_iso(),
-                "total_messages": 0,
+        store = open_export_store(
+            export_dir,
+            channel_info={
+                "id": channel_id,
+                "username": username,
+                "title": getattr(entity, "title", None),
             },
+            backend=state_backend,
+            create=not dry_run,
         )
+        if not dry_run:
+            store.ensure_initialized()
 
-        existing_messages = {int(m["id"]) for m in export_data.get("messages", []) if "id" in m}
-        state = self._load_json(
-            state_path,
+        existing_messages = store.message_ids()
+        state = store.load_state(
             {
                 "channel_id": channel_id,
                 "channel_username": username,
-                "last_message_id": max(existing_messages) if existing_messages else 0,
+                "last_message_id": store.last_message_id,
                 "last_update_at": None,
-                "messages_total": len(existing_messages),
+                "messages_total": store.messages_total,
                 "media_total": 0,
-            },
+            }
         )
-        media_index = self._load_json(media_index_path, {"sha256_to_path": {}})
-        hash_index: Dict[str, str] = media_index.get("sha256_to_path", {})
+        hash_index: MutableMapping[str, str] = store.media_index()
+        # Общий для всех каналов индекс по Telegram file id: дедуп ещё до загрузки.
+        file_index = MediaFileIndex(Path(output_dir))
 
         max_media_size_bytes = max_media_size_mb * 1024 * 1024 if max_media_size_mb else None
         from_dt = parse_date_utc(date_from)
@@ -572,312 +689,225 @@ class TelegramParser:
         keywords = [k.lower() for k in (keyword_filter or [])]
 
         new_messages: List[Dict[str, Any]] = []
-        known_size_bytes = 0
-        unknown_size_count = 0
-        media_saved_count = 0
-        media_skipped_size = 0
-        media_dedup_hits = 0
-        media_errors_count = 0
-        flood_wait_events = 0
+        stats: Dict[str, int] = {
+            "known_size_bytes": 0,
+            "unknown_size_count": 0,
+            "media_saved": 0,
+            "media_skipped_by_size": 0,
+            "media_file_id_hits": 0,
+            "media_sha_hits": 0,
+            "media_errors_count": 0,
+            "media_resumed": 0,
+            "flood_wait_events": 0,
+        }
         total_scanned = 0
 
         async def sleep_batch_jitter() -> None:
             await asyncio.sleep(random.uniform(mode_cfg.batch_delay_min, mode_cfg.batch_delay_max))
 
+        # Граница update-режима фиксируется на старте: state обновляется после каждого батча.
+        last_known_id = int(state.get("last_message_id", 0))
+        # Инкрементальный режим: сервер отдаёт только id > min_id, старая история не листается.
+        # backfill: вся история, пропускаются только уже сохранённые id (заполнение пропусков).
+        min_id = 0 if backfill else last_known_id
+        if backfill:
+            history_mode = "backfill"
+        elif min_id:
+            history_mode = "incremental"
+        else:
+            history_mode = "full"
+        logs.info("history_scan_started", {"history_mode": history_mode, "min_id": min_id})
         offset_id = 0
         stop = False
 
-        while not stop:
-            async def fetch_history_batch():
-                return await self.client(
-                    GetHistoryRequest(
-                        peer=entity,
-                        offset_id=offset_id,
-                        offset_date=None,
-                        add_offset=0,
-                        limit=100,
-                        max_id=0,
-                        min_id=0,
-                        hash=0,
-                    )
-                )
-
-            try:
-                history = await self._with_retries(fetch_history_batch, logs, mode_cfg)
-            except FloodWaitError:
-                flood_wait_events += 1
-                raise
-
-            if not history.messages:
-                break
-
-            for msg in history.messages:
-                total_scanned += 1
-                msg_id = int(msg.id)
-
-                # update mode: only new IDs
-                if msg_id <= int(state.get("last_message_id", 0)) or msg_id in existing_messages:
-                    continue
-
-                if isinstance(msg.media, MessageMediaPoll):
-                    continue
-
-                msg_date_iso = iso_from_telethon_date(getattr(msg, "date", None))
-                msg_date = msg.date.astimezone(timezone.utc) if getattr(msg, "date", None) else None
-
-                # Оптимизация: история листается от новых к старым.
-                # Если дошли до сообщений старше date_from — можно завершать выборку.
-                if from_dt and msg_date and msg_date < from_dt:
-                    stop = True
+        # Медиа качаются пулом из media_concurrency воркеров, пока листается история.
+        # Страницы фиксируются в хранилище строго по порядку, когда готовы все их медиа.
+        concurrency = max(1, int(media_concurrency or mode_cfg.media_concurrency))
+        pipeline: MediaPipeline[MediaJob, List[Dict[str, Any]]] = MediaPipeline(
+            functools.partial(
+                self._download_media_job,
+                entity=entity,
+                export_dir=export_dir,
+                temp_dir=temp_dir,
+                hash_index=hash_index,
+                file_index=file_index,
+                logs=logs,
+                mode_cfg=mode_cfg,
+                stats=stats,
+            ),
+            concurrency=concurrency,
+            # Один документ в нескольких сообщениях окна: один общий .part, загрузки — по очереди.
+            key=lambda job: job.file_key,
+        )
+        pending_pages: Deque[List[Tuple[Dict[str, Any], Optional[asyncio.Future]]]] = deque()
+
+        def commit_page(page: List[Tuple[Dict[str, Any], Optional[asyncio.Future]]]) -> None:
+            batch_messages: List[Dict[str, Any]] = []
+            for record, fut in page:
+                if fut is not None:
+                    record["media_files"] = fut.result()
+                batch_messages.append(record)
+            if not dry_run and batch_messages:
+                # Пишем только текущий батч (сегмент или транзакция SQLite) вместе со state и индексом.
+                store.commit_batch(batch_messages, state, hash_index)
+                file_index.save()
+            new_messages.extend(batch_messages)
+
+        async def commit_ready(drain: bool = False) -> None:
+            """Зафиксировать готовые страницы по порядку; при переполнении окна — дождаться головы."""
+            while pending_pages:
+                head = pending_pages[0]
+                futures = [f for _, f in head if f is not None]
+                must_wait = drain or len(pending_pages) > MAX_PENDING_MEDIA_PAGES
+                if futures and not must_wait and not all(f.done() for f in futures):
                     break
-                if to_dt and msg_date and msg_date > to_dt:
-                    continue
+                if futures:
+                    await asyncio.wait(futures)
+                pending_pages.popleft()
+                commit_page(head)
 
-                text = msg.message or ""
-                if keywords and not any(k in text.lower() for k in keywords):
-                    continue
+        pipeline.start()
+        try:
+            while not stop:
+                async def fetch_history_batch():
+                    return await self.client(
+                        GetHistoryRequest(
+                            peer=entity,
+                            offset_id=offset_id,
+                            offset_date=None,
+                            add_offset=0,
+                            limit=HISTORY_PAGE_LIMIT,
+                            max_id=0,
+                            min_id=min_id,
+                            hash=0,
+                        )
+                    )
 
-                media_files: List[Dict[str, Any]] = []
+                history = await self._with_retries(fetch_history_batch, logs, mode_cfg, "history", stats)
 
-                mtype, ext, known_size = self._media_type_and_ext(msg)
-                if mtype and known_size > 0:
-                    known_size_bytes += known_size
-                elif mtype:
-                    unknown_size_count += 1
+                if not history.messages:
+                    break
 
-                if mtype and not dry_run:
-                    if max_media_size_bytes and known_size and known_size > max_media_size_bytes:
-                        media_skipped_size += 1
-                    else:
-                        if mtype == "photo":
-                            target_dir = photos_dir
-                        elif mtype == "video":
-                            target_dir = videos_dir
+                page: List[Tuple[Dict[str, Any], Optional[asyncio.Future]]] = []
+                for msg in history.messages:
+                    total_scanned += 1
+                    msg_id = int(msg.id)
+
+                    # update mode: only new IDs; backfill — только отсутствующие в экспорте
+                    if (not backfill and msg_id <= last_known_id) or msg_id in existing_messages:
+                        continue
+
+                    if isinstance(msg.media, MessageMediaPoll):
+                        continue
+
+                    msg_date_iso = iso_from_telethon_date(getattr(msg, "date", None))
+                    msg_date = msg.date.astimezone(timezone.utc) if getattr(msg, "date", None) else None
+
+                    # Оптимизация: история листается от новых к старым.
+                    # Если дошли до сообщений старше date_from — можно завершать выборку.
+                    if from_dt and msg_date and msg_date < from_dt:
+                        stop = True
+                        break
+                    if to_dt and msg_date and msg_date > to_dt:
+                        continue
+
+                    text = msg.message or ""
+                    if keywords and not any(k in text.lower() for k in keywords):
+                        continue
+
+                    media_files: List[Dict[str, Any]] = []
+                    media_future: Optional[asyncio.Future] = None
+
+                    mtype, ext, known_size = self._media_type_and_ext(msg)
+                    if mtype and known_size > 0:
+                        stats["known_size_bytes"] += known_size
+                    elif mtype:
+                        stats["unknown_size_count"] += 1
+
+                    if mtype and not dry_run:
+                        if max_media_size_bytes and known_size and known_size > max_media_size_bytes:
+                            stats["media_skipped_by_size"] += 1
                         else:
-                            target_dir = docs_dir
-
-                        original_name = None
-                        if isinstance(msg.media, MessageMediaDocument) and msg.media.document:
-                            for a in msg.media.document.attributes:
-                                if hasattr(a, "file_name"):
-                                    original_name = a.file_name
-                                    break
-
-                        if original_name:
-                            clean_original = sanitize_name(original_name)
-                            base = f"{msg_id}_{Path(clean_original).stem}"
-                            base = limit_filename_base(base, 120)
-                            final_name = f"{base}{Path(clean_original).suffix or ext}"
-                        else:
-                            base = limit_filename_base(str(msg_id), 120)
-                            final_name = f"{base}{ext or '.bin'}"
-
-                        temp_path = temp_dir / f"tmp_{msg_id}_{random.randint(1000, 9999)}"
-                        media_to_dl = msg.media
-
-                        def _media_timeout_sec() -> int:
-                            """Таймаут загрузки: базовый или адаптивный по известному размеру (с потолком)."""
-                            base = mode_cfg.media_download_timeout_sec
-                            if not known_size or known_size <= 0:
-                                return base
-                            cap = 3600
-                            mb = known_size / (1024 * 1024)
-                            adaptive = base + int(mb * 60)
-                            return min(adaptive, cap)
-
-                        timeout_sec = _media_timeout_sec()
-                        async def dl_media(media=media_to_dl):
-                            return await asyncio.wait_for(
-                                self.client.download_media(media, file=str(temp_path)),
-                                timeout=timeout_sec,
+                            if mtype == "photo":
+                                target_dir = photos_dir
+                            elif mtype == "video":
+                                target_dir = videos_dir
+                            else:
+                                target_dir = docs_dir
+                            media_future = await pipeline.submit(
+                                MediaJob(
+                                    msg_id=msg_id,
+                                    media=msg.media,
+                                    mtype=mtype,
+                                    known_size=known_size,
+                                    target_dir=target_dir,
+                                    final_name=self._media_final_name(msg, msg_id, ext),
+                                    file_key=self._media_file_key(msg.media),
+                                )
                             )
 
-                        t0_media = time.monotonic()
-                        logs.info(
-                            "media_download_start",
+                    elif mtype and dry_run:
+                        media_files.append(
                             {
-                                "message_id": msg_id,
-                                "media_type": mtype,
-                                "known_size": known_size if known_size else None,
-                            },
+                                "type": mtype,
+                                "path": None,
+                                "filename": None,
+                                "size": known_size or None,
+                            }
                         )
 
-                        def _log_media_finish(outcome: str) -> None:
-                            dur = round(time.monotonic() - t0_media, 2)
-                            logs.info(
-                                "media_download_finished",
-                                {
-                                    "message_id": msg_id,
-                                    "media_type": mtype,
-                                    "duration_sec": dur,
-                                    "outcome": outcome,
-                                },
-                            )
-
-                        media_outcome = "error"
-                        try:
-                            downloaded_path_raw = await self._with_retries(dl_media, logs, mode_cfg)
-                        except FileReferenceExpiredError:
-                            logs.error("file_reference_expired", {"message_id": msg_id}, error_code=EXTERNAL_API_ERROR)
-                            fresh = await self.client.get_messages(entity, ids=msg_id)
-                            # Telethon may return either a single Message or a list-like container.
-                            if isinstance(fresh, (list, tuple)):
-                                fresh_msg = fresh[0] if fresh else None
-                            else:
-                                fresh_msg = fresh
-
-                            if fresh_msg and getattr(fresh_msg, "media", None):
-
-                                async def dl_fresh():
-                                    return await asyncio.wait_for(
-                                        self.client.download_media(fresh_msg.media, file=str(temp_path)),
-                                        timeout=timeout_sec,
-                                    )
-
-                                try:
-                                    downloaded_path_raw = await self._with_retries(dl_fresh, logs, mode_cfg)
-                                except Exception:
-                                    logs.error("file_reference_retry_failed", {"message_id": msg_id}, error_code=EXTERNAL_API_ERROR)
-                                    downloaded_path_raw = None
-                                    media_errors_count += 1
-                                    media_files.append(
-                                        {"type": mtype, "path": None, "filename": None, "error": "file_reference_expired"}
-                                    )
-                            else:
-                                downloaded_path_raw = None
-                                media_errors_count += 1
-                                media_files.append(
-                                    {"type": mtype, "path": None, "filename": None, "error": "file_reference_expired"}
-                                )
-
-                        except asyncio.TimeoutError:
-                            media_outcome = "timeout"
-                            logs.error("media_download_failed", {"message_id": msg_id, "error": "download_timeout"}, error_code=EXTERNAL_API_ERROR)
-                            downloaded_path_raw = None
-                            media_errors_count += 1
-                            media_files.append(
-                                {"type": mtype, "path": None, "filename": None, "error": "download_timeout"}
-                            )
-                        except Exception:
-                            media_outcome = "error"
-                            logs.error("media_download_failed", {"message_id": msg_id, "error": "retry_exhausted"}, error_code=EXTERNAL_API_ERROR)
-                            downloaded_path_raw = None
-                            media_errors_count += 1
-                            media_files.append(
-                                {"type": mtype, "path": None, "filename": None, "error": "retry_exhausted"}
-                            )
-
-                        try:
-                            if downloaded_path_raw:
-                                downloaded_path = Path(downloaded_path_raw)
-                                if downloaded_path.exists():
-                                    file_hash = self._sha256_file(downloaded_path)
-                                    existing_rel = hash_index.get(file_hash)
-                                    if existing_rel:
-                                        media_dedup_hits += 1
-                                        downloaded_path.unlink(missing_ok=True)
-                                        media_files.append(
-                                            {
-                                                "type": mtype,
-                                                "path": existing_rel,
-                                                "filename": Path(existing_rel).name,
-                                                "sha256": file_hash,
-                                            }
-                                        )
-                                        media_outcome = "success"
-                                    else:
-                                        final_path = target_dir / final_name
-                                        if final_path.exists():
-                                            alt_base = limit_filename_base(f"{Path(final_name).stem}_{short_hash(file_hash)}", 120)
-                                            final_path = target_dir / f"{alt_base}{final_path.suffix}"
-
-                                        shutil.move(str(downloaded_path), str(final_path))
-                                        rel_path = str(final_path.relative_to(export_dir)).replace("\\", "/")
-                                        hash_index[file_hash] = rel_path
-                                        media_saved_count += 1
-                                        media_files.append(
-                                            {
-                                                "type": mtype,
-                                                "path": rel_path,
-                                                "filename": final_path.name,
-                                                "size": final_path.stat().st_size,
-                                                "sha256": file_hash,
-                                            }
-                                        )
-                                        media_outcome = "success"
-                        finally:
-                            _log_media_finish(media_outcome)
-
-                elif mtype and dry_run:
-                    media_files.append(
-                        {
-                            "type": mtype,
-                            "path": None,
-                            "filename": None,
-                            "size": known_size or None,
+                    fwd = None
+                    if msg.fwd_from:
+                        fwd = {
+                            "from_name": getattr(msg.fwd_from, "from_name", None),
+                            "date": iso_from_telethon_date(getattr(msg.fwd_from, "date", None)),
+                            "channel_post_id": getattr(msg.fwd_from, "channel_post", None),
+                            "post_author": getattr(msg.fwd_from, "post_author", None),
                         }
-                    )
 
-                fwd = None
-                if msg.fwd_from:
-                    fwd = {
-                        "from_name": getattr(msg.fwd_from, "from_name", None),
-                        "date": iso_from_telethon_date(getattr(msg.fwd_from, "date", None)),
-                        "channel_post_id": getattr(msg.fwd_from, "channel_post", None),
-                        "post_author": getattr(msg.fwd_from, "post_author", None),
-                    }
+                    existing_messages.add(msg_id)
+                    page.append(
+                        (
+                            {
+                                "id": msg_id,
+                                "date": msg_date_iso,
+                                "text": text,
+                                "media_files": media_files,
+                                "forwarded": fwd,
+                                "reply_to_msg_id": msg.reply_to_msg_id,
+                                "views": getattr(msg, "views", None),
+                                "forwards": getattr(msg, "forwards", None),
+                            },
+                            media_future,
+                        )
+                    )
 
-                new_messages.append(
-                    {
-                        "id": msg_id,
-                        "date": msg_date_iso,
-                        "text": text,
-                        "media_files": media_files,
-                        "forwarded": fwd,
-                        "reply_to_msg_id": msg.reply_to_msg_id,
-                        "views": getattr(msg, "views", None),
-                        "forwards": getattr(msg, "forwards", None),
-                    }
-                )
+                pending_pages.append(page)
+                await commit_ready()
 
-            if not dry_run and new_messages:
-                all_messages = export_data.get("messages", []) + new_messages
-                all_messages.sort(key=lambda m: int(m.get("id", 0)))
-                export_data["messages"] = all_messages
-                export_data["export_date"] = utc_now_iso()
-                export_data["total_messages"] = len(all_messages)
-                state["last_message_id"] = max(int(m.get("id", 0)) for m in all_messages)
-                state["last_update_at"] = utc_now_iso()
-                state["messages_total"] = len(all_messages)
-                state["media_total"] = sum(len(m.get("media_files", [])) for m in all_messages)
-                self._save_json(export_json_path, export_data)
-                self._save_json(state_path, state)
-                self._save_json(media_index_path, {"sha256_to_path": hash_index})
-
-            if stop:
-                break
+                if stop:
+                    break
 
-            offset_id = history.messages[-1].id
-            await sleep_batch_jitter()
+                # Неполная страница — история (выше min_id) исчерпана, лишний запрос не нужен.
+                if len(history.messages) < HISTORY_PAGE_LIMIT:
+                    break
 
-        # merge/update
-        if not dry_run and new_messages:
-            all_messages = export_data.get("messages", []) + new_messages
-            all_messages.sort(key=lambda m: int(m.get("id", 0)))
-            export_data["messages"] = all_messages
-            export_data["export_date"] = utc_now_iso()
-            export_data["total_messages"] = len(all_messages)
+                offset_id = history.messages[-1].id
+                await sleep_batch_jitter()
 
-            state["last_message_id"] = max([int(m.get("id", 0)) for m in all_messages], default=0)
-            state["last_update_at"] = utc_now_iso()
-            state["messages_total"] = len(all_messages)
-            state["media_total"] = sum(len(m.get("media_files", [])) for m in all_messages)
+            await commit_ready(drain=True)
+            await pipeline.close()
+        except BaseException:
+            await pipeline.cancel()
+            store.close()
+            raise
 
-            self._save_json(export_json_path, export_data)
-            self._save_json(state_path, state)
-            self._save_json(media_index_path, {"sha256_to_path": hash_index})
+        # export.json собирается из хранилища один раз за прогон.
+        if not dry_run and materialize_export and (new_messages or (store.has_messages and not export_json_path.exists())):
+            store.materialize()
+        store.close()
 
-        partial_failure = not dry_run and media_errors_count > 0
+        partial_failure = not dry_run and stats["media_errors_count"] > 0
         summary = {
             "run_at": utc_now_iso(),
             "run_id": run_id,
@@ -889,14 +919,21 @@ class TelegramParser:
             "date_to": date_to,
             "scanned_messages": total_scanned,
             "new_messages": len(new_messages),
-            "media_saved": media_saved_count,
-            "media_skipped_by_size": media_skipped_size,
-            "media_dedup_hits": media_dedup_hits,
-            "media_errors_count": media_errors_count,
+            "media_saved": stats["media_saved"],
+            "media_skipped_by_size": stats["media_skipped_by_size"],
+            "media_dedup_hits": stats["media_file_id_hits"] + stats["media_sha_hits"],
+            "media_file_id_hits": stats["media_file_id_hits"],
+            "media_sha_hits": stats["media_sha_hits"],
+            "media_errors_count": stats["media_errors_count"],
+            "media_resumed": stats["media_resumed"],
             "partial_failure": partial_failure,
-            "known_size_mb": round(known_size_bytes / (1024 * 1024), 3),
-            "unknown_size_count": unknown_size_count,
-            "flood_wait_events": flood_wait_events,
+            "known_size_mb": round(stats["known_size_bytes"] / (1024 * 1024), 3),
+            "unknown_size_count": stats["unknown_size_count"],
+            "flood_wait_events": stats["flood_wait_events"],
+            "rate_governor": self.governor.stats(),
+            "history_mode": history_mode,
+            "media_concurrency": concurrency,
+            "state_backend": store.backend,
             "export_dir": str(export_dir),
         }
         self._save_json(summary_path, summary)
@@ -906,7 +943,7 @@ class TelegramParser:
             archive_path = export_dir.with_suffix(".zip")
             with zipfile.ZipFile(archive_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
                 for p in export_dir.rglob("*"):
-                    if p.is_file() and ".tmp" not in p.parts:
+                    if p.is_file() and ".tmp" not in p.parts and PARTIAL_DIR_NAME not in p.parts:
                         zf.write(p, p.relative_to(export_dir.parent))
 
         if cleanup_temp and temp_dir.exists():
@@ -923,6 +960,7 @@ class TelegramParser:
             "partial_failure": partial_failure,
             "export_dir": str(export_dir),
             "export_json": str(export_json_path),
+            "export_manifest": str(store.index_path),
             "state_json": str(state_path),
             "media_index_json": str(media_index_path),
             "summary_json": str(summary_path),
@@ -930,6 +968,291 @@ class TelegramParser:
             "new_messages": new_messages,
         }
 
+    @staticmethod
+    def _media_final_name(msg, msg_id: int, ext: str) -> str:
+        """Имя файла медиа: `<msg_id>_<оригинальное имя>` или `<msg_id><ext>`."""
+        original_name = None
+        if isinstance(msg.media, MessageMediaDocument) and msg.media.document:
+            for a in msg.media.document.attributes:
+                if hasattr(a, "file_name"):
+                    original_name = a.file_name
+                    break
+
+        if original_name:
+            clean_original = sanitize_name(original_name)
+            base = f"{msg_id}_{Path(clean_original).stem}"
+            base = limit_filename_base(base, 120)
+            return f"{base}{Path(clean_original).suffix or ext}"
+        base = limit_filename_base(str(msg_id), 120)
+        return f"{base}{ext or '.bin'}"
+
+    async def _download_media_job(
+        self,
+        job: MediaJob,
+        *,
+        entity: Any,
+        export_dir: Path,
+        temp_dir: Path,
+        hash_index: MutableMapping[str, str],
+        file_index: MediaFileIndex,
+        logs: JsonLogger,
+        mode_cfg: ModeConfig,
+        stats: Dict[str, int],
+    ) -> List[Dict[str, Any]]:
+        """Загрузить медиа одного сообщения (воркер MediaPipeline).
+
+        Сначала ищет медиа в индексе по Telegram file id — при попадании загрузки
+        нет. Иначе скачивает во временный файл с таймаутом и retry (большие документы —
+        частями в `.partial/` с докачкой с последнего смещения), дедуплицирует
+        по SHA-256 и переносит в каталог по типу. Ошибки загрузки не пробрасываются, а
+        возвращаются элементом с полем `error`.
+
+        Returns:
+            Список media_files для сообщения.
+        """
+        assert self.client
+        msg_id = job.msg_id
+        mtype = job.mtype
+        known_size = job.known_size
+        media_files: List[Dict[str, Any]] = []
+
+        reused = await self._reuse_indexed_media(job, export_dir=export_dir, hash_index=hash_index, file_index=file_index)
+        if reused is not None:
+            stats["media_file_id_hits"] += 1
+            logs.info("media_dedup_file_id", {"message_id": msg_id, "media_type": mtype, "path": reused["path"]})
+            return [reused]
+
+        temp_path = temp_dir / f"tmp_{msg_id}_{random.randint(1000, 9999)}"
+
+        def _media_timeout_sec() -> int:
+            """Таймаут загрузки: базовый или адаптивный по известному размеру (с потолком)."""
+            base = mode_cfg.media_download_timeout_sec
+            if not known_size or known_size <= 0:
+                return base
+            cap = 3600
+            mb = known_size / (1024 * 1024)
+            adaptive = base + int(mb * 60)
+            return min(adaptive, cap)
+
+        timeout_sec = _media_timeout_sec()
+
+        streamed_hash: Optional[str] = None
+
+        # Большие документы качаются частями в .partial/ и докачиваются после таймаута или в новом запуске.
+        partial: Optional[PartialDownload] = None
+        if job.file_key and job.file_key.startswith("document:") and known_size >= RESUMABLE_MIN_BYTES:
+            partial = PartialDownload(export_dir / PARTIAL_DIR_NAME, job.file_key, known_size)
+
+        async def download_hashed(media) -> Optional[str]:
+            """Скачать медиа в temp_path через HashingSink: SHA-256 считается по ходу записи."""
+            nonlocal streamed_hash
+            streamed_hash = None
+            if partial is not None:
+                part_path, streamed_hash = await download_resumable(self.client, media, partial, stats=stats)
+                return str(part_path)
+            with HashingSink(temp_path) as sink:
+                result = await asyncio.wait_for(
+                    self.client.download_media(media, file=sink),
+                    timeout=timeout_sec,
+                )
+            if result is None:
+                temp_path.unlink(missing_ok=True)
+                return None
+            streamed_hash = sink.hexdigest()
+            return str(temp_path)
+
+        async def dl_media(media=job.media):
+            return await download_hashed(media)
+
+        t0_media = time.monotonic()
+        logs.info(
+            "media_download_start",
+            {
+                "message_id": msg_id,
+                "media_type": mtype,
+                "known_size": known_size if known_size else None,
+            },
+        )
+
+        def _log_media_finish(outcome: str) -> None:
+            dur = round(time.monotonic() - t0_media, 2)
+            logs.info(
+                "media_download_finished",
+                {
+                    "message_id": msg_id,
+                    "media_type": mtype,
+                    "duration_sec": dur,
+                    "outcome": outcome,
+                },
+            )
+
+        media_outcome = "error"
+        try:
+            downloaded_path_raw = await self._with_retries(dl_media, logs, mode_cfg, "download", stats)
+        except FileReferenceExpiredError:
+            logs.error("file_reference_expired", {"message_id": msg_id}, error_code=EXTERNAL_API_ERROR)
+            await self.governor.acquire("history")
+            fresh = await self.client.get_messages(entity, ids=msg_id)
+            # Telethon may return either a single Message or a list-like container.
+            if isinstance(fresh, (list, tuple)):
+                fresh_msg = fresh[0] if fresh else None
+            else:
+                fresh_msg = fresh
+
+            if fresh_msg and getattr(fresh_msg, "media", None):
+
+                async def dl_fresh():
+                    return await download_hashed(fresh_msg.media)
+
+                try:
+                    downloaded_path_raw = await self._with_retries(dl_fresh, logs, mode_cfg, "download", stats)
+                except Exception:
+                    logs.error("file_reference_retry_failed", {"message_id": msg_id}, error_code=EXTERNAL_API_ERROR)
+                    downloaded_path_raw = None
+                    stats["media_errors_count"] += 1
+                    media_files.append(
+                        {"type": mtype, "path": None, "filename": None, "error": "file_reference_expired"}
+                    )
+            else:
+                downloaded_path_raw = None
+                stats["media_errors_count"] += 1
+                media_files.append(
+                    {"type": mtype, "path": None, "filename": None, "error": "file_reference_expired"}
+                )
+
+        except asyncio.TimeoutError:
+            media_outcome = "timeout"
+            logs.error("media_download_failed", {"message_id": msg_id, "error": "download_timeout"}, error_code=EXTERNAL_API_ERROR)
+            downloaded_path_raw = None
+            stats["media_errors_count"] += 1
+            media_files.append(
+                {"type": mtype, "path": None, "filename": None, "error": "download_timeout"}
+            )
+        except Exception:
+            media_outcome = "error"
+            logs.error("media_download_failed", {"message_id": msg_id, "error": "retry_exhausted"}, error_code=EXTERNAL_API_ERROR)
+            downloaded_path_raw = None
+            stats["media_errors_count"] += 1
+            media_files.append(
+                {"type": mtype, "path": None, "filename": None, "error": "retry_exhausted"}
+            )
+
+        try:
+            if downloaded_path_raw:
+                downloaded_path = Path(downloaded_path_raw)
+                if downloaded_path.exists():
+                    # Хеш уже посчитан при загрузке; чтение файла — только запасной путь.
+                    file_hash = streamed_hash or self._sha256_file(downloaded_path)
+                    existing_rel = hash_index.get(file_hash)
+                    if existing_rel:
+                        stats["media_sha_hits"] += 1
+                        downloaded_path.unlink(missing_ok=True)
+                        if job.file_key:
+                            file_index.put(job.file_key, export_dir / existing_rel, file_hash)
+                        media_files.append(
+                            {
+                                "type": mtype,
+                                "path": existing_rel,
+                                "filename": Path(existing_rel).name,
+                                "sha256": file_hash,
+                            }
+                        )
+                        media_outcome = "success"
+                    else:
+                        final_path = self._unique_media_path(job, file_hash)
+                        shutil.move(str(downloaded_path), str(final_path))
+                        rel_path = str(final_path.relative_to(export_dir)).replace("\\", "/")
+                        hash_index[file_hash] = rel_path
+                        if job.file_key:
+                            file_index.put(job.file_key, final_path, file_hash)
+                        stats["media_saved"] += 1
+                        media_files.append(
+                            {
+                                "type": mtype,
+                                "path": rel_path,
+                                "filename": final_path.name,
+                                "size": final_path.stat().st_size,
+                                "sha256": file_hash,
+                            }
+                        )
+                        media_outcome = "success"
+                else:
+                    downloaded_path_raw = None
+            if not downloaded_path_raw and not media_files:
+                # download_media ничего не вернул или файл исчез: сообщение не должно молча остаться без медиа.
+                logs.error("media_download_failed", {"message_id": msg_id, "error": "download_missing"}, error_code=EXTERNAL_API_ERROR)
+                stats["media_errors_count"] += 1
+                media_files.append({"type": mtype, "path": None, "filename": None, "error": "download_missing"})
+        finally:
+            _log_media_finish(media_outcome)
+        return media_files
+
+    @staticmethod
+    def _media_file_key(media: Any) -> Optional[str]:
+        """Ключ индекса по Telegram file id: `photo:<id>` / `document:<id>` (None, если id нет)."""
+        if isinstance(media, MessageMediaPhoto) and getattr(media, "photo", None) is not None:
+            file_id = getattr(media.photo, "id", None)
+            return MediaFileIndex.make_key("photo", file_id) if file_id else None
+        if isinstance(media, MessageMediaDocument) and getattr(media, "document", None) is not None:
+            file_id = getattr(media.document, "id", None)
+            return MediaFileIndex.make_key("document", file_id) if file_id else None
+        return None
+
+    @staticmethod
+    def _unique_media_path(job: MediaJob, file_hash: str) -> Path:
+        """Путь для нового файла медиа; при занятом имени добавляется короткий хеш."""
+        final_path = job.target_dir / job.final_name
+        if final_path.exists():
+            alt_base = limit_filename_base(f"{Path(job.final_name).stem}_{short_hash(file_hash)}", 120)
+            final_path = job.target_dir / f"{alt_base}{final_path.suffix}"
+        return final_path
+
+    async def _reuse_indexed_media(
+        self,
+        job: MediaJob,
+        *,
+        export_dir: Path,
+        hash_index: MutableMapping[str, str],
+        file_index: MediaFileIndex,
+    ) -> Optional[Dict[str, Any]]:
+        """Найти медиа в индексе по file id и вернуть элемент media_files без загрузки.
+
+        Файл из этого же экспорта переиспользуется по пути; файл другого канала
+        попадает в экспорт жёсткой ссылкой или копией (экспорт остаётся
+        самодостаточным). Копирование идёт в потоке, цикл событий не блокируется;
+        проверка hash_index, копия и запись в него — под lock по sha256, чтобы
+        два задания с одним содержимым не скопировали файл дважды.
+        """
+        if not job.file_key:
+            return None
+        hit = file_index.lookup(job.file_key)
+        if hit is None:
+            return None
+        src_path, file_hash = hit
+        try:
+            rel_path = str(src_path.resolve().relative_to(export_dir.resolve())).replace("\\", "/")
+        except ValueError:
+            async with self._reuse_locks.hold(file_hash or job.file_key):
+                rel_path = hash_index.get(file_hash) if file_hash else None
+                if not rel_path or not (export_dir / rel_path).is_file():
+                    final_path = self._unique_media_path(job, file_hash or short_hash(job.file_key))
+                    await asyncio.to_thread(self._link_or_copy, src_path, final_path)
+                    rel_path = str(final_path.relative_to(export_dir)).replace("\\", "/")
+                    if file_hash:
+                        hash_index[file_hash] = rel_path
+        entry: Dict[str, Any] = {"type": job.mtype, "path": rel_path, "filename": Path(rel_path).name}
+        if file_hash:
+            entry["sha256"] = file_hash
+        return entry
+
+    @staticmethod
+    def _link_or_copy(src: Path, dst: Path) -> None:
+        """Жёсткая ссылка (тот же том — без копирования байтов), иначе копия."""
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+
     @staticmethod
     def _sha256_file(path: Path) -> str:
         h = hashlib.sha256()
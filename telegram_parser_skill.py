@@ -19,7 +19,11 @@ sys.path.append(os.path.dirname(__file__))
 from errors import AUTH_ERROR, CONFIG_ERROR, SESSION_LOCKED  # noqa: E402
 from exit_codes import EXIT_FAILURE, EXIT_INTERRUPTED, EXIT_PARTIAL, EXIT_SUCCESS  # noqa: E402
 from logging_setup import setup_app_logging  # noqa: E402
+from multi_channel import parse_many, read_channel_list  # noqa: E402
+from rate_governor import FloodAwareTokenBucket  # noqa: E402
+from export_store import STATE_BACKENDS, open_export_store  # noqa: E402
 from session_lock import session_lock  # noqa: E402
+from session_pool import AFFINITY_NAME, SessionPool  # noqa: E402
 from telegram_parser import TelegramParser  # noqa: E402
 
 
@@ -61,8 +65,11 @@ def build_parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(description="Telegram channel parser to JSON + media")
     p.add_argument(
         "command",
-        choices=["channels", "parse", "resolve"],
-        help="Command: channels — список каналов, parse — парсинг, resolve — id по ссылке",
+        choices=["channels", "parse", "parse-many", "resolve", "compact"],
+        help=(
+            "Command: channels — список каналов, parse — парсинг, parse-many — парсинг списка каналов, "
+            "resolve — id по ссылке, compact — слить сегменты и собрать export.json"
+        ),
     )
     p.add_argument(
         "--channel",
@@ -79,12 +86,215 @@ def build_parser() -> argparse.ArgumentParser:
     p.add_argument("--output-dir", default=DEFAULT_OUTPUT, help="Base output directory")
     p.add_argument("--session-file", default="telegram_session", help="Telethon session name")
     p.add_argument("--no-cleanup-temp", action="store_true", help="Keep temp files")
+    p.add_argument(
+        "--defer-export",
+        action="store_true",
+        help="Не собирать export.json в конце parse (только сегменты; собрать позже командой compact)",
+    )
+    p.add_argument("--export-dir", type=str, help="Каталог экспорта канала (для compact)")
+    p.add_argument(
+        "--channels-file",
+        type=str,
+        help="Файл со списком каналов для parse-many (по одному на строку, # — комментарий)",
+    )
+    p.add_argument(
+        "--channel-concurrency",
+        type=int,
+        default=3,
+        help="parse-many: сколько каналов парсить одновременно",
+    )
+    p.add_argument(
+        "--rate-limit",
+        type=float,
+        default=1.0,
+        help="parse-many: общий лимит запросов к Telegram в секунду (0 — без лимита)",
+    )
+    p.add_argument(
+        "--session-pool",
+        nargs="+",
+        metavar="SESSION",
+        help=(
+            "parse-many: несколько сессий (аккаунтов); каналы распределяются между ними, "
+            "--channel-concurrency и --rate-limit действуют на каждую сессию"
+        ),
+    )
+    p.add_argument(
+        "--no-resume",
+        action="store_true",
+        help="parse-many: начать новый прогон, не пропуская каналы из незавершённого checkpoint",
+    )
+    p.add_argument(
+        "--media-concurrency",
+        type=int,
+        help="Число параллельных загрузок медиа (по умолчанию из режима: safe=1, normal=2)",
+    )
+    p.add_argument(
+        "--backfill",
+        action="store_true",
+        help="Пролистать всю историю и дописать пропущенные сообщения (по умолчанию — только новее last_message_id)",
+    )
+    p.add_argument(
+        "--state-backend",
+        choices=list(STATE_BACKENDS),
+        default="json",
+        help="Хранилище экспорта: json (сегменты + state.json + media-index.json) или sqlite (export.sqlite3)",
+    )
     return p
 
 
+def run_compact(args: argparse.Namespace) -> int:
+    """Компактизировать хранилище каталога экспорта и собрать export.json (без Telegram).
+
+    Args:
+        args: Аргументы CLI (используется --export-dir).
+
+    Returns:
+        Код выхода.
+    """
+    log = logging.getLogger("tg_parser.cli")
+    if not args.export_dir:
+        log.error("Команда compact без --export-dir", extra={"error_code": CONFIG_ERROR})
+        _print_err_utf8("Error: --export-dir is required for compact")
+        return EXIT_FAILURE
+    export_dir = Path(args.export_dir)
+    if not export_dir.is_dir():
+        log.error("Каталог экспорта не найден: %s", export_dir, extra={"error_code": CONFIG_ERROR})
+        _print_err_utf8(f"Error: export dir not found: {export_dir}")
+        return EXIT_FAILURE
+    store = open_export_store(export_dir)
+    try:
+        total = store.compact()
+        export_json = store.materialize()
+    finally:
+        store.close()
+    log.info("Команда compact (export_dir=%s, messages=%s)", export_dir, total)
+    _print_utf8(
+        json.dumps(
+            {"export_dir": str(export_dir), "export_json": str(export_json), "total_messages": total},
+            ensure_ascii=False,
+            indent=2,
+        )
+    )
+    return EXIT_SUCCESS
+
+
+async def run_parse_many(
+    args: argparse.Namespace,
+    parser: TelegramParser | None,
+    run_id: str | None,
+    pool: SessionPool | None = None,
+) -> int:
+    """Распарсить каналы из --channels-file параллельно на одной сессии или на пуле сессий.
+
+    Args:
+        args: Аргументы CLI.
+        parser: Парсер с общим клиентом и лимитером запросов (без пула).
+        run_id: Correlation id запуска.
+        pool: Арендованный пул сессий (--session-pool).
+
+    Returns:
+        Код выхода по итогам всех каналов.
+    """
+    log = logging.getLogger("tg_parser.cli")
+    if not args.channels_file:
+        log.error("Команда parse-many без --channels-file", extra={"error_code": CONFIG_ERROR})
+        _print_err_utf8("Error: --channels-file is required for parse-many")
+        return EXIT_FAILURE
+    channels_file = Path(args.channels_file)
+    if not channels_file.is_file():
+        log.error("Файл списка каналов не найден: %s", channels_file, extra={"error_code": CONFIG_ERROR})
+        _print_err_utf8(f"Error: channels file not found: {channels_file}")
+        return EXIT_FAILURE
+    channels = read_channel_list(channels_file)
+    if not channels:
+        log.error("Пустой список каналов: %s", channels_file, extra={"error_code": CONFIG_ERROR})
+        _print_err_utf8(f"Error: no channels in {channels_file}")
+        return EXIT_FAILURE
+
+    log.info(
+        "Команда parse-many (channels=%s, sessions=%s, concurrency=%s, rate_limit=%s, mode=%s, output_dir=%s)",
+        len(channels),
+        len(pool) if pool is not None else 1,
+        args.channel_concurrency,
+        args.rate_limit,
+        args.mode,
+        args.output_dir,
+    )
+    # Авторизация один раз до запуска каналов: ошибка входа не размножается на весь список.
+    if pool is not None:
+        await pool.connect_all()
+    else:
+        await parser.connect()
+    summary = await parse_many(
+        parser,
+        channels,
+        args.output_dir,
+        concurrency=args.channel_concurrency,
+        resume=not args.no_resume,
+        run_id=run_id,
+        parse_kwargs={
+            "mode": args.mode,
+            "date_from": args.date_from,
+            "date_to": args.date_to,
+            "keyword_filter": args.keyword_filter,
+            "max_media_size_mb": args.max_media_size,
+            "dry_run": args.dry_run,
+            "zip_output": args.zip,
+            "cleanup_temp": not args.no_cleanup_temp,
+            "materialize_export": not args.defer_export,
+            "media_concurrency": args.media_concurrency,
+            "state_backend": args.state_backend,
+            "backfill": args.backfill,
+        },
+        pool=pool,
+    )
+    _print_utf8(json.dumps(summary, ensure_ascii=False, indent=2))
+    return int(summary["exit_code"])
+
+
+async def run_parse_many_pool(args: argparse.Namespace, api_id: str, api_hash: str, run_id: str | None) -> int:
+    """parse-many на пуле сессий: каждая сессия арендуется отдельно, занятые пропускаются.
+
+    Returns:
+        Код выхода по итогам всех каналов.
+    """
+    log = logging.getLogger("tg_parser.cli")
+
+    def make_parser(session_file: str, rate_limiter: FloodAwareTokenBucket) -> TelegramParser:
+        return TelegramParser(
+            api_id=api_id,
+            api_hash=api_hash,
+            session_file=session_file,
+            auth_state_dir=Path(__file__).parent / "logs",
+            rate_limiter=rate_limiter,
+        )
+
+    with SessionPool(
+        args.session_pool,
+        make_parser,
+        affinity_path=Path(args.output_dir) / AFFINITY_NAME,
+        rate_limit=args.rate_limit,
+    ) as pool:
+        if not len(pool):
+            log.error(
+                "Все сессии пула заняты другими процессами: %s",
+                args.session_pool,
+                extra={"error_code": SESSION_LOCKED},
+            )
+            _print_err_utf8("Error: all sessions in --session-pool are locked by other processes")
+            return EXIT_FAILURE
+        try:
+            return await run_parse_many(args, None, run_id, pool=pool)
+        finally:
+            await pool.disconnect_all()
+
+
 async def run(args: argparse.Namespace, run_id: str | None = None) -> int:
     log = logging.getLogger("tg_parser.cli")
 
+    if args.command == "compact":
+        return run_compact(args)
+
     api_id = os.getenv("TELEGRAM_API_ID")
     api_hash = os.getenv("TELEGRAM_API_HASH")
 
@@ -96,11 +306,15 @@ async def run(args: argparse.Namespace, run_id: str | None = None) -> int:
         _print_err_utf8("Error: TELEGRAM_API_ID and TELEGRAM_API_HASH are required in .env")
         return EXIT_FAILURE
 
+    if args.command == "parse-many" and args.session_pool:
+        return await run_parse_many_pool(args, api_id, api_hash, run_id)
+
     parser = TelegramParser(
         api_id=api_id,
         api_hash=api_hash,
         session_file=args.session_file,
         auth_state_dir=Path(__file__).parent / "logs",
+        rate_limiter=FloodAwareTokenBucket(args.rate_limit) if args.command == "parse-many" else None,
     )
 
     try:
@@ -151,6 +365,10 @@ async def run(args: argparse.Namespace, run_id: str | None = None) -> int:
                 zip_output=args.zip,
                 cleanup_temp=not args.no_cleanup_temp,
                 run_id=run_id,
+                materialize_export=not args.defer_export,
+                media_concurrency=args.media_concurrency,
+                state_backend=args.state_backend,
+                backfill=args.backfill,
             )
 
             _print_utf8(json.dumps(result, ensure_ascii=False, indent=2))
@@ -158,6 +376,9 @@ async def run(args: argparse.Namespace, run_id: str | None = None) -> int:
                 return EXIT_PARTIAL
             return EXIT_SUCCESS
 
+        if args.command == "parse-many":
+            return await run_parse_many(args, parser, run_id)
+
         return EXIT_FAILURE
     except RuntimeError as e:
         msg = str(e)
@@ -201,7 +422,8 @@ def main() -> int:
                 _print_err_utf8(f"Error: {e}")
                 return EXIT_FAILURE
 
-    if args.command == "parse":
+    # С --session-pool каждая сессия арендуется внутри пула.
+    if args.command == "parse" or (args.command == "parse-many" and not args.session_pool):
         return _run_with_lock()
     try:
         return asyncio.run(run(args, run_id=run_id))
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Тесты JSON-слоя (jsonio): формат pretty/compact совпадает со stdlib, fallback
+на stdlib для объектов, которые orjson не сериализует, loads из str и bytes.
+
+Запуск из корня проекта:
+  python tests/test_jsonio.py
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import jsonio  # noqa: E402
+from jsonio import dumps, dumps_bytes, loads  # noqa: E402
+
+SAMPLE = {
+    "id": 7,
+    "text": "Сообщение «7»",
+    "media_files": [{"type": "photo", "path": "media/photos/7.jpg"}],
+    "empty": [],
+    "nested": {},
+    "forwarded": None,
+    "views": 1.5,
+    "flag": True,
+}
+
+
+def test_pretty_matches_stdlib_indent2() -> bool:
+    """pretty=True — байт в байт как json.dumps(ensure_ascii=False, indent=2) (export.json не меняется)."""
+    expected = json.dumps(SAMPLE, ensure_ascii=False, indent=2)
+    assert dumps(SAMPLE, pretty=True) == expected
+    assert dumps_bytes(SAMPLE, pretty=True) == expected.encode("utf-8")
+    return True
+
+
+def test_compact_has_no_spaces_and_roundtrips() -> bool:
+    """Компактный режим: разделители без пробелов, кириллица не экранируется, int-ключи — строки."""
+    text = dumps({"a": [1, 2], "б": "в", 3: "x"})
+    assert text == '{"a":[1,2],"б":"в","3":"x"}', text
+    assert loads(text) == {"a": [1, 2], "б": "в", "3": "x"}
+    assert loads(text.encode("utf-8")) == loads(text)
+    assert dumps({"b": 1, "a": 2}, sort_keys=True) == '{"a":2,"b":1}'
+    return True
+
+
+def test_fallback_to_stdlib() -> bool:
+    """int вне 64 бит orjson не пишет — ответ даёт stdlib; default работает у обоих бэкендов."""
+    assert loads(dumps({"big": 2 ** 70})) == {"big": 2 ** 70}
+
+    class Point:
+        pass
+
+    assert dumps([Point()], default=lambda o: "point") == '["point"]'
+    try:
+        dumps(Point())
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("ожидался TypeError для несериализуемого объекта")
+    return True
+
+
+def test_loads_error_is_value_error() -> bool:
+    """Битый JSON — ValueError при любом бэкенде (вызывающий код ловит ValueError)."""
+    for bad in ("{not json", b'{"a":'):
+        try:
+            loads(bad)
+        except ValueError:
+            continue
+        raise AssertionError(f"ожидался ValueError для {bad!r}")
+    assert jsonio.BACKEND in ("orjson", "json")
+    return True
+
+
+def run_all() -> bool:
+    cases = [
+        ("pretty matches stdlib indent=2", test_pretty_matches_stdlib_indent2),
+        ("compact has no spaces and roundtrips", test_compact_has_no_spaces_and_roundtrips),
+        ("fallback to stdlib", test_fallback_to_stdlib),
+        ("loads error is ValueError", test_loads_error_is_value_error),
+    ]
+    ok = 0
+    for name, fn in cases:
+        try:
+            if fn():
+                ok += 1
+                print(f"  OK {name}")
+            else:
+                print(f"  FAIL {name}")
+        except Exception as e:
+            print(f"  FAIL {name}: {e}")
+    return ok == len(cases)
+
+
+if __name__ == "__main__":
+    print(f"jsonio tests (backend={jsonio.BACKEND})")
+    sys.exit(0 if run_all() else 1)
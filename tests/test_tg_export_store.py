@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Unit-тесты хранилищ экспорта: сегменты (export_store) — append, manifest, compact, materialize;
+SQLite (export_store_sqlite) — commit_batch, state, индекс SHA-256, импорт JSON-экспорта.
+
+Запуск из корня проекта:
+  python tests/test_tg_export_store.py
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from export_store import SegmentedExportStore, open_export_store
+from export_store_sqlite import DB_NAME, SqliteExportStore
+
+
+CHANNEL_INFO = {"id": 42, "username": "chan", "title": "Канал"}
+
+
+def _msg(i: int, media: int = 0) -> dict:
+    return {
+        "id": i,
+        "date": "2026-02-17T12:00:00Z",
+        "text": f"Сообщение {i}",
+        "media_files": [{"type": "photo", "path": f"media/photos/{i}.jpg", "filename": f"{i}.jpg"}] * media,
+        "forwarded": None,
+        "reply_to_msg_id": None,
+        "views": i,
+        "forwards": 0,
+    }
+
+
+def test_append_batch_writes_segment_and_manifest() -> bool:
+    """Каждый батч — отдельный сегмент; manifest хранит счётчики и last_message_id."""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SegmentedExportStore(Path(tmp), channel_info=CHANNEL_INFO)
+        store.append_batch([_msg(5, media=1), _msg(4)])
+        store.append_batch([_msg(3), _msg(2, media=2)])
+        assert store.segments_count == 2
+        assert store.messages_total == 4
+        assert store.media_total == 3
+        assert store.last_message_id == 5
+        assert len(list((Path(tmp) / "segments").glob("seg-*.jsonl"))) == 2
+
+        reopened = SegmentedExportStore(Path(tmp))
+        assert reopened.messages_total == 4
+        assert reopened.channel_info == CHANNEL_INFO
+        assert reopened.message_ids() == {2, 3, 4, 5}
+    return True
+
+
+def test_materialize_matches_json_dump_format() -> bool:
+    """export.json из сегментов идентичен прежнему json.dump(indent=2) отсортированных сообщений."""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SegmentedExportStore(Path(tmp), channel_info=CHANNEL_INFO)
+        store.append_batch([_msg(9), _msg(8, media=1)])
+        store.append_batch([_msg(3), _msg(1)])
+        path = store.materialize(export_date="2026-02-17T18:57:17Z")
+        expected = {
+            "channel_info": CHANNEL_INFO,
+            "messages": [_msg(1), _msg(3), _msg(8, media=1), _msg(9)],
+            "export_date": "2026-02-17T18:57:17Z",
+            "total_messages": 4,
+        }
+        assert path.read_text(encoding="utf-8") == json.dumps(expected, ensure_ascii=False, indent=2)
+    return True
+
+
+def test_materialize_empty_store() -> bool:
+    """Пустое хранилище даёт валидный export.json с пустым массивом messages."""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SegmentedExportStore(Path(tmp), channel_info=CHANNEL_INFO)
+        data = json.loads(store.materialize().read_text(encoding="utf-8"))
+        assert data["messages"] == [] and data["total_messages"] == 0
+    return True
+
+
+def test_legacy_export_json_imported() -> bool:
+    """export.json старого формата импортируется в первый сегмент при ensure_initialized."""
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = {"channel_info": CHANNEL_INFO, "messages": [_msg(1), _msg(2)], "export_date": None, "total_messages": 2}
+        (Path(tmp) / "export.json").write_text(json.dumps(legacy, ensure_ascii=False), encoding="utf-8")
+        store = SegmentedExportStore(Path(tmp))
+        assert store.message_ids() == {1, 2}
+        assert not store.has_segments
+        store.ensure_initialized()
+        assert store.segments_count == 1 and store.messages_total == 2
+        store.append_batch([_msg(3)])
+        data = json.loads(store.materialize().read_text(encoding="utf-8"))
+        assert [m["id"] for m in data["messages"]] == [1, 2, 3]
+    return True
+
+
+def test_compact_dedups_overlapping_segments() -> bool:
+    """compact сливает сегменты в один, дубли по id схлопываются (последняя запись побеждает)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SegmentedExportStore(Path(tmp), channel_info=CHANNEL_INFO)
+        store.append_batch([_msg(1), _msg(2)])
+        updated = _msg(2)
+        updated["text"] = "обновлено"
+        store.append_batch([updated, _msg(3)])
+        assert store.compact() == 3
+        assert store.segments_count == 1
+        assert len(list((Path(tmp) / "segments").glob("seg-*.jsonl"))) == 1
+        data = json.loads(store.materialize().read_text(encoding="utf-8"))
+        assert [m["id"] for m in data["messages"]] == [1, 2, 3]
+        assert data["messages"][1]["text"] == "обновлено"
+    return True
+
+
+def test_manifest_rebuilt_from_segments() -> bool:
+    """Битый manifest.json восстанавливается по файлам сегментов."""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SegmentedExportStore(Path(tmp), channel_info=CHANNEL_INFO)
+        store.append_batch([_msg(1)])
+        store.append_batch([_msg(2)])
+        (Path(tmp) / "manifest.json").write_text("{broken", encoding="utf-8")
+        reopened = SegmentedExportStore(Path(tmp))
+        assert reopened.messages_total == 2 and reopened.last_message_id == 2
+        reopened.append_batch([_msg(3)])
+        assert reopened.segments_count == 3
+    return True
+
+
+def test_sqlite_commit_batch_state_and_index() -> bool:
+    """SQLite: батч, state и индекс SHA-256 фиксируются вместе; проверка id — по ключу."""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SqliteExportStore(Path(tmp), channel_info=CHANNEL_INFO)
+        ids = store.message_ids()
+        index = store.media_index()
+        index["abc"] = "media/photos/5.jpg"
+        state = {"channel_id": 42}
+        store.commit_batch([_msg(5, media=1), _msg(4)], state, index)
+        assert state["last_message_id"] == 5 and state["messages_total"] == 2 and state["media_total"] == 1
+        assert 5 in ids and 3 not in ids
+        ids.add(3)
+        assert 3 in ids
+        store.close()
+
+        reopened = SqliteExportStore(Path(tmp))
+        assert reopened.load_state({})["last_message_id"] == 5
+        assert reopened.media_index().get("abc") == "media/photos/5.jpg"
+        assert reopened.channel_info == CHANNEL_INFO
+        assert [m["id"] for m in reopened.iter_messages()] == [4, 5]
+        reopened.close()
+    return True
+
+
+def test_sqlite_materialize_matches_segments() -> bool:
+    """SQLite и сегменты дают одинаковый export.json."""
+    with tempfile.TemporaryDirectory() as tmp_a, tempfile.TemporaryDirectory() as tmp_b:
+        batches = [[_msg(9), _msg(8, media=1)], [_msg(3), _msg(1)]]
+        seg = SegmentedExportStore(Path(tmp_a), channel_info=CHANNEL_INFO)
+        sql = SqliteExportStore(Path(tmp_b), channel_info=CHANNEL_INFO)
+        for batch in batches:
+            seg.append_batch(batch)
+            sql.append_batch(batch)
+        a = seg.materialize(export_date="2026-02-17T18:57:17Z").read_text(encoding="utf-8")
+        b = sql.materialize(export_date="2026-02-17T18:57:17Z").read_text(encoding="utf-8")
+        sql.close()
+        assert a == b
+    return True
+
+
+def test_sqlite_imports_json_export() -> bool:
+    """Первое открытие SQLite-базы импортирует сегменты, state.json и media-index.json."""
+    with tempfile.TemporaryDirectory() as tmp:
+        seg = SegmentedExportStore(Path(tmp), channel_info=CHANNEL_INFO)
+        state = {"channel_id": 42, "channel_username": "chan"}
+        seg.commit_batch([_msg(1), _msg(2, media=1)], state, {"h1": "media/photos/2.jpg"})
+
+        store = open_export_store(Path(tmp), backend="sqlite")
+        assert isinstance(store, SqliteExportStore)
+        store.ensure_initialized()
+        assert store.messages_total == 2 and store.media_total == 1
+        assert 2 in store.message_ids()
+        assert store.media_index()["h1"] == "media/photos/2.jpg"
+        assert store.load_state({})["last_message_id"] == 2
+        store.close()
+
+        # База уже есть — открывается через SQLite даже без явного backend.
+        again = open_export_store(Path(tmp))
+        assert isinstance(again, SqliteExportStore) and again.messages_total == 2
+        again.close()
+    return True
+
+
+def test_open_export_store_dry_run_no_db() -> bool:
+    """Без create (dry-run) SQLite-база не создаётся."""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = open_export_store(Path(tmp), backend="sqlite", create=False)
+        assert isinstance(store, SegmentedExportStore)
+        assert not (Path(tmp) / DB_NAME).exists()
+    return True
+
+
+def run_all() -> bool:
+    cases = [
+        ("append_batch -> segment + manifest", test_append_batch_writes_segment_and_manifest),
+        ("materialize == json.dump(indent=2)", test_materialize_matches_json_dump_format),
+        ("materialize empty store", test_materialize_empty_store),
+        ("legacy export.json import", test_legacy_export_json_imported),
+        ("compact dedups overlapping segments", test_compact_dedups_overlapping_segments),
+        ("manifest rebuilt from segments", test_manifest_rebuilt_from_segments),
+        ("sqlite commit_batch + state + index", test_sqlite_commit_batch_state_and_index),
+        ("sqlite materialize == segments", test_sqlite_materialize_matches_segments),
+        ("sqlite imports JSON export", test_sqlite_imports_json_export),
+        ("open_export_store dry-run no db", test_open_export_store_dry_run_no_db),
+    ]
+    ok = 0
+    for name, fn in cases:
+        try:
+            if fn():
+                ok += 1
+                print(f"  OK {name}")
+            else:
+                print(f"  FAIL {name}")
+        except Exception as e:
+            print(f"  FAIL {name}: {e}")
+    return ok == len(cases)
+
+
+if __name__ == "__main__":
+    print("TG export store unit tests")
+    sys.exit(0 if run_all() else 1)
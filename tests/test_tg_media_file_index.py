@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Unit-тесты индекса медиа по Telegram file id (media_file_index): lookup/put/save, журнал append-only,
+несколько писателей, удалённые файлы, прежний media-file-index.json.
+
+Запуск из корня проекта:
+  python tests/test_tg_media_file_index.py
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+import tempfile
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from media_file_index import INDEX_NAME, LEGACY_INDEX_NAME, MediaFileIndex
+from telegram_parser import MODE_PRESETS, MediaJob, TelegramParser
+
+
+def _media_file(root: Path, rel: str, data: bytes = b"data") -> Path:
+    path = root / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+def test_put_save_lookup_roundtrip() -> bool:
+    """Запись сохраняется с путём относительно output_dir и находится после перезагрузки."""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        src = _media_file(root, "chan__2026-02-17_10-00/media/documents/1_f.pdf")
+        key = MediaFileIndex.make_key("document", 555)
+        index = MediaFileIndex(root)
+        assert index.lookup(key) is None
+        index.put(key, src, "abc")
+        index.save()
+
+        lines = (root / INDEX_NAME).read_text(encoding="utf-8").splitlines()
+        assert [json.loads(line) for line in lines] == [
+            {"key": key, "path": "chan__2026-02-17_10-00/media/documents/1_f.pdf", "sha256": "abc"}
+        ]
+        hit = MediaFileIndex(root).lookup(key)
+        assert hit is not None and hit[0].resolve() == src.resolve() and hit[1] == "abc"
+    return True
+
+
+def test_lookup_skips_deleted_file() -> bool:
+    """Если файл удалён с диска, запись индекса не используется."""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        src = _media_file(root, "chan/media/photos/1.jpg")
+        key = MediaFileIndex.make_key("photo", 1)
+        index = MediaFileIndex(root)
+        index.put(key, src, "h")
+        src.unlink()
+        assert index.lookup(key) is None
+    return True
+
+
+def test_save_appends_only_new_entries() -> bool:
+    """save() после каждого батча дописывает только новые записи; без изменений файл не трогается."""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        index = MediaFileIndex(root)
+        for i in range(1, 4):
+            index.put(f"photo:{i}", _media_file(root, f"a/media/photos/{i}.jpg"), f"h{i}")
+        index.save()
+        size = (root / INDEX_NAME).stat().st_size
+        index.put("photo:1", root / "a/media/photos/1.jpg", "h1")  # та же запись — не новая
+        index.save()
+        assert (root / INDEX_NAME).stat().st_size == size
+        index.put("photo:4", _media_file(root, "a/media/photos/4.jpg"), "h4")
+        index.save()
+        lines = (root / INDEX_NAME).read_text(encoding="utf-8").splitlines()
+        assert [json.loads(line)["key"] for line in lines] == ["photo:1", "photo:2", "photo:3", "photo:4"]
+    return True
+
+
+def test_save_merges_concurrent_writers() -> bool:
+    """save() не теряет записи, добавленные в файл другим запуском."""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        a = MediaFileIndex(root)
+        b = MediaFileIndex(root)
+        a.put("photo:1", _media_file(root, "a/media/photos/1.jpg"), "h1")
+        b.put("photo:2", _media_file(root, "b/media/photos/2.jpg"), "h2")
+        a.save()
+        b.save()
+        reloaded = MediaFileIndex(root)
+        assert reloaded.lookup("photo:1") is not None and reloaded.lookup("photo:2") is not None
+        assert len(reloaded) == 2
+    return True
+
+
+def test_corrupt_lines_skipped() -> bool:
+    """Оборванная строка журнала (сбой посреди записи) пропускается, остальные записи читаются."""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        _media_file(root, "c/media/documents/6.bin")
+        (root / INDEX_NAME).write_text(
+            '{"key": "document:6", "path": "c/media/documents/6.bin", "sha256": "h6"}\n{"key": "docu', encoding="utf-8"
+        )
+        index = MediaFileIndex(root)
+        assert len(index) == 1
+        index.put("document:7", _media_file(root, "c/media/documents/7.bin"), "h7")
+        index.save()
+        reloaded = MediaFileIndex(root)
+        assert reloaded.lookup("document:6") is not None and reloaded.lookup("document:7") is not None
+    return True
+
+
+def test_legacy_json_index_read() -> bool:
+    """Прежний media-file-index.json читается как начальное состояние; новые записи идут в журнал."""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        _media_file(root, "old/media/photos/1.jpg")
+        legacy = {"version": 1, "files": {"photo:1": {"path": "old/media/photos/1.jpg", "sha256": "h1"}}}
+        (root / LEGACY_INDEX_NAME).write_text(json.dumps(legacy), encoding="utf-8")
+        index = MediaFileIndex(root)
+        assert index.lookup("photo:1") is not None
+        index.put("photo:2", _media_file(root, "new/media/photos/2.jpg"), "h2")
+        index.save()
+        reloaded = MediaFileIndex(root)
+        assert len(reloaded) == 2 and reloaded.lookup("photo:1") is not None
+    return True
+
+
+def test_parser_file_id_hit_without_download() -> bool:
+    """Попадание по file id: медиа другого канала попадает в экспорт без download_media, счётчик media_file_id_hits."""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        src = _media_file(root, "other/media/documents/5_f.pdf", b"pdf-bytes")
+        index = MediaFileIndex(root)
+        index.put("document:5", src, "h5")
+        export_dir = root / "chan"
+        target_dir = export_dir / "media" / "documents"
+        target_dir.mkdir(parents=True)
+        parser = TelegramParser(api_id="1", api_hash="h")
+        parser.client = MagicMock(download_media=AsyncMock())
+        stats = {"media_file_id_hits": 0, "media_sha_hits": 0}
+        job = MediaJob(9, object(), "document", 9, target_dir, "9_f.pdf", file_key="document:5")
+        hash_index = {}
+        media_files = asyncio.run(parser._download_media_job(
+            job, entity=None, export_dir=export_dir, temp_dir=root / ".tmp", hash_index=hash_index,
+            file_index=index, logs=MagicMock(), mode_cfg=MODE_PRESETS["safe"], stats=stats,
+        ))
+        assert media_files == [{"type": "document", "path": "media/documents/9_f.pdf", "filename": "9_f.pdf", "sha256": "h5"}]
+        assert (export_dir / "media/documents/9_f.pdf").read_bytes() == b"pdf-bytes"
+        assert hash_index == {"h5": "media/documents/9_f.pdf"}
+        assert stats == {"media_file_id_hits": 1, "media_sha_hits": 0}
+        parser.client.download_media.assert_not_called()
+    return True
+
+
+def test_parser_concurrent_reuse_copies_once() -> bool:
+    """Два задания с разными file id и одним sha256 параллельно: одна копия в экспорте, общий путь."""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        index = MediaFileIndex(root)
+        index.put("document:5", _media_file(root, "other/media/documents/5_f.pdf", b"pdf-bytes"), "h5")
+        index.put("document:6", _media_file(root, "third/media/documents/6_f.pdf", b"pdf-bytes"), "h5")
+        export_dir = root / "chan"
+        target_dir = export_dir / "media" / "documents"
+        target_dir.mkdir(parents=True)
+        parser = TelegramParser(api_id="1", api_hash="h")
+        jobs = [
+            MediaJob(9, object(), "document", 9, target_dir, "9_f.pdf", file_key="document:5"),
+            MediaJob(10, object(), "document", 10, target_dir, "10_f.pdf", file_key="document:6"),
+        ]
+        hash_index = {}
+
+        async def _run():
+            return await asyncio.gather(*(
+                parser._reuse_indexed_media(job, export_dir=export_dir, hash_index=hash_index, file_index=index)
+                for job in jobs
+            ))
+
+        first, second = asyncio.run(_run())
+        assert first["path"] == second["path"] == "media/documents/9_f.pdf"
+        assert [p.name for p in target_dir.iterdir()] == ["9_f.pdf"]
+        assert hash_index == {"h5": "media/documents/9_f.pdf"}
+        assert len(parser._reuse_locks) == 0
+    return True
+
+
+def run_all() -> bool:
+    cases = [
+        ("put/save/lookup roundtrip", test_put_save_lookup_roundtrip),
+        ("lookup skips deleted file", test_lookup_skips_deleted_file),
+        ("save appends only new entries", test_save_appends_only_new_entries),
+        ("save merges concurrent writers", test_save_merges_concurrent_writers),
+        ("corrupt lines skipped", test_corrupt_lines_skipped),
+        ("legacy json index read", test_legacy_json_index_read),
+        ("parser file id hit without download", test_parser_file_id_hit_without_download),
+        ("parser concurrent reuse copies once", test_parser_concurrent_reuse_copies_once),
+    ]
+    ok = 0
+    for name, fn in cases:
+        try:
+            if fn():
+                ok += 1
+                print(f"  OK {name}")
+            else:
+                print(f"  FAIL {name}")
+        except Exception as e:
+            print(f"  FAIL {name}: {e}")
+    return ok == len(cases)
+
+
+if __name__ == "__main__":
+    print("TG media file index unit tests")
+    sys.exit(0 if run_all() else 1)
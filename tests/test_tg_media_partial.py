@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Unit-тесты докачки медиа (media_partial): .part-файл, sidecar с прогрессом, продолжение после таймаута,
+один документ в двух одновременных заданиях пула.
+
+Запуск из корня проекта:
+  python tests/test_tg_media_partial.py
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+from unittest.mock import MagicMock
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from media_file_index import MediaFileIndex
+from media_partial import RESUMABLE_MIN_BYTES, PartialDownload, download_resumable
+from media_pipeline import MediaPipeline
+from telegram_parser import MODE_PRESETS, MediaJob, TelegramParser
+
+CHUNK = 1000
+
+
+class FakeDownloadClient:
+    """iter_download по байтам в памяти; `stall_after` частей — и поток «зависает»."""
+
+    def __init__(self, payload: bytes, stall_after: Optional[int] = None) -> None:
+        self.payload = payload
+        self.stall_after = stall_after
+        self.offsets: List[int] = []
+        self.closed = 0
+
+    def iter_download(self, media, *, offset=0, request_size=None, file_size=None):
+        self.offsets.append(offset)
+        client = self
+
+        class Stream:
+            def __init__(self) -> None:
+                self.pos = offset
+                self.sent = 0
+
+            async def __anext__(self) -> bytes:
+                await asyncio.sleep(0)  # отдать управление: параллельные загрузки чередуются
+                if client.stall_after is not None and self.sent >= client.stall_after:
+                    await asyncio.sleep(10)
+                if self.pos >= len(client.payload):
+                    raise StopAsyncIteration
+                chunk = client.payload[self.pos : self.pos + CHUNK]
+                self.pos += len(chunk)
+                self.sent += 1
+                return chunk
+
+            async def close(self) -> None:
+                client.closed += 1
+
+        return Stream()
+
+
+def _payload(size: int) -> bytes:
+    return os.urandom(size)
+
+
+def test_full_download() -> bool:
+    """Загрузка без сбоев: .part совпадает с источником, хеш верный, sidecar удалён."""
+    payload = _payload(5500)
+    with tempfile.TemporaryDirectory() as tmp:
+        partial = PartialDownload(Path(tmp) / ".partial", "document:7", len(payload))
+        client = FakeDownloadClient(payload)
+        path, digest = asyncio.run(download_resumable(client, object(), partial))
+        assert path.read_bytes() == payload
+        assert digest == hashlib.sha256(payload).hexdigest()
+        assert not partial.sidecar_path.exists()
+        assert client.offsets == [0] and client.closed == 1
+    return True
+
+
+def test_resume_after_stall() -> bool:
+    """Таймаут на середине сохраняет смещение; повтор продолжает с него, хеш — по всему файлу."""
+    payload = _payload(5500)
+    with tempfile.TemporaryDirectory() as tmp:
+        partial = PartialDownload(Path(tmp) / ".partial", "document:7", len(payload))
+        stalled = FakeDownloadClient(payload, stall_after=3)
+        try:
+            asyncio.run(download_resumable(stalled, object(), partial, chunk_timeout=0.05))
+        except asyncio.TimeoutError:
+            pass
+        else:
+            raise AssertionError("stalled download must time out")
+        sidecar = json.loads(partial.sidecar_path.read_text(encoding="utf-8"))
+        assert sidecar["offset"] == 3 * CHUNK and sidecar["size"] == len(payload)
+
+        # Хвост после последней фиксации прогресса отбрасывается.
+        with partial.part_path.open("ab") as f:
+            f.write(b"garbage")
+        stats = {"media_resumed": 0}
+        client = FakeDownloadClient(payload)
+        path, digest = asyncio.run(download_resumable(client, object(), partial, stats=stats))
+        assert client.offsets == [3 * CHUNK]
+        assert path.read_bytes() == payload
+        assert digest == hashlib.sha256(payload).hexdigest()
+        assert stats["media_resumed"] == 1
+    return True
+
+
+def test_mismatched_sidecar_restarts() -> bool:
+    """Sidecar от другого размера или без .part-файла — загрузка с нуля."""
+    payload = _payload(3000)
+    with tempfile.TemporaryDirectory() as tmp:
+        partial_dir = Path(tmp) / ".partial"
+        stale = PartialDownload(partial_dir, "document:7", 9999)
+        stale.part_path.parent.mkdir(parents=True)
+        stale.part_path.write_bytes(b"x" * 2000)
+        stale.save_progress(2000)
+        partial = PartialDownload(partial_dir, "document:7", len(payload))
+        assert partial.resume_offset() == 0
+        client = FakeDownloadClient(payload)
+        path, _ = asyncio.run(download_resumable(client, object(), partial))
+        assert client.offsets == [0] and path.read_bytes() == payload
+
+        orphan = PartialDownload(partial_dir, "document:8", 100)
+        orphan.save_progress(50)
+        assert orphan.resume_offset() == 0
+    return True
+
+
+def test_short_stream_discards_part() -> bool:
+    """Если поток закончился раньше ожидаемого размера, .part удаляется и выбрасывается ошибка."""
+    payload = _payload(2500)
+    with tempfile.TemporaryDirectory() as tmp:
+        partial = PartialDownload(Path(tmp) / ".partial", "document:9", len(payload) + 100)
+        try:
+            asyncio.run(download_resumable(FakeDownloadClient(payload), object(), partial))
+        except IOError:
+            pass
+        else:
+            raise AssertionError("size mismatch must fail")
+        assert not partial.part_path.exists() and not partial.sidecar_path.exists()
+    return True
+
+
+def test_same_document_in_two_concurrent_jobs() -> bool:
+    """Один document:<id> в двух сообщениях окна: одна загрузка в .part, второе сообщение получает тот же файл."""
+    payload = _payload(RESUMABLE_MIN_BYTES)
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        export_dir = root / "chan"
+        docs_dir = export_dir / "media" / "documents"
+        docs_dir.mkdir(parents=True)
+        parser = TelegramParser(api_id="1", api_hash="h")
+        parser.client = FakeDownloadClient(payload)
+        stats = {k: 0 for k in ("media_saved", "media_file_id_hits", "media_sha_hits", "media_errors_count", "media_resumed")}
+        file_index = MediaFileIndex(root)
+
+        async def worker(job: MediaJob):
+            return await parser._download_media_job(
+                job, entity=None, export_dir=export_dir, temp_dir=root / ".tmp", hash_index={},
+                file_index=file_index, logs=MagicMock(), mode_cfg=MODE_PRESETS["safe"], stats=stats,
+            )
+
+        async def scenario():
+            async with MediaPipeline(worker, concurrency=2, key=lambda job: job.file_key) as pipeline:
+                futures = [
+                    await pipeline.submit(MediaJob(i, object(), "document", len(payload), docs_dir, f"{i}_f.bin", "document:42"))
+                    for i in (1, 2)
+                ]
+            return [f.result() for f in futures]
+
+        first, second = asyncio.run(scenario())
+        assert "error" not in first[0] and "error" not in second[0], (first, second)
+        assert first[0]["path"] == second[0]["path"] == "media/documents/1_f.bin"
+        assert (export_dir / first[0]["path"]).read_bytes() == payload
+        assert parser.client.offsets == [0]  # документ скачан один раз
+        assert (stats["media_saved"], stats["media_file_id_hits"], stats["media_errors_count"]) == (1, 1, 0), stats
+    return True
+
+
+def run_all() -> bool:
+    cases = [
+        ("full download", test_full_download),
+        ("resume after stall", test_resume_after_stall),
+        ("mismatched sidecar restarts", test_mismatched_sidecar_restarts),
+        ("short stream discards part", test_short_stream_discards_part),
+        ("same document in two concurrent jobs", test_same_document_in_two_concurrent_jobs),
+    ]
+    ok = 0
+    for name, fn in cases:
+        try:
+            if fn():
+                ok += 1
+                print(f"  OK {name}")
+            else:
+                print(f"  FAIL {name}")
+        except Exception as e:
+            print(f"  FAIL {name}: {e}")
+    return ok == len(cases)
+
+
+if __name__ == "__main__":
+    print("TG media partial unit tests")
+    sys.exit(0 if run_all() else 1)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Unit-тесты загрузки медиа: пул media_pipeline (параллелизм, ошибки, backpressure, отмена)
+и HashingSink (SHA-256 на лету).
+
+Запуск из корня проекта:
+  python tests/test_tg_media_pipeline.py
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import sys
+import tempfile
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from media_pipeline import MediaPipeline
+from telegram_parser import HashingSink, TelegramParser
+
+
+def test_concurrency_is_bounded() -> bool:
+    """Одновременно выполняется не больше concurrency заданий, и параллелизм реально используется."""
+
+    async def scenario() -> int:
+        active = 0
+        peak = 0
+
+        async def worker(job: int) -> int:
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return job * 2
+
+        async with MediaPipeline(worker, concurrency=3) as pipeline:
+            futures = [await pipeline.submit(i) for i in range(12)]
+        assert [f.result() for f in futures] == [i * 2 for i in range(12)]
+        return peak
+
+    assert asyncio.run(scenario()) == 3
+    return True
+
+
+def test_same_key_jobs_run_one_at_a_time() -> bool:
+    """key: задания с одним ключом не пересекаются, с разными ключами и без ключа — идут параллельно."""
+
+    async def scenario() -> dict:
+        active = {}
+        peak = {}
+
+        async def worker(job: tuple) -> int:
+            key, n = job
+            active[key] = active.get(key, 0) + 1
+            peak[key] = max(peak.get(key, 0), active[key])
+            await asyncio.sleep(0.01)
+            active[key] -= 1
+            return n
+
+        jobs = [("a", 1), ("a", 2), ("b", 3), ("a", 4), (None, 5), (None, 6)]
+        async with MediaPipeline(worker, concurrency=4, key=lambda job: job[0]) as pipeline:
+            futures = [await pipeline.submit(job) for job in jobs]
+        assert [f.result() for f in futures] == [1, 2, 3, 4, 5, 6]
+        assert len(pipeline._key_locks) == 0
+        return peak
+
+    peak = asyncio.run(scenario())
+    assert peak == {"a": 1, "b": 1, None: 2}, peak
+    return True
+
+
+def test_worker_error_goes_to_future() -> bool:
+    """Исключение воркера попадает в Future задания и не останавливает пул."""
+
+    async def scenario() -> None:
+        async def worker(job: int) -> int:
+            if job == 1:
+                raise RuntimeError("boom")
+            return job
+
+        async with MediaPipeline(worker, concurrency=2) as pipeline:
+            futures = [await pipeline.submit(i) for i in range(4)]
+        assert isinstance(futures[1].exception(), RuntimeError)
+        assert [futures[i].result() for i in (0, 2, 3)] == [0, 2, 3]
+
+    asyncio.run(scenario())
+    return True
+
+
+def test_submit_blocks_when_queue_full() -> bool:
+    """При заполненной очереди submit ждёт освобождения места (backpressure)."""
+
+    async def scenario() -> None:
+        gate = asyncio.Event()
+
+        async def worker(job: int) -> int:
+            await gate.wait()
+            return job
+
+        pipeline = MediaPipeline(worker, concurrency=1, queue_size=1)
+        pipeline.start()
+        await pipeline.submit(0)  # забирает воркер
+        await asyncio.sleep(0)
+        await pipeline.submit(1)  # занимает очередь
+        blocked = asyncio.ensure_future(pipeline.submit(2))
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+        gate.set()
+        await asyncio.wait_for(blocked, timeout=1)
+        await pipeline.close()
+
+    asyncio.run(scenario())
+    return True
+
+
+def test_cancel_cancels_pending_futures() -> bool:
+    """cancel() останавливает воркеров, ожидающие задания отменяются."""
+
+    async def scenario() -> None:
+        async def worker(job: int) -> int:
+            await asyncio.sleep(10)
+            return job
+
+        pipeline = MediaPipeline(worker, concurrency=1, queue_size=4)
+        pipeline.start()
+        futures = [await pipeline.submit(i) for i in range(3)]
+        await asyncio.sleep(0)
+        await pipeline.cancel()
+        assert all(f.cancelled() for f in futures)
+
+    asyncio.run(scenario())
+    return True
+
+
+def test_hashing_sink_digest_matches_file() -> bool:
+    """Дайджест HashingSink совпадает с SHA-256 записанного файла (_sha256_file)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "media.bin"
+        chunks = [b"a" * 1000, b"", bytes(range(256)) * 300]
+        with HashingSink(path) as sink:
+            for chunk in chunks:
+                assert sink.write(chunk) == len(chunk)
+            sink.flush()
+        data = b"".join(chunks)
+        assert sink.size == len(data) and path.read_bytes() == data
+        assert sink.hexdigest() == hashlib.sha256(data).hexdigest() == TelegramParser._sha256_file(path)
+    return True
+
+
+def test_hashing_sink_truncates_on_retry() -> bool:
+    """Новый приёмник на тот же путь перезаписывает файл частичной попытки."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "media.bin"
+        with HashingSink(path) as sink:
+            sink.write(b"partial-garbage")
+        with HashingSink(path) as sink:
+            sink.write(b"ok")
+        assert path.read_bytes() == b"ok"
+        assert sink.hexdigest() == hashlib.sha256(b"ok").hexdigest()
+    return True
+
+
+def run_all() -> bool:
+    cases = [
+        ("concurrency is bounded", test_concurrency_is_bounded),
+        ("same key jobs run one at a time", test_same_key_jobs_run_one_at_a_time),
+        ("worker error -> future", test_worker_error_goes_to_future),
+        ("submit blocks when queue full", test_submit_blocks_when_queue_full),
+        ("cancel cancels pending futures", test_cancel_cancels_pending_futures),
+        ("HashingSink digest == file sha256", test_hashing_sink_digest_matches_file),
+        ("HashingSink truncates on retry", test_hashing_sink_truncates_on_retry),
+    ]
+    ok = 0
+    for name, fn in cases:
+        try:
+            if fn():
+                ok += 1
+                print(f"  OK {name}")
+            else:
+                print(f"  FAIL {name}")
+        except Exception as e:
+            print(f"  FAIL {name}: {e}")
+    return ok == len(cases)
+
+
+if __name__ == "__main__":
+    print("TG media pipeline unit tests")
+    sys.exit(0 if run_all() else 1)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Unit-тесты листания истории в parse_channel на фейковом клиенте (без Telegram):
+полная выгрузка, инкрементальный режим через min_id, backfill пропусков.
+
+Запуск из корня проекта:
+  python tests/test_tg_parse_history.py
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from types import SimpleNamespace
+from typing import List
+from unittest.mock import patch
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from telegram_parser import MODE_PRESETS, ModeConfig, TelegramParser
+
+# Без задержек между страницами и без повторов.
+FAST_PRESETS = {name: ModeConfig(0, 0, 0, 1, 1, 5) for name in MODE_PRESETS}
+
+
+def _message(msg_id: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=msg_id,
+        date=datetime(2026, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=msg_id),
+        message=f"post {msg_id}" + (" #keep" if msg_id % 2 == 0 else ""),
+        media=None,
+        fwd_from=None,
+        reply_to_msg_id=None,
+        views=0,
+        forwards=0,
+    )
+
+
+class FakeHistoryClient:
+    """Отдаёт историю канала как GetHistoryRequest: от новых к старым, с учётом offset_id/min_id/limit."""
+
+    def __init__(self, ids: List[int]) -> None:
+        self.messages = [_message(i) for i in sorted(ids, reverse=True)]
+        self.requests: List[SimpleNamespace] = []
+
+    async def __call__(self, request):
+        self.requests.append(request)
+        page = [
+            m
+            for m in self.messages
+            if (not request.offset_id or m.id < request.offset_id) and m.id > request.min_id
+        ]
+        return SimpleNamespace(messages=page[: request.limit])
+
+    async def get_entity(self, identifier):
+        return SimpleNamespace(id=100, username="history_chan", title="History")
+
+
+def _make_parser(client: FakeHistoryClient) -> TelegramParser:
+    parser = TelegramParser(api_id="1", api_hash="x", session_file="unused")
+    parser.client = client
+
+    async def _connect() -> None:
+        return None
+
+    parser.connect = _connect
+    return parser
+
+
+def _export_ids(result: dict) -> List[int]:
+    data = json.loads(Path(result["export_json"]).read_text(encoding="utf-8"))
+    return [m["id"] for m in data["messages"]]
+
+
+def _run(parser: TelegramParser, output_dir: str, **kwargs) -> dict:
+    with patch.dict(MODE_PRESETS, FAST_PRESETS):
+        return asyncio.run(parser.parse_channel("@history_chan", output_dir, mode="normal", **kwargs))
+
+
+def test_full_run_stops_on_short_page() -> bool:
+    """Первая выгрузка: все страницы, листание заканчивается на неполной странице."""
+    with tempfile.TemporaryDirectory() as tmp:
+        client = FakeHistoryClient(list(range(1, 251)))
+        result = _run(_make_parser(client), tmp)
+        assert _export_ids(result) == list(range(1, 251))
+        assert len(client.requests) == 3
+        assert all(r.min_id == 0 for r in client.requests)
+        assert result["summary"]["history_mode"] == "full"
+    return True
+
+
+def test_incremental_run_uses_min_id() -> bool:
+    """Повторный запуск запрашивает только id > last_message_id — одна страница, старая история не листается."""
+    with tempfile.TemporaryDirectory() as tmp:
+        client = FakeHistoryClient(list(range(1, 251)))
+        parser = _make_parser(client)
+        _run(parser, tmp)
+        client.messages = [_message(i) for i in range(255, 0, -1)]
+        client.requests.clear()
+        result = _run(parser, tmp)
+        assert [r.min_id for r in client.requests] == [250]
+        assert [m["id"] for m in result["new_messages"]] == [255, 254, 253, 252, 251]
+        assert _export_ids(result) == list(range(1, 256))
+        assert result["summary"]["history_mode"] == "incremental"
+    return True
+
+
+def test_backfill_fills_gaps() -> bool:
+    """backfill листает всю историю и дописывает только отсутствующие в экспорте сообщения."""
+    with tempfile.TemporaryDirectory() as tmp:
+        client = FakeHistoryClient(list(range(1, 121)))
+        parser = _make_parser(client)
+        first = _run(parser, tmp, keyword_filter=["#keep"])
+        assert _export_ids(first) == list(range(2, 121, 2))
+
+        client.requests.clear()
+        incremental = _run(parser, tmp)
+        assert incremental["new_messages"] == []
+
+        backfill = _run(parser, tmp, backfill=True)
+        assert all(r.min_id == 0 for r in client.requests[1:])
+        assert len(backfill["new_messages"]) == 60
+        assert _export_ids(backfill) == list(range(1, 121))
+        assert backfill["summary"]["history_mode"] == "backfill"
+    return True
+
+
+def run_all() -> bool:
+    cases = [
+        ("full run stops on short page", test_full_run_stops_on_short_page),
+        ("incremental run uses min_id", test_incremental_run_uses_min_id),
+        ("backfill fills gaps", test_backfill_fills_gaps),
+    ]
+    ok = 0
+    for name, fn in cases:
+        try:
+            if fn():
+                ok += 1
+                print(f"  OK {name}")
+            else:
+                print(f"  FAIL {name}")
+        except Exception as e:
+            print(f"  FAIL {name}: {e}")
+    return ok == len(cases)
+
+
+if __name__ == "__main__":
+    print("TG parse history unit tests")
+    sys.exit(0 if run_all() else 1)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Unit-тесты parse-many (multi_channel): список каналов, параллелизм, checkpoint, итоговые статусы.
+
+Запуск из корня проекта:
+  python tests/test_tg_parse_many.py
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from exit_codes import EXIT_FAILURE, EXIT_PARTIAL, EXIT_SUCCESS
+from multi_channel import CHECKPOINT_NAME, SUMMARY_NAME, parse_many, read_channel_list
+
+
+class StubParser:
+    """parse_channel-заглушка: считает одновременные вызовы, по списку каналов падает или даёт partial."""
+
+    def __init__(self, fail: Optional[List[str]] = None, partial: Optional[List[str]] = None) -> None:
+        self.fail = set(fail or [])
+        self.partial = set(partial or [])
+        self.calls: List[str] = []
+        self.kwargs: List[Dict] = []
+        self.active = 0
+        self.peak = 0
+        self.rate_limiter = None
+
+    async def parse_channel(self, channel_identifier: str, output_dir: str, **kwargs):
+        self.calls.append(channel_identifier)
+        self.kwargs.append(kwargs)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(0.01)
+            if channel_identifier in self.fail:
+                raise RuntimeError(f"boom {channel_identifier}")
+            return {
+                "summary": {"new_messages": 3, "media_saved": 1, "media_errors_count": 0},
+                "partial_failure": channel_identifier in self.partial,
+                "export_dir": f"{output_dir}/{channel_identifier.lstrip('@')}",
+            }
+        finally:
+            self.active -= 1
+
+
+def test_read_channel_list() -> bool:
+    """Пустые строки и комментарии пропускаются, дубли отбрасываются, порядок сохраняется."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "channels.txt"
+        path.write_text("# каналы\n@a\n\nhttps://t.me/b  # канал b\n@a\n12345\n", encoding="utf-8")
+        assert read_channel_list(path) == ["@a", "https://t.me/b", "12345"]
+    return True
+
+
+def test_concurrency_and_summary() -> bool:
+    """Не больше concurrency каналов одновременно; сводка со статусами пишется в output_dir."""
+    with tempfile.TemporaryDirectory() as tmp:
+        parser = StubParser(fail=["@c"], partial=["@b"])
+        channels = ["@a", "@b", "@c", "@d", "@e"]
+        summary = asyncio.run(parse_many(parser, channels, tmp, concurrency=2, parse_kwargs={"mode": "safe"}))
+        assert parser.peak == 2
+        assert sorted(parser.calls) == channels
+        assert all(k["mode"] == "safe" for k in parser.kwargs)
+        statuses = {r["channel"]: r["status"] for r in summary["channels"]}
+        assert statuses == {"@a": "ok", "@b": "partial", "@c": "failed", "@d": "ok", "@e": "ok"}
+        assert (summary["ok"], summary["partial"], summary["failed"]) == (3, 1, 1)
+        assert summary["exit_code"] == EXIT_PARTIAL
+        saved = json.loads((Path(tmp) / SUMMARY_NAME).read_text(encoding="utf-8"))
+        assert saved["channels_total"] == 5
+    return True
+
+
+def test_checkpoint_resume_retries_failed_only() -> bool:
+    """Повторный запуск после сбоя парсит только упавшие каналы; после успеха — новый круг."""
+    with tempfile.TemporaryDirectory() as tmp:
+        channels = ["@a", "@b", "@c"]
+        first = asyncio.run(parse_many(StubParser(fail=["@b"]), channels, tmp))
+        assert first["exit_code"] == EXIT_PARTIAL
+        checkpoint = json.loads((Path(tmp) / CHECKPOINT_NAME).read_text(encoding="utf-8"))
+        assert checkpoint["completed"] is False and checkpoint["channels"]["@b"]["status"] == "failed"
+
+        retry_parser = StubParser()
+        second = asyncio.run(parse_many(retry_parser, channels, tmp))
+        assert retry_parser.calls == ["@b"]
+        assert second["skipped"] == 2 and second["exit_code"] == EXIT_SUCCESS
+
+        next_round = StubParser()
+        asyncio.run(parse_many(next_round, channels, tmp))
+        assert sorted(next_round.calls) == channels
+    return True
+
+
+def test_no_resume_and_all_failed() -> bool:
+    """resume=False парсит все каналы заново; если упали все — код выхода 1."""
+    with tempfile.TemporaryDirectory() as tmp:
+        channels = ["@a", "@b"]
+        asyncio.run(parse_many(StubParser(fail=["@b"]), channels, tmp))
+        parser = StubParser(fail=channels)
+        summary = asyncio.run(parse_many(parser, channels, tmp, resume=False))
+        assert sorted(parser.calls) == channels
+        assert summary["exit_code"] == EXIT_FAILURE
+        assert all(r["error"] for r in summary["channels"])
+    return True
+
+
+def run_all() -> bool:
+    cases = [
+        ("read channel list", test_read_channel_list),
+        ("concurrency + summary", test_concurrency_and_summary),
+        ("checkpoint resume retries failed only", test_checkpoint_resume_retries_failed_only),
+        ("no resume + all failed", test_no_resume_and_all_failed),
+    ]
+    ok = 0
+    for name, fn in cases:
+        try:
+            if fn():
+                ok += 1
+                print(f"  OK {name}")
+            else:
+                print(f"  FAIL {name}")
+        except Exception as e:
+            print(f"  FAIL {name}: {e}")
+    return ok == len(cases)
+
+
+if __name__ == "__main__":
+    print("TG parse-many unit tests")
+    sys.exit(0 if run_all() else 1)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Unit-тесты лимитеров запросов (rate_governor): token bucket, пауза по FloodWait, AIMD-governor.
+
+Запуск из корня проекта:
+  python tests/test_tg_rate_governor.py
+"""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from telethon.errors import FloodWaitError
+
+from rate_governor import AimdTokenBucket, FloodAwareTokenBucket, RateGovernor
+from telegram_parser import JsonLogger, ModeConfig, TelegramParser
+
+
+def test_burst_then_rate() -> bool:
+    """Сначала всплеск до capacity без ожидания, дальше — не быстрее rate."""
+
+    async def scenario() -> float:
+        bucket = FloodAwareTokenBucket(rate=50, capacity=5)
+        t0 = time.monotonic()
+        for _ in range(5):
+            await bucket.acquire()
+        burst = time.monotonic() - t0
+        assert burst < 0.05
+        t1 = time.monotonic()
+        for _ in range(10):
+            await bucket.acquire()
+        assert bucket.acquired == 15
+        return time.monotonic() - t1
+
+    elapsed = asyncio.run(scenario())
+    assert 0.15 <= elapsed < 1.0, elapsed
+    return True
+
+
+def test_flood_pause_blocks_all_waiters() -> bool:
+    """pause() останавливает всех ожидающих до окончания FloodWait."""
+
+    async def scenario() -> None:
+        bucket = FloodAwareTokenBucket(rate=1000, capacity=10)
+        bucket.pause(0.2)
+        t0 = time.monotonic()
+        await asyncio.gather(*(bucket.acquire() for _ in range(3)))
+        assert time.monotonic() - t0 >= 0.19
+        assert bucket.flood_pauses == 1
+        assert bucket.stats()["acquired"] == 3
+
+    asyncio.run(scenario())
+    return True
+
+
+def test_unlimited_rate() -> bool:
+    """rate <= 0 — без ограничения, но пауза по FloodWait соблюдается."""
+
+    async def scenario() -> None:
+        bucket = FloodAwareTokenBucket(rate=0)
+        t0 = time.monotonic()
+        for _ in range(100):
+            await bucket.acquire()
+        assert time.monotonic() - t0 < 0.1
+        bucket.pause(0.1)
+        t1 = time.monotonic()
+        await bucket.acquire()
+        assert time.monotonic() - t1 >= 0.09
+
+    asyncio.run(scenario())
+    return True
+
+
+def test_aimd_rate() -> bool:
+    """FloodWait вдвое снижает темп (не ниже min_rate), успехи поднимают его до потолка."""
+    bucket = AimdTokenBucket(max_rate=4, min_rate=1, increase=0.5)
+    bucket.on_flood()
+    assert bucket.rate == 2
+    bucket.on_flood()
+    bucket.on_flood()
+    assert bucket.rate == 1 and bucket.rate_decreases == 3
+    for _ in range(10):
+        bucket.on_success()
+    assert bucket.rate == 4
+    assert bucket.stats()["max_rate_per_sec"] == 4
+    return True
+
+
+def test_governor_flood_pauses_all_classes() -> bool:
+    """Flood по одному классу останавливает все классы, темп снижается только у виновника."""
+
+    async def scenario() -> None:
+        governor = RateGovernor({"history": (100, 1, 1), "download": (100, 1, 1)})
+        governor.on_flood("history", 0.2)
+        t0 = time.monotonic()
+        await governor.acquire("download")
+        assert time.monotonic() - t0 >= 0.19
+        stats = governor.stats()
+        assert stats["flood_pauses"] == 1
+        assert stats["classes"]["history"]["rate_per_sec"] == 50
+        assert stats["classes"]["download"]["rate_per_sec"] == 100
+        assert stats["classes"]["history"]["flood_pauses"] == 1
+
+    asyncio.run(scenario())
+    return True
+
+
+def test_with_retries_counts_flood_and_blocks_others() -> bool:
+    """_with_retries считает flood_wait_events, а пауза задерживает и другие корутины клиента."""
+
+    async def scenario(logs: JsonLogger) -> None:
+        parser = TelegramParser(api_id="1", api_hash="x", session_file="unused")
+        mode_cfg = ModeConfig(0, 0, 0, 1, 1, 5)
+        stats = {"flood_wait_events": 0}
+        calls = []
+
+        async def flaky():
+            calls.append(time.monotonic())
+            if len(calls) == 1:
+                raise FloodWaitError(request=None, capture=1)
+            return "ok"
+
+        async def other() -> float:
+            await asyncio.sleep(0.05)
+            t0 = time.monotonic()
+            await parser.governor.acquire("download")
+            return time.monotonic() - t0
+
+        with patch("telegram_parser.random.randint", return_value=0):
+            result, other_wait = await asyncio.gather(
+                parser._with_retries(flaky, logs, mode_cfg, "history", stats), other()
+            )
+        assert result == "ok" and len(calls) == 2
+        assert calls[1] - calls[0] >= 0.95
+        assert other_wait >= 0.8
+        assert stats["flood_wait_events"] == 1
+        assert parser.governor.stats()["flood_pauses"] == 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(scenario(JsonLogger(Path(tmp) / "logs")))
+    return True
+
+
+def run_all() -> bool:
+    cases = [
+        ("burst then rate", test_burst_then_rate),
+        ("flood pause blocks all waiters", test_flood_pause_blocks_all_waiters),
+        ("unlimited rate", test_unlimited_rate),
+        ("aimd rate", test_aimd_rate),
+        ("governor flood pauses all classes", test_governor_flood_pauses_all_classes),
+        ("_with_retries counts flood, blocks others", test_with_retries_counts_flood_and_blocks_others),
+    ]
+    ok = 0
+    for name, fn in cases:
+        try:
+            if fn():
+                ok += 1
+                print(f"  OK {name}")
+            else:
+                print(f"  FAIL {name}")
+        except Exception as e:
+            print(f"  FAIL {name}: {e}")
+    return ok == len(cases)
+
+
+if __name__ == "__main__":
+    print("TG rate governor unit tests")
+    sys.exit(0 if run_all() else 1)
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Unit-тесты пула сессий (session_pool): аренда сессий, sticky affinity каналов, parse-many на пуле.
+
+Запуск из корня проекта:
+  python tests/test_tg_session_pool.py
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+import tempfile
+from pathlib import Path
+from typing import List
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from multi_channel import parse_many
+from session_lock import session_lock
+from session_pool import AFFINITY_NAME, SessionPool
+
+
+class StubSessionParser:
+    """Парсер одной сессии: считает одновременные каналы, по флагу не проходит авторизацию."""
+
+    def __init__(self, session_file: str, rate_limiter, fail_connect: bool = False) -> None:
+        self.session_file = session_file
+        self.rate_limiter = rate_limiter
+        self.fail_connect = fail_connect
+        self.calls: List[str] = []
+        self.active = 0
+        self.peak = 0
+        self.disconnected = False
+
+    async def connect(self) -> None:
+        if self.fail_connect:
+            raise RuntimeError("not authorized")
+
+    async def disconnect(self) -> None:
+        self.disconnected = True
+
+    async def parse_channel(self, channel_identifier: str, output_dir: str, **kwargs):
+        await self.rate_limiter.acquire()
+        self.calls.append(channel_identifier)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(0.01)
+            return {"summary": {"new_messages": 1}, "partial_failure": False, "export_dir": output_dir}
+        finally:
+            self.active -= 1
+
+
+def _sessions(tmp: str, names: List[str]) -> List[str]:
+    return [str(Path(tmp) / f"{n}.session") for n in names]
+
+
+def test_affinity_is_sticky() -> bool:
+    """Новые каналы распределяются по наименее загруженным сессиям; повторный запуск — те же сессии."""
+    with tempfile.TemporaryDirectory() as tmp:
+        sessions = _sessions(tmp, ["a", "b"])
+        affinity = Path(tmp) / AFFINITY_NAME
+        with SessionPool(sessions, StubSessionParser, affinity, rate_limit=0) as pool:
+            first = {c: pool.session_name(pool.parser_for(c)) for c in ["@x", "@y", "@z"]}
+        assert first == {"@x": "a", "@y": "b", "@z": "a"}
+        saved = json.loads(affinity.read_text(encoding="utf-8"))["channels"]
+        assert saved == first
+
+        with SessionPool(list(reversed(sessions)), StubSessionParser, affinity, rate_limit=0) as pool:
+            second = {c: pool.session_name(pool.parser_for(c)) for c in ["@z", "@y", "@x"]}
+        assert second == first
+    return True
+
+
+def test_busy_session_skipped_and_channel_reassigned() -> bool:
+    """Сессия, занятая другим процессом, не входит в пул; её каналы переходят на свободную."""
+    with tempfile.TemporaryDirectory() as tmp:
+        sessions = _sessions(tmp, ["a", "b"])
+        affinity = Path(tmp) / AFFINITY_NAME
+        affinity.write_text(json.dumps({"channels": {"@x": "a"}}), encoding="utf-8")
+        with session_lock(sessions[0]) as held:
+            assert held
+            with SessionPool(sessions, StubSessionParser, affinity, rate_limit=0) as pool:
+                assert len(pool) == 1
+                assert pool.session_name(pool.parser_for("@x")) == "b"
+            assert json.loads(affinity.read_text(encoding="utf-8"))["channels"]["@x"] == "b"
+        # после выхода из пула блокировка сессии b снята
+        with session_lock(sessions[1]) as again:
+            assert again
+    return True
+
+
+def test_connect_all_drops_unauthorized() -> bool:
+    """Сессия без авторизации исключается из пула; если не осталось ни одной — ошибка."""
+
+    def factory(session_file: str, rate_limiter):
+        return StubSessionParser(session_file, rate_limiter, fail_connect=session_file.endswith("bad.session"))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        affinity = Path(tmp) / AFFINITY_NAME
+        with SessionPool(_sessions(tmp, ["ok", "bad"]), factory, affinity, rate_limit=0) as pool:
+            asyncio.run(pool.connect_all())
+            assert list(pool.parsers) == ["ok"]
+        with SessionPool(_sessions(tmp, ["bad"]), factory, affinity, rate_limit=0) as pool:
+            try:
+                asyncio.run(pool.connect_all())
+            except RuntimeError:
+                pass
+            else:
+                raise AssertionError("empty pool must fail")
+    return True
+
+
+def test_parse_many_on_pool() -> bool:
+    """Каналы делятся между сессиями, concurrency — на сессию, FloodWait одной сессии не тормозит другую."""
+    with tempfile.TemporaryDirectory() as tmp:
+        sessions = _sessions(tmp, ["a", "b"])
+        channels = [f"@c{i}" for i in range(6)]
+        with SessionPool(sessions, StubSessionParser, Path(tmp) / AFFINITY_NAME, rate_limit=0) as pool:
+            pool.parsers["a"].rate_limiter.pause(0.3)
+            summary = asyncio.run(parse_many(None, channels, tmp, concurrency=2, pool=pool))
+            a, b = pool.parsers["a"], pool.parsers["b"]
+            assert len(a.calls) == 3 and len(b.calls) == 3
+            assert a.peak == 2 and b.peak == 2
+        assert summary["ok"] == 6
+        assert {r["session"] for r in summary["channels"]} == {"a", "b"}
+        assert summary["sessions"]["a"]["rate_limiter"]["flood_pauses"] == 1
+        assert summary["sessions"]["b"]["rate_limiter"]["flood_pauses"] == 0
+        assert summary["sessions"]["b"]["rate_limiter"]["waited_sec"] < 0.1
+    return True
+
+
+def run_all() -> bool:
+    cases = [
+        ("affinity is sticky", test_affinity_is_sticky),
+        ("busy session skipped, channel reassigned", test_busy_session_skipped_and_channel_reassigned),
+        ("connect_all drops unauthorized", test_connect_all_drops_unauthorized),
+        ("parse-many on pool", test_parse_many_on_pool),
+    ]
+    ok = 0
+    for name, fn in cases:
+        try:
+            if fn():
+                ok += 1
+                print(f"  OK {name}")
+            else:
+                print(f"  FAIL {name}")
+        except Exception as e:
+            print(f"  FAIL {name}: {e}")
+    return ok == len(cases)
+
+
+if __name__ == "__main__":
+    print("TG session pool unit tests")
+    sys.exit(0 if run_all() else 1)
@@ -9,6 +9,7 @@ Unit-тесты WP REST client (Этап 2): backoff, should_retry, rate limit.
 from __future__ import annotations
 
 import sys
+import threading
 import time
 from pathlib import Path
 from unittest.mock import MagicMock, patch
@@ -97,6 +98,36 @@ def test_rate_limit_waits_before_request() -> bool:
     client._wait_rate_limit()
     elapsed = time.monotonic() - t0
     assert elapsed >= (1.0 / 3.0) - 0.05, f"expected >= ~0.33s, got {elapsed}"
+    # Ожидание учитывается в wait_sec (для сводки прогона)
+    assert client.wait_sec >= (1.0 / 3.0) - 0.05, client.wait_sec
+    return True
+
+
+def test_rate_limit_shared_across_threads() -> bool:
+    """Лимит общий для потоков: 6 запросов из 3 потоков при 10 req/s занимают >= 0.5 сек."""
+    client = WPRestClient(
+        base_url="https://example.com",
+        user="u",
+        app_password="p",
+        requests_per_second=10.0,
+    )
+    stamps = []
+    lock = threading.Lock()
+
+    def worker() -> None:
+        for _ in range(2):
+            client._wait_rate_limit()
+            with lock:
+                stamps.append(time.monotonic())
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stamps.sort()
+    assert stamps[-1] - stamps[0] >= 0.45, stamps
+    assert all(b - a >= 0.08 for a, b in zip(stamps, stamps[1:])), stamps
     return True
 
 
@@ -113,7 +144,7 @@ def test_client_get_with_headers_returns_tuple() -> bool:
     mock_resp.headers = {"X-WP-Total": "10", "X-WP-TotalPages": "1"}
     mock_resp.raise_for_status = MagicMock()
 
-    with patch("wp.client.requests.request", return_value=mock_resp):
+    with patch.object(client._session, "request", return_value=mock_resp):
         data, headers = client.get_with_headers("/posts", run_id="test-run")
     assert data == [{"id": 1}]
     assert "X-WP-Total" in headers
@@ -129,6 +160,7 @@ def run_all() -> bool:
         ("should_retry no retry cases", test_should_retry_no_retry_cases),
         ("rate_limit min delay", test_rate_limit_min_delay),
         ("rate_limit waits", test_rate_limit_waits_before_request),
+        ("rate_limit shared across threads", test_rate_limit_shared_across_threads),
         ("get_with_headers returns tuple", test_client_get_with_headers_returns_tuple),
     ]
     ok = 0
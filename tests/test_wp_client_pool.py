@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Тесты пула соединений WP: keep-alive у WPRestClient, retry и error_code поверх пула.
+
+Против локального mock HTTP server (HTTP/1.1). Запуск из корня проекта:
+  python tests/test_wp_client_pool.py
+"""
+
+from __future__ import annotations
+
+import json
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import List
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from errors import WP_AUTH_ERROR, WP_NETWORK_ERROR
+from wp.client import WPClientError, WPRestClient
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    """HTTP/1.1: запоминает клиентские порты (новый порт — новое TCP-соединение); /flaky — сначала 429."""
+
+    protocol_version = "HTTP/1.1"
+    peers: List[int] = []
+    flaky_calls = 0
+    lock = threading.Lock()
+
+    def _json(self, status: int, payload, headers=None) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        with KeepAliveHandler.lock:
+            KeepAliveHandler.peers.append(self.client_address[1])
+        if self.path.startswith("/wp-json/wp/v2/denied"):
+            self._json(401, {"code": "rest_not_logged_in"})
+        elif self.path.startswith("/wp-json/wp/v2/missing"):
+            self._json(404, {"code": "rest_no_route"})
+        elif self.path.startswith("/wp-json/wp/v2/flaky"):
+            with KeepAliveHandler.lock:
+                KeepAliveHandler.flaky_calls += 1
+                n = KeepAliveHandler.flaky_calls
+            if n == 1:
+                self._json(429, {"code": "rate_limit"}, {"Retry-After": "1"})
+            else:
+                self._json(200, [{"id": 1}], {"X-WP-TotalPages": "1"})
+        else:
+            self._json(200, [{"path": self.path}], {"X-WP-Total": "1", "X-WP-TotalPages": "1"})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve():
+    KeepAliveHandler.peers = []
+    KeepAliveHandler.flaky_calls = 0
+    port = _free_port()
+    server = ThreadingHTTPServer(("127.0.0.1", port), KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{port}"
+
+
+def test_sync_client_reuses_connection() -> bool:
+    """Последовательные запросы WPRestClient идут по одному TCP-соединению."""
+    server, url = _serve()
+    try:
+        with WPRestClient(url, "u", "p", timeout_sec=5, requests_per_second=100.0) as client:
+            for page in range(1, 4):
+                data, headers = client.get_with_headers("/posts", params={"page": page})
+                assert data[0]["path"].endswith(f"page={page}")
+        assert len(KeepAliveHandler.peers) == 3
+        assert len(set(KeepAliveHandler.peers)) == 1, KeepAliveHandler.peers
+        return True
+    finally:
+        server.shutdown()
+
+
+def test_retry_and_error_codes_over_pool() -> bool:
+    """429 + Retry-After повторяется, 401 — WP_AUTH_ERROR, 404 — WP_NETWORK_ERROR без повторов."""
+    server, url = _serve()
+    try:
+        with WPRestClient(url, "u", "p", timeout_sec=5, max_retries=2, requests_per_second=100.0) as client:
+            t0 = time.monotonic()
+            data, headers = client.get_with_headers("/flaky")
+            assert data == [{"id": 1}] and time.monotonic() - t0 >= 0.9
+            assert KeepAliveHandler.flaky_calls == 2
+            for path, code, status in (("/denied", WP_AUTH_ERROR, 401), ("/missing", WP_NETWORK_ERROR, 404)):
+                try:
+                    client.get(path)
+                    raise AssertionError(f"expected WPClientError for {path}")
+                except WPClientError as e:
+                    assert (e.error_code, e.status_code) == (code, status)
+        assert len(set(KeepAliveHandler.peers)) == 1, KeepAliveHandler.peers
+        return True
+    finally:
+        server.shutdown()
+
+
+def run_all() -> bool:
+    cases = [
+        ("sync client reuses connection", test_sync_client_reuses_connection),
+        ("retry + error codes over pool", test_retry_and_error_codes_over_pool),
+    ]
+    ok = 0
+    for name, fn in cases:
+        try:
+            if fn():
+                ok += 1
+                print(f"  OK {name}")
+            else:
+                print(f"  FAIL {name}")
+        except Exception as e:
+            print(f"  FAIL {name}: {e}")
+    return ok == len(cases)
+
+
+if __name__ == "__main__":
+    print("WP pooled client tests")
+    sys.exit(0 if run_all() else 1)
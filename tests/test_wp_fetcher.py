@@ -8,19 +8,25 @@ Unit-тесты WP Fetcher (Этап 3): пагинация, X-WP-TotalPages, fa
 
 from __future__ import annotations
 
+import random
 import sys
+import threading
+import time
 from pathlib import Path
 from unittest.mock import MagicMock
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(PROJECT_ROOT))
 
+from errors import WP_NETWORK_ERROR
+from wp.client import WPClientError
 from wp.fetcher import (
     _total_pages,
     fetch_categories,
     fetch_posts,
     fetch_pages,
     fetch_users,
+    iter_posts,
 )
 from wp.mapper import post_to_content, content_embedded_terms
 
@@ -174,6 +180,216 @@ def test_fetch_categories_pagination() -> bool:
     return True
 
 
+class PagedClient:
+    """Потокобезопасный фейк get_with_headers: отвечает из списка страниц со случайной задержкой."""
+
+    def __init__(self, pages, total_pages=None, total_items=None) -> None:
+        self.pages = pages
+        self.total_pages = total_pages or len(pages)
+        self.total_items = total_items
+        self.requested = []
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def get_with_headers(self, path, params=None, run_id=None):
+        page = params["page"]
+        with self.lock:
+            self.requested.append(page)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(random.uniform(0.005, 0.03))
+            if page > len(self.pages):
+                raise WPClientError("WP API client error: 400", WP_NETWORK_ERROR, status_code=400)
+            headers = {"X-WP-TotalPages": str(self.total_pages)}
+            if self.total_items is not None:
+                headers["X-WP-Total"] = str(self.total_items)
+            return self.pages[page - 1], headers
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def _users(ids):
+    return [{"id": i, "slug": f"u{i}", "name": f"User {i}"} for i in ids]
+
+
+def test_fan_out_keeps_page_order() -> bool:
+    """Страницы 2..N запрашиваются параллельно, результат — в порядке страниц."""
+    pages = [_users(range(p * 10, p * 10 + 10)) for p in range(8)]
+    client = PagedClient(pages)
+    result = fetch_users(client, "main", per_page=10, page_concurrency=4)
+    assert [r.wp_user_id for r in result] == list(range(80))
+    assert sorted(client.requested) == list(range(1, 9)) and client.requested[0] == 1
+    assert 1 < client.peak <= 4
+    return True
+
+
+def test_fan_out_sequential_when_concurrency_one() -> bool:
+    """page_concurrency=1 — последовательный обход без параллельных запросов."""
+    pages = [_users(range(p * 10, p * 10 + 10)) for p in range(4)]
+    client = PagedClient(pages)
+    result = fetch_users(client, "main", per_page=10, page_concurrency=1)
+    assert len(result) == 40 and client.peak == 1
+    assert client.requested == [1, 2, 3, 4]
+    return True
+
+
+def test_fan_out_tolerates_shifted_pages() -> bool:
+    """Сдвиг страниц во время обхода: дубли по id отбрасываются, выросшее TotalPages догружается."""
+    pages = [_users(range(0, 10)), _users(range(9, 19)), _users(range(19, 29)), _users(range(29, 31))]
+    client = PagedClient(pages, total_pages=2)
+    # первая страница говорит «2 страницы», последующие — уже 4
+    original = client.get_with_headers
+
+    def growing(path, params=None, run_id=None):
+        data, headers = original(path, params=params, run_id=run_id)
+        if params["page"] > 1:
+            headers["X-WP-TotalPages"] = "4"
+        return data, headers
+
+    client.get_with_headers = growing
+    result = fetch_users(client, "main", per_page=10, page_concurrency=3)
+    ids = [r.wp_user_id for r in result]
+    assert ids == list(range(31)), ids
+    return True
+
+
+def test_fan_out_400_past_end_is_end() -> bool:
+    """Если страниц стало меньше, 400 на странице за концом — конец пагинации, а не ошибка."""
+    pages = [_users(range(0, 10)), _users(range(10, 20))]
+    client = PagedClient(pages, total_pages=3)
+    result = fetch_users(client, "main", per_page=10, page_concurrency=2)
+    assert [r.wp_user_id for r in result] == list(range(20))
+    return True
+
+
+def test_iter_posts_bounded_prefetch() -> bool:
+    """iter_posts отдаёт страницу за страницей и качает вперёд не больше page_concurrency страниц."""
+    pages = [_users(range(p * 10, p * 10 + 10)) for p in range(20)]
+    client = PagedClient(pages)
+    stream = iter_posts(client, "main", per_page=10, page_concurrency=3)
+    rows, _ = next(stream)
+    assert [r.wp_id for r in rows] == list(range(10))
+    rows, _ = next(stream)
+    assert [r.wp_id for r in rows] == list(range(10, 20))
+    time.sleep(0.1)  # дать потокам шанс убежать вперёд, если окно не ограничено
+    assert len(client.requested) <= 2 + 3, client.requested
+    rest = [r.wp_id for page_rows, _ in stream for r in page_rows]
+    assert rest == list(range(20, 200))
+    return True
+
+
+def test_fetch_posts_fields_projection() -> bool:
+    """full_payload=False: _fields из CONTENT_FIELDS и _embed=wp:term; маппинг и термины из проекции работают."""
+    from wp.mapper import CONTENT_FIELDS
+
+    item = {
+        "id": 7,
+        "slug": "p7",
+        "status": "publish",
+        "title": {"rendered": "T"},
+        "modified_gmt": "2026-01-01T00:00:00",
+        "_embedded": {"wp:term": [[{"id": 3, "taxonomy": "category"}], []]},
+    }
+    client = MagicMock()
+    client.get_with_headers.return_value = ([item], {"X-WP-TotalPages": "1"})
+    rows, terms = fetch_posts(client, "main", per_page=100, full_payload=False)
+    params = client.get_with_headers.call_args.kwargs["params"]
+    assert params["_embed"] == "wp:term"
+    assert params["_fields"].split(",") == list(CONTENT_FIELDS)
+    assert "_links" in CONTENT_FIELDS and "_embedded" in CONTENT_FIELDS  # без них WP не встроит термины
+    assert rows[0].wp_id == 7 and rows[0].title == "T"
+    assert [(t.taxonomy, t.wp_term_id) for t in terms] == [("category", 3)]
+    return True
+
+
+class FakeArchive:
+    """Архив постов в памяти: page=N, before / modified_after; глубокие страницы медленные или падают."""
+
+    def __init__(self, n, slow_from=None, fail_from=None, delay=0.05, same_second=0):
+        # date/modified убывают по id; первые same_second постов — в одну секунду
+        self.posts = [
+            {
+                "id": i,
+                "slug": f"p{i}",
+                "date": f"2025-01-01T00:{max(i, same_second) // 60:02d}:{max(i, same_second) % 60:02d}",
+                "modified": f"2025-01-01T00:{(n - i) // 60:02d}:{(n - i) % 60:02d}",
+            }
+            for i in range(n, 0, -1)
+        ]
+        self.slow_from = slow_from
+        self.fail_from = fail_from
+        self.delay = delay
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def get_with_headers(self, path, params=None, run_id=None):
+        with self._lock:
+            self.calls.append(dict(params))
+        items = self.posts
+        if "before" in params:
+            items = [p for p in items if p["date"] < params["before"]]
+        if params.get("orderby") == "modified":
+            items = sorted(items, key=lambda p: p["modified"])
+            if "modified_after" in params:
+                items = [p for p in items if p["modified"] > params["modified_after"]]
+        page, per_page = params["page"], params["per_page"]
+        keyset = "before" in params or params.get("modified_after", "") > "2025"
+        if not keyset and self.fail_from and page >= self.fail_from:
+            raise WPClientError("WP API timeout: read timed out", WP_NETWORK_ERROR)
+        if not keyset and self.slow_from and page >= self.slow_from:
+            time.sleep(self.delay)
+        total_pages = max(1, -(-len(items) // per_page))
+        return items[(page - 1) * per_page: page * per_page], {"X-WP-TotalPages": str(total_pages)}
+
+
+def test_keyset_switch_on_slow_page() -> bool:
+    """Страница 3 медленнее порога: дальше page=1 с before=<самая ранняя дата + 1 с>, ничего не потеряно."""
+    client = FakeArchive(20, slow_from=3)
+    rows = [r for rows, _ in iter_posts(client, "main", per_page=4, page_concurrency=1, keyset_latency_sec=0.02)
+            for r in rows]
+    assert sorted(r.wp_id for r in rows) == list(range(1, 21))
+    assert len(rows) == 20
+    offset_pages = [c["page"] for c in client.calls if "before" not in c]
+    keyset_calls = [c for c in client.calls if "before" in c]
+    assert offset_pages == [1, 2, 3], offset_pages
+    assert keyset_calls and all(c["page"] == 1 for c in keyset_calls)
+    assert keyset_calls[0]["before"] == "2025-01-01T00:00:10"  # последний пост страницы 3 — id 9 (00:00:09)
+    return True
+
+
+def test_keyset_switch_on_timeout_incremental() -> bool:
+    """Incremental: timeout на глубокой странице — обход продолжается по modified_after с того же места."""
+    from datetime import datetime
+
+    client = FakeArchive(12, fail_from=3)
+    since = datetime(2024, 12, 31)
+    rows = [
+        r
+        for rows, _ in iter_posts(
+            client, "main", per_page=3, page_concurrency=2, modified_after=since, keyset_latency_sec=5.0
+        )
+        for r in rows
+    ]
+    assert sorted(r.wp_id for r in rows) == list(range(1, 13))
+    keyset_calls = [c for c in client.calls if c["modified_after"] > "2025"]
+    assert keyset_calls[0]["modified_after"] == "2025-01-01T00:00:04"  # последний со страницы 2 (00:00:05) - 1 с
+    assert all(c["orderby"] == "modified" for c in client.calls)
+    return True
+
+
+def test_keyset_window_with_same_second_items() -> bool:
+    """Больше per_page объектов в одной секунде: курсор не двигается — листается page внутри окна."""
+    client = FakeArchive(12, slow_from=2, same_second=10)
+    rows = [r for rows, _ in iter_posts(client, "main", per_page=3, page_concurrency=1, keyset_latency_sec=0.02)
+            for r in rows]
+    assert sorted(r.wp_id for r in rows) == list(range(1, 13))
+    assert any(c.get("before") and c["page"] > 1 for c in client.calls)
+    return True
+
+
 def run_all() -> bool:
     cases = [
         ("_total_pages from header", test_total_pages_from_header),
@@ -186,6 +402,15 @@ def run_all() -> bool:
         ("mapping embedded terms", test_mapping_embedded_terms),
         ("fetch non-list safe finish", test_fetch_non_list_safe_finish),
         ("fetch_categories pagination", test_fetch_categories_pagination),
+        ("fan-out keeps page order", test_fan_out_keeps_page_order),
+        ("fan-out sequential when concurrency 1", test_fan_out_sequential_when_concurrency_one),
+        ("fan-out tolerates shifted pages", test_fan_out_tolerates_shifted_pages),
+        ("fan-out 400 past end is end", test_fan_out_400_past_end_is_end),
+        ("iter_posts bounded prefetch", test_iter_posts_bounded_prefetch),
+        ("fetch_posts _fields projection", test_fetch_posts_fields_projection),
+        ("keyset switch on slow page", test_keyset_switch_on_slow_page),
+        ("keyset switch on timeout (incremental)", test_keyset_switch_on_timeout_incremental),
+        ("keyset window with same-second items", test_keyset_window_with_same_second_items),
     ]
     ok = 0
     for name, fn in cases:
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Тесты HTTP-кэша WP (wp.http_cache): условные GET с ETag/Last-Modified против
+локального HTTP-сервера, 304 из кэша, счётчики hit/miss, LRU-вытеснение по размеру.
+
+Запуск из корня проекта:
+  python tests/test_wp_http_cache.py
+"""
+
+from __future__ import annotations
+
+import json
+import socket
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from wp.client import WPRestClient  # noqa: E402
+from wp.http_cache import HTTPResponseCache  # noqa: E402
+
+POSTS = [{"id": 1, "slug": "a"}, {"id": 2, "slug": "b"}]
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ETagHandler(BaseHTTPRequestHandler):
+    """/posts с ETag; совпавший If-None-Match — 304 без тела. /users — без валидаторов."""
+
+    etag = '"v1"'
+    conditional = []  # If-None-Match из запросов
+
+    def do_GET(self):
+        if self.path.startswith("/wp-json/wp/v2/users"):
+            body = json.dumps([{"id": 1}]).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        sent = self.headers.get("If-None-Match")
+        ETagHandler.conditional.append(sent)
+        if sent == ETagHandler.etag:
+            self.send_response(304)
+            self.send_header("ETag", ETagHandler.etag)
+            self.end_headers()
+            return
+        body = json.dumps(POSTS).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", ETagHandler.etag)
+        self.send_header("X-WP-TotalPages", "1")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve():
+    port = _free_port()
+    server = HTTPServer(("127.0.0.1", port), ETagHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{port}"
+
+
+def _client(base_url: str, cache: HTTPResponseCache) -> WPRestClient:
+    return WPRestClient(
+        base_url=base_url, user="u", app_password="p", timeout_sec=5, max_retries=0,
+        requests_per_second=100.0, site_id="test", cache=cache,
+    )
+
+
+def test_304_served_from_cache() -> bool:
+    """Второй GET уходит с If-None-Match, 304 отдаёт тело и X-WP-TotalPages из кэша."""
+    ETagHandler.conditional = []
+    ETagHandler.etag = '"v1"'
+    server, base_url = _serve()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = HTTPResponseCache(Path(tmp))
+            client = _client(base_url, cache)
+            params = {"status": "publish", "page": 1}
+            first, h1 = client.get_with_headers("/posts", params=params)
+            second, h2 = client.get_with_headers("/posts", params=params)
+            assert first == second == POSTS
+            assert h2["X-WP-TotalPages"] == "1"
+            assert ETagHandler.conditional == [None, '"v1"'], ETagHandler.conditional
+            assert (client.cache_hits, client.cache_misses) == (1, 1)
+
+            # Новый прогон (новый объект кэша на том же каталоге) — запись переживает процесс.
+            client2 = _client(base_url, HTTPResponseCache(Path(tmp)))
+            assert client2.get("/posts", params=params) == POSTS
+            assert client2.cache_hits == 1
+
+            # Контент сменился — сервер отдаёт 200 с новым ETag, это miss.
+            ETagHandler.etag = '"v2"'
+            client2.get("/posts", params=params)
+            assert client2.cache_misses == 1
+            client.close()
+            client2.close()
+    finally:
+        server.shutdown()
+    return True
+
+
+def test_response_without_validators_not_cached() -> bool:
+    """Без ETag/Last-Modified ответ не кэшируется: каждый GET — miss, условных заголовков нет."""
+    server, base_url = _serve()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = HTTPResponseCache(Path(tmp))
+            client = _client(base_url, cache)
+            client.get("/users")
+            client.get("/users")
+            assert (client.cache_hits, client.cache_misses) == (0, 2)
+            assert cache.size_bytes == 0
+            client.close()
+    finally:
+        server.shutdown()
+    return True
+
+
+def test_lru_eviction_by_size() -> bool:
+    """Предел размера: вытесняется запись, к которой дольше всего не обращались."""
+    with tempfile.TemporaryDirectory() as tmp:
+        data = ["x" * 200]
+        headers = {"ETag": '"e"'}
+        probe = HTTPResponseCache(Path(tmp) / "probe")
+        probe.put("u0", None, data, headers)
+        entry_size = probe.size_bytes
+
+        cache = HTTPResponseCache(Path(tmp) / "lru", max_bytes=entry_size * 3)
+        for url in ("u1", "u2", "u3"):
+            cache.put(url, None, data, headers)
+            time.sleep(0.01)
+        cache.touch("u1", None)  # u1 свежее u2
+        time.sleep(0.01)
+        cache.put("u4", None, data, headers)
+        assert cache.evictions == 1
+        assert cache.get("u2", None) is None
+        assert all(cache.get(u, None) is not None for u in ("u1", "u3", "u4"))
+        assert cache.size_bytes <= cache.max_bytes
+    return True
+
+
+def run_all() -> bool:
+    cases = [
+        ("304 served from cache", test_304_served_from_cache),
+        ("response without validators not cached", test_response_without_validators_not_cached),
+        ("LRU eviction by size", test_lru_eviction_by_size),
+    ]
+    ok = 0
+    for name, fn in cases:
+        try:
+            if fn():
+                ok += 1
+                print(f"  OK {name}")
+            else:
+                print(f"  FAIL {name}")
+        except Exception as e:
+            print(f"  FAIL {name}: {e}")
+    return ok == len(cases)
+
+
+if __name__ == "__main__":
+    print("WP HTTP cache tests")
+    sys.exit(0 if run_all() else 1)
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Тесты incremental sync WP (WP_SYNC_MODE=incremental): modified_after в запросах,
+отсечка по watermark, wp_sync_state в SQLite, миграция старой базы, ошибки состояния.
+
+Запуск из корня проекта:
+  python tests/test_wp_incremental.py
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import wp.storage as storage  # noqa: E402
+import wp_sync_skill  # noqa: E402
+from errors import WP_INCREMENTAL_STATE_ERROR  # noqa: E402
+from wp import storage_sqlite  # noqa: E402
+from wp.config import SYNC_MODE_INCREMENTAL  # noqa: E402
+from wp.fetcher import fetch_posts, latest_modified  # noqa: E402
+from wp.mapper import post_to_content  # noqa: E402
+
+SITE_ID = "inc"
+
+
+def _post(wp_id: int, modified_gmt: str, title: str = "T") -> dict:
+    return {
+        "id": wp_id,
+        "slug": f"p{wp_id}",
+        "title": {"rendered": title},
+        "content": {"rendered": "<p>x</p>"},
+        "status": "publish",
+        "author": 1,
+        "date_gmt": "2026-01-01T00:00:00",
+        "modified_gmt": modified_gmt,
+    }
+
+
+@contextmanager
+def _sqlite_storage():
+    """Временная SQLite-база для wp.storage (backend кешируется модулем — сбрасываем)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {"WP_STORAGE_BACKEND": "sqlite", "WP_STORAGE_PATH": str(Path(tmp) / "wp.db")}
+        with patch.dict(os.environ, env):
+            storage._backend = None
+            try:
+                yield Path(env["WP_STORAGE_PATH"])
+            finally:
+                storage._backend = None
+
+
+class FakeWP:
+    """Сайт WP в памяти: posts отдаются с учётом modified_after (как WP 5.7+), запросы пишутся."""
+
+    def __init__(self, posts):
+        self.posts = posts
+        self.calls = []
+        self.wait_sec = 0.0
+
+    def __call__(self, **kwargs):
+        return self
+
+    def get_with_headers(self, path, params=None, run_id=None):
+        params = params or {}
+        self.calls.append((path, dict(params)))
+        if path != "/posts":
+            return [], {"X-WP-TotalPages": "1"}
+        items = self.posts
+        if "modified_after" in params:
+            items = [p for p in items if p["modified_gmt"] > params["modified_after"]]
+        return list(items), {"X-WP-TotalPages": "1", "X-WP-Total": str(len(items))}
+
+    def close(self):
+        pass
+
+
+def _sync(fake: FakeWP) -> dict:
+    with patch.object(wp_sync_skill, "WPRestClient", fake):
+        return wp_sync_skill.run_sync_site(
+            site_id=SITE_ID,
+            base_url="https://inc.example",
+            name=None,
+            user="u",
+            app_password="p",
+            run_id=f"r{len(fake.calls)}",
+            per_page=100,
+            timeout_sec=5,
+            retries=0,
+            requests_per_second=100.0,
+            page_concurrency=1,
+            sync_mode=SYNC_MODE_INCREMENTAL,
+        )
+
+
+def test_fetch_posts_modified_after_params_and_cutoff() -> bool:
+    """modified_after + orderby=modified в запросе (с запасом на пояс сайта), старее watermark — отсекается."""
+    client = MagicMock()
+    client.get_with_headers.return_value = (
+        [_post(1, "2026-03-01T09:00:00"), _post(2, "2026-03-01T10:00:00"), _post(3, "2026-03-02T00:00:00")],
+        {"X-WP-TotalPages": "1"},
+    )
+    since = datetime(2026, 3, 1, 10, 0, tzinfo=timezone.utc)
+    rows, _ = fetch_posts(client, SITE_ID, per_page=100, modified_after=since)
+    params = client.get_with_headers.call_args.kwargs["params"]
+    assert params["modified_after"] == "2026-02-28T10:00:00", params
+    assert params["orderby"] == "modified" and params["order"] == "asc"
+    assert [r.wp_id for r in rows] == [2, 3]
+    # full: параметры без изменений
+    fetch_posts(client, SITE_ID, per_page=100)
+    params = client.get_with_headers.call_args.kwargs["params"]
+    assert "modified_after" not in params and "orderby" not in params
+    return True
+
+
+def test_latest_modified() -> bool:
+    """Watermark — максимум modified_at строк и предыдущего значения, в UTC."""
+    prev = datetime(2026, 3, 1, tzinfo=timezone.utc)
+    rows = [post_to_content(SITE_ID, _post(1, "2026-02-01T00:00:00")), post_to_content(SITE_ID, _post(2, "2026-03-05T00:00:00"))]
+    assert latest_modified(rows, prev) == datetime(2026, 3, 5, tzinfo=timezone.utc)
+    assert latest_modified([], prev) == prev
+    assert latest_modified([], None) is None
+    return True
+
+
+def test_incremental_runs_fetch_only_changed() -> bool:
+    """1-й прогон полный и ставит watermark; 2-й без изменений — только пост-watermark; 3-й — изменённый пост."""
+    fake = FakeWP([_post(1, "2026-03-01T10:00:00"), _post(2, "2026-03-02T10:00:00")])
+    with _sqlite_storage() as db_path:
+        first = _sync(fake)
+        assert first["summary"]["status"] == "success"
+        assert first["summary"]["posts_count"] == 2
+        assert first["summary"]["watermark"] == "2026-03-02T10:00:00+00:00"
+        assert "modified_after" not in [c for c in fake.calls if c[0] == "/posts"][0][1]
+
+        second = _sync(fake)
+        # WP вернёт посты за сутки до watermark (запас на пояс сайта), клиент оставит только >= watermark:
+        # сам пост-watermark перезаписывается идемпотентно
+        assert [c["wp_id"] for c in second["content"]] == [2]
+        assert second["summary"]["watermark"] == "2026-03-02T10:00:00+00:00"
+
+        fake.posts[0] = _post(1, "2026-03-10T08:00:00", title="Edited")
+        third = _sync(fake)
+        assert sorted(c["wp_id"] for c in third["content"]) == [1, 2]
+        assert third["summary"]["watermark"] == "2026-03-10T08:00:00+00:00"
+        last_posts_params = [c for c in fake.calls if c[0] == "/posts"][-1][1]
+        assert last_posts_params["modified_after"] == "2026-03-01T10:00:00"
+
+        conn = sqlite3.connect(str(db_path))
+        try:
+            assert conn.execute("SELECT COUNT(*) FROM wp_content WHERE site_id = ?", (SITE_ID,)).fetchone()[0] == 2
+            assert conn.execute("SELECT title FROM wp_content WHERE wp_id = 1").fetchone()[0] == "Edited"
+            state = conn.execute("SELECT last_modified_gmt, last_run_id FROM wp_sync_state").fetchall()
+            assert len(state) == 1 and state[0][0].startswith("2026-03-10T08:00:00")
+        finally:
+            conn.close()
+    return True
+
+
+def test_corrupt_state_fails_with_state_error() -> bool:
+    """Невалидный watermark в wp_sync_state -> status=failed, error_code=WP_INCREMENTAL_STATE_ERROR."""
+    fake = FakeWP([_post(1, "2026-03-01T10:00:00")])
+    with _sqlite_storage():
+        with storage.get_connection() as conn:
+            storage.upsert_site(conn, SITE_ID, "https://inc.example", None)
+            conn.execute(
+                "INSERT INTO wp_sync_state (site_id, last_modified_gmt, last_run_id) VALUES (?, ?, ?)",
+                (SITE_ID, "not-a-date", "r0"),
+            )
+        data = _sync(fake)
+    assert data["summary"]["status"] == "failed"
+    assert data["summary"]["error_code"] == WP_INCREMENTAL_STATE_ERROR
+    assert not [c for c in fake.calls if c[0] == "/posts"]
+    return True
+
+
+def test_legacy_sqlite_db_gets_new_migrations() -> bool:
+    """База, созданная до учёта версий (001–006, user_version=0), получает wp_sync_state при подключении."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "legacy.db"
+        conn = sqlite3.connect(str(path))
+        for number, migration in storage_sqlite._migration_files():
+            if number <= 6:
+                storage_sqlite._apply_migration(conn, migration)
+        conn.commit()
+        conn.close()
+        with patch.dict(os.environ, {"WP_STORAGE_PATH": str(path)}):
+            with storage_sqlite.get_connection() as conn:
+                tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+    assert "wp_sync_state" in tables
+    assert version == storage_sqlite._migration_files()[-1][0]
+    return True
+
+
+def run_all() -> bool:
+    cases = [
+        ("fetch_posts: modified_after params + cutoff", test_fetch_posts_modified_after_params_and_cutoff),
+        ("latest_modified watermark", test_latest_modified),
+        ("incremental runs fetch only changed", test_incremental_runs_fetch_only_changed),
+        ("corrupt state -> WP_INCREMENTAL_STATE_ERROR", test_corrupt_state_fails_with_state_error),
+        ("legacy sqlite db migrated", test_legacy_sqlite_db_gets_new_migrations),
+    ]
+    ok = 0
+    for name, fn in cases:
+        try:
+            if fn():
+                ok += 1
+                print(f"  OK {name}")
+            else:
+                print(f"  FAIL {name}")
+        except Exception as e:
+            print(f"  FAIL {name}: {e}")
+    return ok == len(cases)
+
+
+if __name__ == "__main__":
+    print("WP incremental sync tests")
+    sys.exit(0 if run_all() else 1)
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Тесты зеркала медиа WP (wp.media): извлечение URL из объекта WP, параллельная
+загрузка с локального HTTP-сервера, дедупликация по sha256, пропуск уже
+зеркалированного, запись wp_media в SQLite.
+
+Запуск из корня проекта:
+  python tests/test_wp_media.py
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest.mock import patch
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from wp.media import MediaMirror, extract_media_urls  # noqa: E402
+from wp.rate_limiter import AdaptiveRateLimiter  # noqa: E402
+
+FILES = {
+    "/wp-content/uploads/a.jpg": b"A" * 1000,
+    "/wp-content/uploads/a-copy.jpg": b"A" * 1000,  # тот же файл под другим URL
+    "/wp-content/uploads/b.png": b"B" * 500,
+}
+BUSY_PATH = "/wp-content/uploads/busy.jpg"  # первый запрос — 429 с Retry-After
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class FilesHandler(BaseHTTPRequestHandler):
+    requested = []
+
+    def do_GET(self):
+        FilesHandler.requested.append(self.path)
+        if self.path == BUSY_PATH and FilesHandler.requested.count(BUSY_PATH) == 1:
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = FILES.get(self.path, b"C" * 100 if self.path == BUSY_PATH else None)
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve():
+    port = _free_port()
+    server = ThreadingHTTPServer(("127.0.0.1", port), FilesHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{port}"
+
+
+def test_extract_media_urls() -> bool:
+    """Featured media + img src/srcset; относительные URL и &amp; разворачиваются, чужие хосты и data: отбрасываются."""
+    base = "https://site.example.com"
+    raw = {
+        "_embedded": {"wp:featuredmedia": [{"source_url": f"{base}/wp-content/uploads/cover.jpg"}]},
+        "content": {
+            "rendered": (
+                '<p><img class="x" src="/wp-content/uploads/a.jpg" '
+                'srcset="https://site.example.com/wp-content/uploads/a-300.jpg 300w, /wp-content/uploads/a.jpg 1024w">'
+                '<img src="https://cdn.example.net/wp-content/uploads/c.jpg?w=640&amp;ssl=1">'
+                '<img src="https://other.example.org/banner.png">'
+                '<img src="data:image/gif;base64,R0lGOD">'
+                f'<IMG SRC="{base}/wp-content/uploads/cover.jpg#x"></p>'
+            )
+        },
+    }
+    assert extract_media_urls(raw, base) == [
+        f"{base}/wp-content/uploads/cover.jpg",
+        f"{base}/wp-content/uploads/a.jpg",
+        f"{base}/wp-content/uploads/a-300.jpg",
+        "https://cdn.example.net/wp-content/uploads/c.jpg?w=640&ssl=1",
+    ]
+    assert extract_media_urls({"content": {"rendered": ""}}, base) == []
+    assert extract_media_urls(None, base) == []
+    return True
+
+
+def test_mirror_dedup_and_resume() -> bool:
+    """Одинаковое содержимое — один файл; второй прогон с записями wp_media не качает ничего; 404 — ошибка без исключения."""
+    FilesHandler.requested = []
+    server, base = _serve()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            urls = [f"{base}{p}" for p in FILES] + [f"{base}/wp-content/uploads/missing.jpg"]
+            with MediaMirror(Path(tmp), concurrency=3, max_retries=0) as mirror:
+                rows = mirror.mirror("s1", urls)
+                assert len(rows) == 3
+                assert mirror.stats["downloaded"] == 2 and mirror.stats["dedup_hits"] == 1, mirror.stats
+                assert mirror.stats["errors"] == 1
+                assert mirror.stats["bytes"] == 1500
+                by_url = {r.source_url: r for r in rows}
+                a, a_copy = by_url[urls[0]], by_url[urls[1]]
+                assert a.sha256 == hashlib.sha256(FILES["/wp-content/uploads/a.jpg"]).hexdigest()
+                assert a.local_path == a_copy.local_path == f"{a.sha256[:2]}/{a.sha256}.jpg"
+                assert (Path(tmp) / a.local_path).read_bytes() == FILES["/wp-content/uploads/a.jpg"]
+                assert not any((Path(tmp) / ".tmp").iterdir())
+
+            FilesHandler.requested = []
+            mirrored = {r.source_url: r.local_path for r in rows}
+            with MediaMirror(Path(tmp), concurrency=3, max_retries=0) as mirror:
+                assert mirror.mirror("s1", urls[:3], mirrored) == []
+                assert mirror.stats["skipped"] == 3
+            assert FilesHandler.requested == []
+
+            # Файл удалён с диска — запись в wp_media не мешает скачать заново.
+            (Path(tmp) / by_url[urls[2]].local_path).unlink()
+            with MediaMirror(Path(tmp), max_retries=0) as mirror:
+                assert len(mirror.mirror("s1", urls[:3], mirrored)) == 1
+                assert mirror.stats["downloaded"] == 1
+    finally:
+        server.shutdown()
+    return True
+
+
+def test_mirror_429_retry_after_reported_to_limiter() -> bool:
+    """429 + Retry-After: пауза по заголовку, лимитер сайта получает 429 и успешный повтор."""
+    FilesHandler.requested = []
+    server, base = _serve()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            limiter = AdaptiveRateLimiter(100.0)
+            with MediaMirror(Path(tmp), max_retries=1, limiter=limiter) as mirror:
+                t0 = time.monotonic()
+                rows = mirror.mirror("s1", [base + BUSY_PATH])
+                elapsed = time.monotonic() - t0
+            assert len(rows) == 1 and mirror.stats["errors"] == 0
+            assert elapsed >= 0.9, elapsed
+            assert FilesHandler.requested == [BUSY_PATH, BUSY_PATH]
+            stats = limiter.stats()
+            assert (stats["requests"], stats["errors"], stats["throttled"], stats["retry_after_pauses"]) == (2, 1, 1, 1)
+            assert stats["p95_latency_sec"] is not None
+    finally:
+        server.shutdown()
+    return True
+
+
+def test_sqlite_media_storage() -> bool:
+    """wp_media: upsert идемпотентен, get_mirrored_media отдаёт local_path только для запрошенных URL."""
+    from wp.mapper import MediaRow
+    from wp.storage import get_connection, get_mirrored_media, upsert_media, upsert_site
+
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    rows = [
+        MediaRow("s1", f"https://s1.example.com/wp-content/uploads/{i}.jpg", "ab" * 32, f"ab/{'ab' * 32}.jpg", 10, "image/jpeg")
+        for i in range(3)
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {"WP_STORAGE_BACKEND": "sqlite", "WP_STORAGE_PATH": str(Path(tmp) / "wp.db")}
+        with patch.dict(os.environ, env):
+            with get_connection() as conn:
+                upsert_site(conn, "s1", "https://s1.example.com", None)
+                upsert_media(conn, rows, now)
+                upsert_media(conn, rows[:1], now)
+            with get_connection() as conn:
+                count = conn.execute("SELECT COUNT(*) FROM wp_media").fetchone()[0]
+                found = get_mirrored_media(conn, "s1", [rows[0].source_url, "https://s1.example.com/none.jpg"])
+                other_site = get_mirrored_media(conn, "s2", [rows[0].source_url])
+    assert count == 3
+    assert found == {rows[0].source_url: rows[0].local_path}
+    assert other_site == {}
+    return True
+
+
+def run_all() -> bool:
+    cases = [
+        ("extract media urls", test_extract_media_urls),
+        ("mirror dedup and resume", test_mirror_dedup_and_resume),
+        ("mirror 429 Retry-After reported to limiter", test_mirror_429_retry_after_reported_to_limiter),
+        ("sqlite media storage", test_sqlite_media_storage),
+    ]
+    ok = 0
+    for name, fn in cases:
+        try:
+            if fn():
+                ok += 1
+                print(f"  OK {name}")
+            else:
+                print(f"  FAIL {name}")
+        except Exception as e:
+            print(f"  FAIL {name}: {e}")
+    return ok == len(cases)
+
+
+if __name__ == "__main__":
+    print("WP media mirror tests")
+    sys.exit(0 if run_all() else 1)
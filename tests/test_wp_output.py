@@ -8,6 +8,8 @@ Unit-тесты WP Output (Шаг 4): маппинг WP API -> модель -> J
 
 from __future__ import annotations
 
+import io
+import json
 import sys
 from datetime import datetime, timezone
 from pathlib import Path
@@ -17,6 +19,7 @@ sys.path.insert(0, str(PROJECT_ROOT))
 
 from wp.mapper import ContentRow, ContentTermRow, TermRow, post_to_content, content_embedded_terms
 from wp.output import (
+    NdjsonWriter,
     build_content_export_list,
     build_multisite_aggregated,
     build_multi_site_output,
@@ -232,6 +235,23 @@ def test_summary_no_credentials() -> bool:
     return True
 
 
+def test_ndjson_writer_lines_and_summary() -> bool:
+    """NdjsonWriter: одна строка JSON на документ, summary последней записью с record=summary и без content."""
+    stream = io.StringIO()
+    writer = NdjsonWriter(stream)
+    writer.write({"source": "wp", "wp_id": 1, "title": "Привет"})
+    summary = {"run_id": "r1", "site_id": "main", "status": "success", "run_at": "2026-01-01T00:00:00", "error_code": None, "posts_count": 1, "pages_count": 0, "terms_count": 0, "authors_count": 0}
+    writer.write_summary(build_single_site_output(summary, [{"source": "wp", "wp_id": 1}]))
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 2 and writer.records == 2
+    assert json.loads(lines[0])["title"] == "Привет"
+    last = json.loads(lines[1])
+    assert last["record"] == "summary"
+    assert last["run_id"] == "r1" and last["posts_count"] == 1
+    assert "content" not in last
+    return True
+
+
 def run_all() -> bool:
     cases = [
         ("content export full", test_content_export_full),
@@ -246,6 +266,7 @@ def run_all() -> bool:
         ("post_content only rendered", test_post_content_only_rendered),
         ("mapping from fixed API post with yoast", test_mapping_from_fixed_api_post_with_yoast),
         ("summary no credentials", test_summary_no_credentials),
+        ("ndjson writer lines and summary", test_ndjson_writer_lines_and_summary),
     ]
     ok = 0
     for name, fn in cases:
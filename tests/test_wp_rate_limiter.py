@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Тесты лимита запросов WP (wp.rate_limiter): рост темпа при здоровых ответах,
+снижение на 429/5xx, пауза Retry-After для всех потоков, фиксированный темп
+без adaptive, сохранение темпа между прогонами, связка с WPRestClient.
+
+Запуск из корня проекта:
+  python tests/test_wp_rate_limiter.py
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from wp.client import WPRestClient  # noqa: E402
+from wp.rate_limiter import EVAL_EVERY, RATE_INCREASE, AdaptiveRateLimiter, RateStateStore  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_rate_grows_on_healthy_responses() -> bool:
+    """Каждые EVAL_EVERY быстрых ответов без ошибок темп растёт на RATE_INCREASE, не выше max_rate."""
+    limiter = AdaptiveRateLimiter(2.0, adaptive=True, max_rate=3.0)
+    for _ in range(EVAL_EVERY):
+        limiter.on_success(0.1)
+    assert limiter.rate == 2.0 + RATE_INCREASE, limiter.rate
+    for _ in range(EVAL_EVERY * 5):
+        limiter.on_success(0.1)
+    assert limiter.rate == 3.0
+    assert limiter.stats()["rate_increases"] == 2
+    return True
+
+
+def test_slow_responses_do_not_raise_rate() -> bool:
+    """p95 латентности выше цели — темп не растёт."""
+    limiter = AdaptiveRateLimiter(2.0, adaptive=True, max_rate=10.0)
+    for _ in range(EVAL_EVERY * 3):
+        limiter.on_success(5.0)
+    assert limiter.rate == 2.0
+    assert limiter.stats()["p95_latency_sec"] == 5.0
+    return True
+
+
+def test_429_halves_rate_and_pauses_all_slots() -> bool:
+    """429 с Retry-After: темп вдвое ниже, ближайший слот любого потока — не раньше конца паузы."""
+    clock = FakeClock()
+    limiter = AdaptiveRateLimiter(4.0, adaptive=True, clock=clock)
+    assert limiter.reserve() == 0.0
+    limiter.on_error(429, retry_after=5.0)
+    assert limiter.rate == 2.0
+    assert limiter.reserve() == 5.0
+    assert limiter.reserve() == 5.0 + 0.5  # следующий слот — через 1/rate после паузы
+    limiter.on_error(503)
+    assert limiter.rate == 1.0
+    stats = limiter.stats()
+    assert (stats["errors"], stats["throttled"], stats["rate_decreases"], stats["retry_after_pauses"]) == (2, 1, 2, 1)
+    return True
+
+
+def test_fixed_rate_without_adaptive() -> bool:
+    """adaptive=False: темп не меняется, но Retry-After всё равно ставит общую паузу; счётчики ведутся."""
+    clock = FakeClock()
+    limiter = AdaptiveRateLimiter(4.0, clock=clock)
+    for _ in range(EVAL_EVERY * 2):
+        limiter.on_success(0.1)
+    limiter.on_error(503)
+    assert limiter.rate == 4.0
+    assert limiter.reserve() == 0.0
+    assert limiter.reserve() == 0.25
+    limiter.on_error(429, retry_after=5.0)
+    assert limiter.rate == 4.0
+    assert limiter.reserve() == 5.0
+    assert limiter.reserve() == 5.25
+    stats = limiter.stats()
+    assert (stats["throttled"], stats["retry_after_pauses"], stats["rate_decreases"]) == (1, 1, 0)
+    return True
+
+
+def test_rate_state_roundtrip() -> bool:
+    """Темп сайта сохраняется в JSON и читается следующим прогоном; битый файл — пустое состояние."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "state" / "wp_rate_state.json"
+        store = RateStateStore(path)
+        assert store.get("main") is None
+        store.set("main", 6.5)
+        assert RateStateStore(path).get("main") == 6.5
+        assert json.loads(path.read_text(encoding="utf-8"))["sites"]["main"]["rate_per_sec"] == 6.5
+        path.write_text("{not json", encoding="utf-8")
+        assert RateStateStore(path).get("main") is None
+    return True
+
+
+def test_client_uses_limiter() -> bool:
+    """WPRestClient берёт паузу между запросами из переданного лимитера."""
+    limiter = AdaptiveRateLimiter(5.0, adaptive=True)
+    client = WPRestClient(base_url="https://example.com", user="u", app_password="p", limiter=limiter)
+    assert client.limiter is limiter
+    assert abs(client._min_delay - 0.2) < 1e-9
+    limiter.on_error(429)
+    assert abs(client._min_delay - 0.4) < 1e-9
+    client.close()
+    return True
+
+
+def run_all() -> bool:
+    cases = [
+        ("rate grows on healthy responses", test_rate_grows_on_healthy_responses),
+        ("slow responses do not raise rate", test_slow_responses_do_not_raise_rate),
+        ("429 halves rate and pauses all slots", test_429_halves_rate_and_pauses_all_slots),
+        ("fixed rate without adaptive", test_fixed_rate_without_adaptive),
+        ("rate state roundtrip", test_rate_state_roundtrip),
+        ("client uses limiter", test_client_uses_limiter),
+    ]
+    ok = 0
+    for name, fn in cases:
+        try:
+            if fn():
+                ok += 1
+                print(f"  OK {name}")
+            else:
+                print(f"  FAIL {name}")
+        except Exception as e:
+            print(f"  FAIL {name}: {e}")
+    return ok == len(cases)
+
+
+if __name__ == "__main__":
+    print("WP rate limiter tests")
+    sys.exit(0 if run_all() else 1)
@@ -14,6 +14,7 @@ Unit и интеграционные тесты WP Storage (Шаг 5): upsert, i
 from __future__ import annotations
 
 import argparse
+import json
 import os
 import sys
 import uuid
@@ -282,6 +283,223 @@ def test_integration_two_syncs_same_counts() -> bool:
     return True
 
 
+class _FakePgCursor:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _FakePgConn:
+    """Postgres-соединение без сервера: upsert_* до execute_values доходят только через cursor()."""
+
+    def cursor(self):
+        return _FakePgCursor()
+
+
+def test_pg_upsert_batched_execute_values() -> bool:
+    """Postgres: один execute_values на таблицу, page_size из WP_STORAGE_BATCH_SIZE, дубли ключа схлопнуты."""
+    if not _storage_available:
+        print("  SKIP (wp.storage import failed)")
+        return True
+    try:
+        import psycopg2.extras  # noqa: F401
+    except ImportError:
+        print("  SKIP (psycopg2 not installed)")
+        return True
+    from unittest.mock import patch
+
+    now = datetime.now(timezone.utc)
+    rows = [
+        ContentRow(TEST_SITE_ID, "post", i, "T", f"s{i}", None, None, "publish", None, None, None, None, None, None, None)
+        for i in (1, 2, 3, 2)
+    ]
+    calls = []
+
+    def fake_execute_values(cur, sql, values, page_size, fetch=False):
+        calls.append((sql, list(values), page_size, fetch))
+        return [(True,), (False,)]  # RETURNING: 1 вставлена, 1 обновлена, третья не прошла WHERE
+
+    with patch.dict(os.environ, {"WP_STORAGE_BATCH_SIZE": "2"}), patch(
+        "psycopg2.extras.execute_values", side_effect=fake_execute_values
+    ):
+        counts = upsert_content(_FakePgConn(), rows, now)
+    assert len(calls) == 1, calls
+    sql, values, page_size, fetch = calls[0]
+    assert page_size == 2 and fetch
+    assert "VALUES %s" in sql and "ON CONFLICT (site_id, content_type, wp_id) DO UPDATE SET" in sql
+    assert "wp_content.content_hash IS DISTINCT FROM EXCLUDED.content_hash" in sql
+    assert "RETURNING (xmax = 0)" in sql
+    assert sorted(v[2] for v in values) == [1, 2, 3]
+    assert counts == {"inserted": 1, "updated": 1, "unchanged": 1}
+    return True
+
+
+def test_sqlite_batched_upsert_idempotent() -> bool:
+    """SQLite: executemany пачками (batch 500) — 1200 авторов записаны, повторный upsert без дублей."""
+    if not _storage_available:
+        print("  SKIP (wp.storage import failed)")
+        return True
+    import tempfile
+    from unittest.mock import patch
+
+    from wp import storage_sqlite
+
+    now = datetime.now(timezone.utc)
+    rows = [AuthorRow(TEST_SITE_ID, i, f"u{i}", f"User {i}", f"u{i}", None) for i in range(1, 1201)]
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {"WP_STORAGE_PATH": str(Path(tmp) / "wp.db"), "WP_STORAGE_BATCH_SIZE": "500"}
+        with patch.dict(os.environ, env):
+            with storage_sqlite.get_connection() as conn:
+                storage_sqlite.upsert_site(conn, TEST_SITE_ID, "https://test.example.com", None)
+                storage_sqlite.upsert_authors(conn, rows, now)
+                storage_sqlite.upsert_authors(conn, rows, now)
+                assert _count(conn, "wp_authors", "site_id = %s", (TEST_SITE_ID,)) == 1200
+    return True
+
+
+def test_sqlite_upsert_content_skips_unchanged() -> bool:
+    """SQLite: тот же content_hash — строка не переписывается; counts inserted/updated/unchanged."""
+    if not _storage_available:
+        print("  SKIP (wp.storage import failed)")
+        return True
+    import tempfile
+    from unittest.mock import patch
+
+    from wp import storage_sqlite
+    from wp.mapper import post_to_content
+
+    def post(wp_id: int, title: str) -> "ContentRow":
+        return post_to_content(TEST_SITE_ID, {"id": wp_id, "slug": f"p{wp_id}", "title": {"rendered": title}})
+
+    first = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    later = datetime(2026, 1, 2, tzinfo=timezone.utc)
+    with tempfile.TemporaryDirectory() as tmp:
+        with patch.dict(os.environ, {"WP_STORAGE_PATH": str(Path(tmp) / "wp.db")}):
+            with storage_sqlite.get_connection() as conn:
+                storage_sqlite.upsert_site(conn, TEST_SITE_ID, "https://test.example.com", None)
+                c1 = storage_sqlite.upsert_content(conn, [post(1, "A"), post(2, "B")], first)
+                c2 = storage_sqlite.upsert_content(conn, [post(1, "A"), post(2, "B")], later)
+                synced_1 = _fetch_one(conn, "SELECT synced_at FROM wp_content WHERE wp_id = 1")
+                c3 = storage_sqlite.upsert_content(conn, [post(1, "A2"), post(2, "B"), post(3, "C")], later)
+                title_1 = _fetch_one(conn, "SELECT title FROM wp_content WHERE wp_id = 1")
+    assert c1 == {"inserted": 2, "updated": 0, "unchanged": 0}, c1
+    assert c2 == {"inserted": 0, "updated": 0, "unchanged": 2}, c2
+    assert synced_1 == first.isoformat()  # неизменённая строка не переписана
+    assert c3 == {"inserted": 1, "updated": 1, "unchanged": 1}, c3
+    assert title_1 == "A2"
+    return True
+
+
+def test_sqlite_upsert_content_reads_only_batch_keys() -> bool:
+    """SQLite: отпечатки читаются по ключам пачки (IN чанками), а не всем сайтом; page того же wp_id — другой ключ."""
+    if not _storage_available:
+        print("  SKIP (wp.storage import failed)")
+        return True
+    import tempfile
+    from unittest.mock import patch
+
+    from wp import storage_sqlite
+    from wp.mapper import post_to_content
+
+    def post(wp_id: int) -> "ContentRow":
+        return post_to_content(TEST_SITE_ID, {"id": wp_id, "slug": f"p{wp_id}", "title": {"rendered": f"P{wp_id}"}})
+
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    selects = []
+    with tempfile.TemporaryDirectory() as tmp:
+        with patch.dict(os.environ, {"WP_STORAGE_PATH": str(Path(tmp) / "wp.db")}):
+            with storage_sqlite.get_connection() as conn:
+                storage_sqlite.upsert_site(conn, TEST_SITE_ID, "https://test.example.com", None)
+                storage_sqlite.upsert_content(conn, [post(i) for i in range(1, 1201)], now)
+                page = ContentRow(TEST_SITE_ID, "page", 5, "Pg", "pg", None, None, "publish", None, None, None,
+                                  None, None, None, None, content_hash="x" * 64)
+                conn.set_trace_callback(lambda sql: selects.append(sql) if sql.startswith("SELECT") else None)
+                counts = storage_sqlite.upsert_content(conn, [post(i) for i in range(1001, 1701)] + [page], now)
+                conn.set_trace_callback(None)
+                total = _fetch_one(conn, "SELECT COUNT(*) FROM wp_content")
+    assert counts == {"inserted": 501, "updated": 0, "unchanged": 200}, counts
+    assert total == 1701
+    assert len(selects) == 2 and all("wp_id IN (" in sql for sql in selects), selects  # 700 id -> 500 + 200
+    return True
+
+
+def test_sqlite_raw_json_policies() -> bool:
+    """SQLite: slim отбрасывает _links/_embedded/yoast_head, compressed пишет raw_json_z и raw_json = NULL."""
+    if not _storage_available:
+        print("  SKIP (wp.storage import failed)")
+        return True
+    import tempfile
+    from unittest.mock import patch
+
+    from wp import storage_sqlite
+    from wp.mapper import post_to_content
+    from wp.raw_payload import load_raw_payload
+
+    raw = {
+        "id": 1,
+        "slug": "p1",
+        "title": {"rendered": "A"},
+        "yoast_head": "<meta name='x'>" * 50,
+        "yoast_head_json": {"title": "SEO A"},
+        "_links": {"self": [{"href": "https://test.example.com/wp-json/wp/v2/posts/1"}]},
+        "_embedded": {"author": [{"id": 1, "name": "Admin"}]},
+    }
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    with tempfile.TemporaryDirectory() as tmp:
+        with patch.dict(os.environ, {"WP_STORAGE_PATH": str(Path(tmp) / "wp.db")}):
+            with storage_sqlite.get_connection() as conn:
+                storage_sqlite.upsert_site(conn, TEST_SITE_ID, "https://test.example.com", None)
+                storage_sqlite.upsert_content(conn, [post_to_content(TEST_SITE_ID, raw)], now, "slim")
+                slim_json, slim_z = conn.execute(
+                    "SELECT raw_json, raw_json_z FROM wp_content WHERE wp_id = 1"
+                ).fetchone()
+                storage_sqlite.upsert_content(conn, [post_to_content(TEST_SITE_ID, raw)], now, "compressed")
+                comp_json, comp_z, seo_title = conn.execute(
+                    "SELECT raw_json, raw_json_z, seo_title FROM wp_content WHERE wp_id = 1"
+                ).fetchone()
+    slim = json.loads(slim_json)
+    assert slim_z is None
+    assert "_links" not in slim and "_embedded" not in slim and "yoast_head" not in slim, slim
+    assert slim["yoast_head_json"] == {"title": "SEO A"}
+    assert comp_json is None and comp_z is not None
+    assert load_raw_payload(comp_json, comp_z) == raw  # сжат полный ответ
+    assert seo_title == "SEO A"  # горячие колонки заполняются при любой политике
+    return True
+
+
+def test_sqlite_policy_switch_rewrites_unchanged_row() -> bool:
+    """SQLite: объект в WP не менялся, политика full -> compressed — строка переписана один раз, дальше unchanged."""
+    if not _storage_available:
+        print("  SKIP (wp.storage import failed)")
+        return True
+    import tempfile
+    from unittest.mock import patch
+
+    from wp import storage_sqlite
+    from wp.mapper import post_to_content
+    from wp.raw_payload import load_raw_payload
+
+    raw = {"id": 1, "slug": "p1", "title": {"rendered": "A"}, "_links": {"self": []}}
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    with tempfile.TemporaryDirectory() as tmp:
+        with patch.dict(os.environ, {"WP_STORAGE_PATH": str(Path(tmp) / "wp.db")}):
+            with storage_sqlite.get_connection() as conn:
+                storage_sqlite.upsert_site(conn, TEST_SITE_ID, "https://test.example.com", None)
+                c_full = storage_sqlite.upsert_content(conn, [post_to_content(TEST_SITE_ID, raw)], now, "full")
+                c_full2 = storage_sqlite.upsert_content(conn, [post_to_content(TEST_SITE_ID, raw)], now, "full")
+                c_comp = storage_sqlite.upsert_content(conn, [post_to_content(TEST_SITE_ID, raw)], now, "compressed")
+                c_comp2 = storage_sqlite.upsert_content(conn, [post_to_content(TEST_SITE_ID, raw)], now, "compressed")
+                raw_json, raw_json_z = conn.execute("SELECT raw_json, raw_json_z FROM wp_content WHERE wp_id = 1").fetchone()
+    assert c_full == {"inserted": 1, "updated": 0, "unchanged": 0}, c_full
+    assert c_full2 == {"inserted": 0, "updated": 0, "unchanged": 1}, c_full2
+    assert c_comp == {"inserted": 0, "updated": 1, "unchanged": 0}, c_comp
+    assert c_comp2 == {"inserted": 0, "updated": 0, "unchanged": 1}, c_comp2
+    assert raw_json is None and load_raw_payload(raw_json, raw_json_z) == raw
+    return True
+
+
 def run_all(integration: bool = False) -> bool:
     cases = [
         ("upsert_site idempotent", test_upsert_site_idempotent),
@@ -291,6 +509,12 @@ def run_all(integration: bool = False) -> bool:
         ("upsert_content_terms idempotent", test_upsert_content_terms_idempotent),
         ("update_sync_run rowcount 0 when no row", test_update_sync_run_returns_zero_when_no_row),
         ("insert_sync_run then update", test_insert_sync_run_then_update),
+        ("postgres upsert batched via execute_values", test_pg_upsert_batched_execute_values),
+        ("sqlite batched upsert idempotent", test_sqlite_batched_upsert_idempotent),
+        ("sqlite upsert_content skips unchanged", test_sqlite_upsert_content_skips_unchanged),
+        ("sqlite upsert_content reads only batch keys", test_sqlite_upsert_content_reads_only_batch_keys),
+        ("sqlite raw_json policies", test_sqlite_raw_json_policies),
+        ("sqlite policy switch rewrites unchanged row", test_sqlite_policy_switch_rewrites_unchanged_row),
     ]
     if integration:
         cases.append(("integration two syncs same counts", test_integration_two_syncs_same_counts))
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Тесты планировщика multi-site sync: лимит одновременных сайтов, лимит req/s сайта из YAML,
+порядок результатов, коды выхода и тайминги в сводке.
+
+Запуск из корня проекта:
+  python tests/test_wp_sync_scheduler.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import wp_sync_skill  # noqa: E402
+from exit_codes import EXIT_FAILURE, EXIT_PARTIAL, EXIT_SUCCESS  # noqa: E402
+from wp.config import load_config  # noqa: E402
+
+CONFIG = """\
+max_concurrent_sites: 2
+requests_per_second: 3
+sites:
+  - site_id: s1
+    base_url: https://one.example
+  - site_id: s2
+    base_url: https://two.example
+    requests_per_second: 1.5
+  - site_id: s3
+    base_url: https://three.example
+"""
+
+ENV = {
+    "WP_SITE_S1_USER": "u", "WP_SITE_S1_APP_PASSWORD": "p",
+    "WP_SITE_S2_USER": "u", "WP_SITE_S2_APP_PASSWORD": "p",
+    "WP_SITE_S3_USER": "u", "WP_SITE_S3_APP_PASSWORD": "p",
+}
+
+
+def _write_config(tmp: str) -> Path:
+    path = Path(tmp) / "wp-sites.yml"
+    path.write_text(CONFIG, encoding="utf-8")
+    return path
+
+
+def _site_data(site_id: str, run_id: str, status: str = "success") -> dict:
+    return {
+        "summary": {
+            "run_id": run_id,
+            "site_id": site_id,
+            "run_at": "",
+            "status": status,
+            "error_code": None if status == "success" else "WP_AUTH_ERROR",
+            "partial_failure": False,
+            "posts_count": 1,
+            "pages_count": 0,
+            "terms_count": 0,
+            "authors_count": 0,
+            "duration_sec": 0.2,
+            "wait_sec": 0.1,
+        },
+        "content": [],
+    }
+
+
+def _run_sync_raw(config_path: Path, fake, output_format: str = "json") -> tuple[int, list, str]:
+    args = argparse.Namespace(config=str(config_path), site=None, output_format=output_format)
+    out = io.StringIO()
+    with patch.dict(os.environ, ENV), patch.object(wp_sync_skill, "run_sync_site", fake), \
+            contextlib.redirect_stdout(out):
+        exit_code, summaries = wp_sync_skill.run_sync(args, "r1")
+    return exit_code, summaries, out.getvalue()
+
+
+def _run_sync(config_path: Path, fake) -> tuple[int, list, dict]:
+    exit_code, summaries, stdout = _run_sync_raw(config_path, fake)
+    return exit_code, summaries, json.loads(stdout)
+
+
+def test_config_concurrency_and_site_rps() -> bool:
+    """max_concurrent_sites и requests_per_second сайта читаются из YAML; без ключа — сайты по очереди."""
+    with tempfile.TemporaryDirectory() as tmp, patch.dict(os.environ, ENV):
+        cfg = load_config(config_path=_write_config(tmp), project_root=Path(tmp))
+        path = Path(tmp) / "default.yml"
+        path.write_text(CONFIG.replace("max_concurrent_sites: 2\n", ""), encoding="utf-8")
+        default_cfg = load_config(config_path=path, project_root=Path(tmp))
+    assert cfg.max_concurrent_sites == 2
+    assert default_cfg.max_concurrent_sites == 1
+    assert [s.requests_per_second for s in cfg.sites] == [None, 1.5, None]
+    return True
+
+
+def test_sites_run_concurrently_under_cap() -> bool:
+    """Сайты идут параллельно, но не больше max_concurrent_sites; порядок — как в конфиге."""
+    lock = threading.Lock()
+    active = [0]
+    peak = [0]
+    rps_by_site = {}
+
+    def fake(**kw):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            rps_by_site[kw["site_id"]] = kw["requests_per_second"]
+        time.sleep(0.3 if kw["site_id"] == "s1" else 0.1)
+        with lock:
+            active[0] -= 1
+        return _site_data(kw["site_id"], kw["run_id"])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.monotonic()
+        exit_code, summaries, out = _run_sync(_write_config(tmp), fake)
+        elapsed = time.monotonic() - t0
+    assert exit_code == EXIT_SUCCESS
+    assert peak[0] == 2, peak[0]
+    assert elapsed < 0.5, elapsed  # последовательно было бы >= 0.5 сек
+    assert [d["summary"]["site_id"] for d in summaries] == ["s1", "s2", "s3"]
+    assert rps_by_site == {"s1": 3.0, "s2": 1.5, "s3": 3.0}
+    assert [s["site_id"] for s in out["sites"]] == ["s1", "s2", "s3"]
+    timing = out["timing"]
+    assert timing["max_concurrent_sites"] == 2
+    assert timing["wall_sec"] is not None
+    assert timing["sites_duration_sec"] == 0.6
+    assert timing["sites_wait_sec"] == 0.3
+    assert all(s["queued_sec"] is not None for s in out["sites"])
+    return True
+
+
+def test_exception_with_successful_sites_is_partial() -> bool:
+    """Исключение на одном сайте при успешных остальных -> exit 2, независимо от порядка завершения."""
+    def fake(**kw):
+        if kw["site_id"] == "s1":
+            time.sleep(0.1)
+            raise RuntimeError("boom")
+        return _site_data(kw["site_id"], kw["run_id"])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        exit_code, summaries, out = _run_sync(_write_config(tmp), fake)
+    assert exit_code == EXIT_PARTIAL
+    failed = summaries[0]["summary"]
+    assert failed["status"] == "failed" and failed["error_code"] == "SYNC_ERROR"
+    assert failed["duration_sec"] is not None
+    assert out["status"] == "partial"
+    return True
+
+
+def test_all_failed_exit_1() -> bool:
+    """Все сайты failed -> exit 1."""
+    def fake(**kw):
+        return _site_data(kw["site_id"], kw["run_id"], status="failed")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        exit_code, _, out = _run_sync(_write_config(tmp), fake)
+    assert exit_code == EXIT_FAILURE
+    assert out["totals"]["failed"] == 3
+    return True
+
+
+def test_ndjson_output_streams_content_then_summary() -> bool:
+    """--output-format ndjson: контент всех сайтов построчно, последней строкой summary без content."""
+    def fake(**kw):
+        for wp_id in (1, 2):
+            kw["emit_content"]({"site_id": kw["site_id"], "wp_id": wp_id})
+        return _site_data(kw["site_id"], kw["run_id"])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        exit_code, _, stdout = _run_sync_raw(_write_config(tmp), fake, output_format="ndjson")
+    assert exit_code == EXIT_SUCCESS
+    lines = [json.loads(line) for line in stdout.splitlines()]
+    assert len(lines) == 7
+    content, summary = lines[:-1], lines[-1]
+    assert sorted((d["site_id"], d["wp_id"]) for d in content) == [(s, i) for s in ("s1", "s2", "s3") for i in (1, 2)]
+    assert summary["record"] == "summary"
+    assert summary["status"] == "success"
+    assert [s["site_id"] for s in summary["sites"]] == ["s1", "s2", "s3"]
+    assert all("content" not in s for s in summary["sites"])
+    return True
+
+
+def run_all() -> bool:
+    cases = [
+        ("config: max_concurrent_sites + site rps", test_config_concurrency_and_site_rps),
+        ("sites run concurrently under cap", test_sites_run_concurrently_under_cap),
+        ("exception + success -> partial", test_exception_with_successful_sites_is_partial),
+        ("all failed -> exit 1", test_all_failed_exit_1),
+        ("ndjson: content lines, summary last", test_ndjson_output_streams_content_then_summary),
+    ]
+    ok = 0
+    for name, fn in cases:
+        try:
+            if fn():
+                ok += 1
+                print(f"  OK {name}")
+            else:
+                print(f"  FAIL {name}")
+        except Exception as e:
+            print(f"  FAIL {name}: {e}")
+    return ok == len(cases)
+
+
+if __name__ == "__main__":
+    print("WP sync scheduler tests")
+    sys.exit(0 if run_all() else 1)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Тесты потокового sync сайта: страницы API пишутся в БД пачками по WP_STORAGE_BATCH_SIZE,
+экспорт собирается без raw_json, сбой посередине оставляет уже записанные пачки.
+
+Запуск из корня проекта:
+  python tests/test_wp_sync_stream.py
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import wp.storage as storage  # noqa: E402
+import wp_sync_skill  # noqa: E402
+from errors import WP_NETWORK_ERROR  # noqa: E402
+from wp.client import WPClientError  # noqa: E402
+
+SITE_ID = "stream"
+PER_PAGE = 3
+
+
+def _post(wp_id: int) -> dict:
+    return {"id": wp_id, "slug": f"p{wp_id}", "title": {"rendered": f"P{wp_id}"}, "modified_gmt": "2026-03-01T00:00:00"}
+
+
+class FakeWP:
+    """Сайт WP в памяти: /posts по PER_PAGE на страницу; fail_page — 500 на этой странице."""
+
+    def __init__(self, posts, fail_page=None):
+        self.posts = posts
+        self.fail_page = fail_page
+        self.wait_sec = 0.0
+
+    def __call__(self, **kwargs):
+        return self
+
+    def get_with_headers(self, path, params=None, run_id=None):
+        if path != "/posts":
+            return [], {"X-WP-TotalPages": "1"}
+        page = params["page"]
+        if page == self.fail_page:
+            raise WPClientError("WP API server error: 500", WP_NETWORK_ERROR, status_code=500)
+        total_pages = -(-len(self.posts) // PER_PAGE)
+        chunk = self.posts[(page - 1) * PER_PAGE: page * PER_PAGE]
+        return chunk, {"X-WP-TotalPages": str(total_pages), "X-WP-Total": str(len(self.posts))}
+
+    def close(self):
+        pass
+
+
+def _sync(fake: FakeWP, db_path: Path, batch_size: int, emit_content=None) -> tuple[dict, list]:
+    batches = []
+    original = wp_sync_skill.upsert_content
+
+    def recording_upsert(conn, rows, synced_at, *args):
+        batches.append(len(rows))
+        return original(conn, rows, synced_at, *args)
+
+    env = {"WP_STORAGE_BACKEND": "sqlite", "WP_STORAGE_PATH": str(db_path), "WP_STORAGE_BATCH_SIZE": str(batch_size)}
+    with patch.dict(os.environ, env), patch.object(wp_sync_skill, "WPRestClient", fake), \
+            patch.object(wp_sync_skill, "upsert_content", recording_upsert):
+        storage._backend = None
+        try:
+            data = wp_sync_skill.run_sync_site(
+                site_id=SITE_ID,
+                base_url="https://stream.example",
+                name=None,
+                user="u",
+                app_password="p",
+                run_id="r1",
+                per_page=PER_PAGE,
+                timeout_sec=5,
+                retries=0,
+                requests_per_second=1000.0,
+                page_concurrency=2,
+                emit_content=emit_content,
+            )
+        finally:
+            storage._backend = None
+    return data, batches
+
+
+def _db_count(db_path: Path) -> int:
+    conn = sqlite3.connect(str(db_path))
+    try:
+        return conn.execute("SELECT COUNT(*) FROM wp_content WHERE site_id = ?", (SITE_ID,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_posts_written_in_bounded_batches() -> bool:
+    """10 постов, пачка 4: страницы по 3 копятся до пачки — запись 6+4; экспорт полный и без raw_json."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "wp.db"
+        data, batches = _sync(FakeWP([_post(i) for i in range(1, 11)]), db_path, batch_size=4)
+        assert data["summary"]["status"] == "success"
+        assert data["summary"]["posts_count"] == 10
+        assert batches == [6, 4], batches
+        assert [c["wp_id"] for c in data["content"]] == list(range(1, 11))
+        assert all("raw_json" not in c for c in data["content"])
+        assert _db_count(db_path) == 10
+    return True
+
+
+def test_failure_mid_stream_keeps_written_batches() -> bool:
+    """500 на 3-й странице: первые пачки уже в БД, статус partial, в stdout контента нет."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "wp.db"
+        data, _ = _sync(FakeWP([_post(i) for i in range(1, 13)], fail_page=3), db_path, batch_size=3)
+        assert data["summary"]["status"] == "partial"
+        assert data["summary"]["partial_failure"] is True
+        assert data["summary"]["error_code"] == WP_NETWORK_ERROR
+        assert data["content"] == []
+        assert _db_count(db_path) == data["summary"]["posts_count"] >= 3
+    return True
+
+
+def test_emit_content_streams_per_batch() -> bool:
+    """emit_content: документы уходят потребителю после записи каждой пачки, content в результате пуст."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "wp.db"
+        emitted = []
+
+        def emit(doc):
+            emitted.append((doc["wp_id"], _db_count(db_path)))
+
+        data, batches = _sync(FakeWP([_post(i) for i in range(1, 11)]), db_path, batch_size=4, emit_content=emit)
+        assert data["summary"]["posts_count"] == 10
+        assert data["content"] == []
+        assert [wp_id for wp_id, _ in emitted] == list(range(1, 11))
+        # Документ отдан, когда его пачка уже в БД: первые 6 — после пачки 6, остальные — после 10.
+        assert [n for _, n in emitted] == [6] * 6 + [10] * 4, emitted
+    return True
+
+
+def run_all() -> bool:
+    cases = [
+        ("posts written in bounded batches", test_posts_written_in_bounded_batches),
+        ("failure mid-stream keeps written batches", test_failure_mid_stream_keeps_written_batches),
+        ("emit_content streams per batch", test_emit_content_streams_per_batch),
+    ]
+    ok = 0
+    for name, fn in cases:
+        try:
+            if fn():
+                ok += 1
+                print(f"  OK {name}")
+            else:
+                print(f"  FAIL {name}")
+        except Exception as e:
+            print(f"  FAIL {name}: {e}")
+    return ok == len(cases)
+
+
+if __name__ == "__main__":
+    print("WP streaming sync tests")
+    sys.exit(0 if run_all() else 1)
@@ -1,24 +1,36 @@
 """HTTP-клиент для WordPress REST API: Basic Auth, timeout, retries, rate limit.
 
 Этап 2: production-ready с предсказуемым retry/rate-limit и наблюдаемостью.
+Соединения переиспользуются (keep-alive) через пул `requests.Session`.
+С `cache` (wp.http_cache) GET идут условными запросами: 304 отдаётся из кэша.
 """
 
 from __future__ import annotations
 
 import logging
+import threading
 import time
 from typing import Any, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 
 from errors import WP_AUTH_ERROR, WP_DATA_FORMAT_ERROR, WP_NETWORK_ERROR, WP_RATE_LIMIT
 
+from .http_cache import CacheEntry, HTTPResponseCache
+from .rate_limiter import AdaptiveRateLimiter
+
 logger = logging.getLogger("wp.client")
 
 # Минимальная пауза между запросами (сек) для соблюдения 3 req/s
 MIN_DELAY_BETWEEN_REQUESTS = 1.0 / 3.0
 
+# Размер пула keep-alive соединений к одному хосту.
+DEFAULT_POOL_MAXSIZE = 10
+
+DEFAULT_HEADERS = {"Accept": "application/json", "Content-Type": "application/json"}
+
 
 def _backoff_delay(attempt: int, retry_after_header: Optional[int] = None) -> float:
     """Задержка перед повтором: Retry-After (cap 60) или exponential backoff 2^(attempt+1) сек, cap 60."""
@@ -40,6 +52,27 @@ def _should_retry(status_code: Optional[int], error: Optional[Exception]) -> boo
     return False
 
 
+def _retry_delay(
+    limiter: Optional[AdaptiveRateLimiter],
+    status_code: Optional[int],
+    headers: Any,
+    attempt: int,
+) -> float:
+    """Повторяемый сбой (429, 5xx; None — timeout/сеть): сообщить лимитеру и вернуть паузу перед повтором.
+
+    Retry-After (целые секунды) учитывается только у 429: и в паузе, и в лимитере сайта.
+    """
+    retry_after: Optional[int] = None
+    if status_code == 429 and headers is not None and "Retry-After" in headers:
+        try:
+            retry_after = int(headers["Retry-After"])
+        except (ValueError, TypeError):
+            pass
+    if limiter is not None:
+        limiter.on_error(status_code, retry_after)
+    return _backoff_delay(attempt, retry_after)
+
+
 class WPClientError(Exception):
     """Ошибка запроса к WP API с привязкой к error_code для логов."""
 
@@ -50,7 +83,15 @@ class WPClientError(Exception):
 
 
 class WPRestClient:
-    """Клиент к WordPress REST API: Basic Auth, до 3 req/s, timeout 30 сек, retry с backoff."""
+    """Клиент к WordPress REST API: Basic Auth, до 3 req/s, timeout 30 сек, retry с backoff.
+
+    Запросы идут через один `requests.Session`: TCP/TLS-соединение с сайтом
+    переиспользуется между страницами (keep-alive), пул — до `pool_maxsize` соединений.
+
+    Args:
+        cache: Дисковый кэш ответов; GET отправляются с If-None-Match / If-Modified-Since.
+        limiter: Лимит запросов сайта (wp.rate_limiter); по умолчанию — фиксированный requests_per_second.
+    """
 
     def __init__(
         self,
@@ -61,21 +102,234 @@ class WPRestClient:
         max_retries: int = 3,
         requests_per_second: float = 3.0,
         site_id: Optional[str] = None,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+        cache: Optional[HTTPResponseCache] = None,
+        limiter: Optional[AdaptiveRateLimiter] = None,
     ):
         self.base_url = base_url.rstrip("/")
         self.auth = HTTPBasicAuth(user, app_password)
         self.timeout_sec = timeout_sec
         self.max_retries = max_retries
         self.site_id = site_id or ""
-        self._min_delay = 1.0 / max(requests_per_second, 0.1)
-        self._last_request_time: float = 0.0
+        # Без явного лимитера — фиксированный темп requests_per_second (слоты равномерно).
+        self.limiter = limiter or AdaptiveRateLimiter(requests_per_second)
+        # Суммарное ожидание (rate limit + паузы retry), сек — для сводки прогона.
+        self.wait_sec: float = 0.0
+        self._wait_lock = threading.Lock()
+        # Условные GET через HTTP-кэш: hit — 304 из кэша, miss — полный ответ.
+        self.cache = cache
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_maxsize))
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        # Страницы запрашиваются из нескольких потоков (wp.fetcher): слоты лимита выдаются под lock.
+        self._rate_lock = threading.Lock()
+
+    def _url(self, path: str) -> str:
+        return f"{self.base_url}/wp-json/wp/v2{path}"
+
+    @property
+    def _min_delay(self) -> float:
+        """Текущая пауза между запросами, сек (1 / темп лимитера)."""
+        return self.limiter.min_delay
+
+    def _rate_limit_delay(self) -> float:
+        """Сколько ждать до следующего запроса; момент запроса резервируется сразу."""
+        return self.limiter.reserve()
+
+    def _note_cache(self, hit: bool) -> None:
+        with self._wait_lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    def _cache_entry(self, path: str, params: Optional[dict]) -> Optional[CacheEntry]:
+        """Запись кэша для GET (валидаторы для условного запроса); None — кэша нет или промах."""
+        if self.cache is None:
+            return None
+        return self.cache.get(self._url(path), params)
+
+    def _cached_result(
+        self,
+        path: str,
+        params: Optional[dict],
+        entry: Optional[CacheEntry],
+        data: Any,
+        status_code: int,
+        headers: Any,
+    ) -> tuple[Any, dict]:
+        """Итог GET: на 304 — тело и заголовки из entry, иначе ответ сохраняется в кэш."""
+        if self.cache is None:
+            return data, dict(headers)
+        url = self._url(path)
+        if status_code == 304:
+            if entry is None:
+                raise WPClientError("WP API 304 without cached response", WP_DATA_FORMAT_ERROR, status_code=304)
+            self.cache.touch(url, params)
+            self._note_cache(hit=True)
+            return entry.data, dict(entry.headers)
+        self._note_cache(hit=False)
+        self.cache.put(url, params, data, headers)
+        return data, dict(headers)
+
+    def _note_wait(self, seconds: float) -> None:
+        if seconds > 0:
+            with self._wait_lock:
+                self.wait_sec += seconds
+
+    def _check_status(
+        self,
+        method: str,
+        path: str,
+        status_code: int,
+        headers: Any,
+        attempt: int,
+        run_id: Optional[str],
+    ) -> Optional[float]:
+        """Разобрать статус ответа: None — успех, число — повторить через столько секунд.
+
+        Raises:
+            WPClientError: 401/403 и прочие 4xx сразу; 429 и 5xx — когда попытки кончились.
+        """
+        if status_code in (401, 403):
+            logger.warning(
+                "WP API auth failed: %s %s status=%s",
+                method,
+                path,
+                status_code,
+                extra={"site_id": self.site_id, "run_id": run_id, "error_code": WP_AUTH_ERROR},
+            )
+            raise WPClientError(
+                f"WP API auth failed: {status_code}",
+                WP_AUTH_ERROR,
+                status_code=status_code,
+            )
+        if 400 <= status_code < 500 and status_code != 429:
+            raise WPClientError(
+                f"WP API client error: {status_code}",
+                WP_NETWORK_ERROR,
+                status_code=status_code,
+            )
+        if status_code == 429:
+            delay = _retry_delay(self.limiter, 429, headers, attempt)
+            logger.warning(
+                "WP API rate limit (429), retry after %.1fs (attempt %s)",
+                delay,
+                attempt + 1,
+                extra={"site_id": self.site_id, "run_id": run_id, "error_code": WP_RATE_LIMIT},
+            )
+            if attempt < self.max_retries:
+                return delay
+            raise WPClientError(
+                "WP API rate limit (429) after retries",
+                WP_RATE_LIMIT,
+                status_code=429,
+            )
+        if 500 <= status_code < 600:
+            delay = _retry_delay(self.limiter, status_code, headers, attempt)
+            logger.warning(
+                "WP API server error %s, retry in %.1fs (attempt %s)",
+                status_code,
+                delay,
+                attempt + 1,
+                extra={"site_id": self.site_id, "run_id": run_id, "error_code": WP_NETWORK_ERROR},
+            )
+            if attempt < self.max_retries:
+                return delay
+            raise WPClientError(
+                f"WP API server error: {status_code}",
+                WP_NETWORK_ERROR,
+                status_code=status_code,
+            )
+        return None
+
+    def _parse_json(self, resp: Any) -> Any:
+        try:
+            return resp.json()
+        except ValueError as e:
+            raise WPClientError(
+                f"Invalid JSON from WP API: {e}",
+                WP_DATA_FORMAT_ERROR,
+                status_code=resp.status_code,
+            ) from e
+
+    def _log_success(self, method: str, path: str, status_code: int, t0: float, run_id: Optional[str]) -> None:
+        elapsed = time.monotonic() - t0
+        self.limiter.on_success(elapsed)
+        latency_sec = round(elapsed, 2)
+        logger.info(
+            "WP API %s %s status=%s latency_sec=%s",
+            method,
+            path,
+            status_code,
+            latency_sec,
+            extra={"site_id": self.site_id, "run_id": run_id},
+        )
+
+    def _network_error_delay(
+        self,
+        e: Exception,
+        timed_out: bool,
+        method: str,
+        path: str,
+        attempt: int,
+        run_id: Optional[str],
+    ) -> float:
+        """Timeout/сетевая ошибка: задержка перед повтором или WPClientError, если попытки кончились."""
+        delay = _retry_delay(self.limiter, None, None, attempt)
+        if timed_out:
+            logger.warning(
+                "WP API timeout: %s %s, retry in %.1fs (attempt %s)",
+                method,
+                path,
+                delay,
+                attempt + 1,
+                extra={"site_id": self.site_id, "run_id": run_id, "error_code": WP_NETWORK_ERROR},
+            )
+        else:
+            logger.warning(
+                "WP API request error: %s, retry in %.1fs (attempt %s)",
+                e,
+                delay,
+                attempt + 1,
+                extra={"site_id": self.site_id, "run_id": run_id, "error_code": WP_NETWORK_ERROR},
+            )
+        if attempt < self.max_retries:
+            return delay
+        if timed_out:
+            raise WPClientError(f"WP API timeout: {e}", WP_NETWORK_ERROR) from e
+        raise WPClientError(f"WP API request failed: {e}", WP_NETWORK_ERROR) from e
+
+    def _exhausted(self, last_status: Optional[int]) -> WPClientError:
+        return WPClientError(
+            "WP API request failed after retries",
+            WP_NETWORK_ERROR,
+            status_code=last_status,
+        )
+
+
+    def close(self) -> None:
+        self._session.close()
+
+    def __enter__(self) -> "WPRestClient":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
 
     def _wait_rate_limit(self) -> None:
-        """Соблюдение лимита: пауза >= 1/3 сек перед каждым запросом (включая retry)."""
-        elapsed = time.monotonic() - self._last_request_time
-        if elapsed < self._min_delay:
-            time.sleep(self._min_delay - elapsed)
-        self._last_request_time = time.monotonic()
+        """Соблюдение лимита: пауза >= 1/3 сек перед каждым запросом (включая retry), общая для всех потоков."""
+        with self._rate_lock:
+            delay = self._rate_limit_delay()
+        self._sleep(delay)
+
+    def _sleep(self, delay: float) -> None:
+        if delay > 0:
+            self._note_wait(delay)
+            time.sleep(delay)
 
     def _request(
         self,
@@ -83,153 +337,60 @@ class WPRestClient:
         path: str,
         params: Optional[dict] = None,
         run_id: Optional[str] = None,
+        headers: Optional[dict] = None,
     ) -> tuple[Any, requests.Response]:
-        """Выполнить запрос с rate limit и retry. Возвращает (json_data, response). При ошибке — WPClientError."""
-        url = f"{self.base_url}/wp-json/wp/v2{path}"
+        """Выполнить запрос с rate limit и retry. Возвращает (json_data, response). При ошибке — WPClientError.
+
+        На 304 (условный запрос) json_data = None: тело берётся из кэша вызывающим кодом.
+        """
+        url = self._url(path)
         last_status: Optional[int] = None
-        last_error: Optional[Exception] = None
 
         for attempt in range(self.max_retries + 1):
             self._wait_rate_limit()
             try:
                 t0 = time.monotonic()
-                resp = requests.request(
+                resp = self._session.request(
                     method,
                     url,
                     params=params,
                     auth=self.auth,
                     timeout=self.timeout_sec,
-                    headers={"Accept": "application/json", "Content-Type": "application/json"},
+                    headers={**DEFAULT_HEADERS, **headers} if headers else DEFAULT_HEADERS,
                 )
                 last_status = resp.status_code
-
-                if resp.status_code in (401, 403):
-                    logger.warning(
-                        "WP API auth failed: %s %s status=%s",
-                        method,
-                        path,
-                        resp.status_code,
-                        extra={"site_id": self.site_id, "run_id": run_id, "error_code": WP_AUTH_ERROR},
-                    )
-                    raise WPClientError(
-                        f"WP API auth failed: {resp.status_code}",
-                        WP_AUTH_ERROR,
-                        status_code=resp.status_code,
-                    )
-                if 400 <= resp.status_code < 500 and resp.status_code != 429:
-                    raise WPClientError(
-                        f"WP API client error: {resp.status_code}",
-                        WP_NETWORK_ERROR,
-                        status_code=resp.status_code,
-                    )
-                if resp.status_code == 429:
-                    retry_after: Optional[int] = None
-                    if "Retry-After" in resp.headers:
-                        try:
-                            retry_after = int(resp.headers["Retry-After"])
-                        except (ValueError, TypeError):
-                            pass
-                    delay = _backoff_delay(attempt, retry_after)
-                    logger.warning(
-                        "WP API rate limit (429), retry after %.1fs (attempt %s)",
-                        delay,
-                        attempt + 1,
-                        extra={"site_id": self.site_id, "run_id": run_id, "error_code": WP_RATE_LIMIT},
-                    )
-                    if attempt < self.max_retries:
-                        time.sleep(delay)
-                        continue
-                    raise WPClientError(
-                        "WP API rate limit (429) after retries",
-                        WP_RATE_LIMIT,
-                        status_code=429,
-                    )
-                if 500 <= resp.status_code < 600:
-                    delay = _backoff_delay(attempt, None)
-                    logger.warning(
-                        "WP API server error %s, retry in %.1fs (attempt %s)",
-                        resp.status_code,
-                        delay,
-                        attempt + 1,
-                        extra={"site_id": self.site_id, "run_id": run_id, "error_code": WP_NETWORK_ERROR},
-                    )
-                    if attempt < self.max_retries:
-                        time.sleep(delay)
-                        continue
-                    raise WPClientError(
-                        f"WP API server error: {resp.status_code}",
-                        WP_NETWORK_ERROR,
-                        status_code=resp.status_code,
-                    )
-
+                delay = self._check_status(method, path, resp.status_code, resp.headers, attempt, run_id)
+                if delay is not None:
+                    self._sleep(delay)
+                    continue
+                if resp.status_code == 304:
+                    self._log_success(method, path, resp.status_code, t0, run_id)
+                    return (None, resp)
                 resp.raise_for_status()
-                last_error = None
-                try:
-                    data = resp.json()
-                except ValueError as e:
-                    raise WPClientError(
-                        f"Invalid JSON from WP API: {e}",
-                        WP_DATA_FORMAT_ERROR,
-                        status_code=resp.status_code,
-                    ) from e
-                latency_sec = round(time.monotonic() - t0, 2)
-                logger.info(
-                    "WP API %s %s status=%s latency_sec=%s",
-                    method,
-                    path,
-                    resp.status_code,
-                    latency_sec,
-                    extra={"site_id": self.site_id, "run_id": run_id},
-                )
+                data = self._parse_json(resp)
+                self._log_success(method, path, resp.status_code, t0, run_id)
                 return (data, resp)
 
             except WPClientError:
                 raise
             except requests.exceptions.Timeout as e:
-                last_error = e
-                delay = _backoff_delay(attempt, None)
-                logger.warning(
-                    "WP API timeout: %s %s, retry in %.1fs (attempt %s)",
-                    method,
-                    path,
-                    delay,
-                    attempt + 1,
-                    extra={"site_id": self.site_id, "run_id": run_id, "error_code": WP_NETWORK_ERROR},
-                )
-                if attempt < self.max_retries:
-                    time.sleep(delay)
-                    continue
-                raise WPClientError(
-                    f"WP API timeout: {e}",
-                    WP_NETWORK_ERROR,
-                ) from e
+                self._sleep(self._network_error_delay(e, True, method, path, attempt, run_id))
             except requests.exceptions.RequestException as e:
-                last_error = e
-                delay = _backoff_delay(attempt, None)
-                logger.warning(
-                    "WP API request error: %s, retry in %.1fs (attempt %s)",
-                    e,
-                    delay,
-                    attempt + 1,
-                    extra={"site_id": self.site_id, "run_id": run_id, "error_code": WP_NETWORK_ERROR},
-                )
-                if attempt < self.max_retries:
-                    time.sleep(delay)
-                    continue
-                raise WPClientError(
-                    f"WP API request failed: {e}",
-                    WP_NETWORK_ERROR,
-                ) from e
+                self._sleep(self._network_error_delay(e, False, method, path, attempt, run_id))
 
-        raise WPClientError(
-            "WP API request failed after retries",
-            WP_NETWORK_ERROR,
-            status_code=last_status,
+        raise self._exhausted(last_status)
+
+    def _get(self, path: str, params: Optional[dict], run_id: Optional[str]) -> tuple[Any, dict]:
+        """GET через кэш (если задан): условный запрос, на 304 — тело и заголовки из кэша."""
+        entry = self._cache_entry(path, params)
+        data, resp = self._request(
+            "GET", path, params=params, run_id=run_id, headers=entry.validators() if entry else None
         )
+        return self._cached_result(path, params, entry, data, resp.status_code, resp.headers)
 
     def get(self, path: str, params: Optional[dict] = None, run_id: Optional[str] = None) -> Any:
         """GET запрос. Возвращает JSON-тело ответа."""
-        data, _ = self._request("GET", path, params=params, run_id=run_id)
+        data, _ = self._get(path, params, run_id)
         return data
 
     def get_with_headers(
@@ -239,5 +400,4 @@ class WPRestClient:
         run_id: Optional[str] = None,
     ) -> tuple[Any, dict]:
         """GET с возвратом заголовков для пагинации (X-WP-Total, X-WP-TotalPages)."""
-        data, resp = self._request("GET", path, params=params, run_id=run_id)
-        return data, dict(resp.headers)
+        return self._get(path, params, run_id)
@@ -9,6 +9,15 @@ from typing import Any, List, Optional
 
 import yaml
 
+from .http_cache import DEFAULT_HTTP_CACHE_MAX_MB, HTTP_CACHE_ENV
+from .media import DEFAULT_MEDIA_CONCURRENCY, MEDIA_MIRROR_ENV
+from .rate_limiter import ADAPTIVE_RATE_ENV, DEFAULT_MAX_RATE
+from .raw_payload import RAW_JSON_POLICY_ENV, RAW_POLICIES, RAW_POLICY_FULL
+
+SYNC_MODE_ENV = "WP_SYNC_MODE"
+SYNC_MODE_FULL = "full"
+SYNC_MODE_INCREMENTAL = "incremental"
+SYNC_MODES = (SYNC_MODE_FULL, SYNC_MODE_INCREMENTAL)
 
 
 @dataclass
@@ -18,6 +27,7 @@ class SiteConfig:
     name: Optional[str]
     user: str  # из env WP_SITE_<site_id>_USER
     app_password: str  # из env WP_SITE_<site_id>_APP_PASSWORD
+    requests_per_second: Optional[float] = None  # свой лимит сайта; None — глобальный из конфига
 
 
 @dataclass
@@ -29,6 +39,17 @@ class WPSyncConfig:
     retries: int = 3
     requests_per_second: float = 3.0  # пауза между запросами = 1/requests_per_second
     storage_backend: Optional[str] = None  # 'sqlite' или пусто (Postgres/авто)
+    page_concurrency: int = 4  # страниц одного эндпоинта параллельно (под общим лимитом req/s)
+    max_concurrent_sites: int = 1  # сайтов синхронизируется одновременно; >1 — явно в конфиге
+    sync_mode: str = SYNC_MODE_FULL  # full | incremental (WP_SYNC_MODE переопределяет YAML)
+    raw_json_policy: str = RAW_POLICY_FULL  # full | slim | compressed (WP_RAW_JSON_POLICY переопределяет YAML)
+    http_cache: bool = False  # условные GET с дисковым кэшем ответов (WP_HTTP_CACHE переопределяет YAML)
+    http_cache_max_mb: int = DEFAULT_HTTP_CACHE_MAX_MB  # предел размера кэша, LRU-вытеснение
+    keyset_latency_sec: float = 10.0  # страница медленнее — обход постов/страниц по курсору даты; 0 — выключено
+    adaptive_rate: bool = False  # темп по латентности и 429/5xx (WP_ADAPTIVE_RATE переопределяет YAML)
+    max_requests_per_second: float = DEFAULT_MAX_RATE  # потолок адаптивного темпа
+    media_mirror: bool = False  # скачивать картинки постов/страниц в data/wp_media (WP_MEDIA_MIRROR переопределяет YAML)
+    media_concurrency: int = DEFAULT_MEDIA_CONCURRENCY  # файлов медиа качается одновременно
 
 
 def _env_key(site_id: str, suffix: str) -> str:
@@ -42,6 +63,15 @@ def _get_site_credentials(site_id: str) -> tuple[str, str]:
     return user, pwd
 
 
+def _parse_flag(value: Any, source: str) -> bool:
+    text = str(value).strip().lower()
+    if text in ("1", "true", "yes", "on"):
+        return True
+    if text in ("", "0", "false", "no", "off", "none"):
+        return False
+    raise ValueError(f"{source}: ожидается true/false, получено '{value}'.") from None
+
+
 def load_sites_yaml(path: Path) -> List[dict]:
     if not path.exists():
         return []
@@ -102,8 +132,25 @@ def load_config(
                 f"Для сайта {site_id} задайте переменные окружения "
                 f"{_env_key(site_id, 'USER')} и {_env_key(site_id, 'APP_PASSWORD')} (Application Password)."
             ) from None
+        site_rps: Optional[float] = None
+        if s.get("requests_per_second") is not None:
+            try:
+                site_rps = float(s["requests_per_second"])
+            except (TypeError, ValueError):
+                raise ValueError(
+                    f"config/wp-sites.yml: sites[{i}] (site_id={site_id}): requests_per_second должен быть числом"
+                ) from None
+            if site_rps <= 0:
+                site_rps = None
         site_configs.append(
-            SiteConfig(site_id=site_id, base_url=base_url, name=name, user=user, app_password=app_password)
+            SiteConfig(
+                site_id=site_id,
+                base_url=base_url,
+                name=name,
+                user=user,
+                app_password=app_password,
+                requests_per_second=site_rps,
+            )
         )
 
     # Опциональные глобальные параметры из YAML
@@ -122,6 +169,53 @@ def load_config(
     rps = float(data.get("requests_per_second", 3.0))
     if rps <= 0:
         rps = 3.0
+    page_concurrency = int(data.get("page_concurrency", 4))
+    if page_concurrency < 1:
+        page_concurrency = 1
+    max_concurrent_sites = int(data.get("max_concurrent_sites", 1))
+    if max_concurrent_sites < 1:
+        max_concurrent_sites = 1
+    sync_mode = (os.environ.get(SYNC_MODE_ENV) or str(data.get("sync_mode") or "")).strip().lower() or SYNC_MODE_FULL
+    if sync_mode not in SYNC_MODES:
+        raise ValueError(
+            f"Неизвестный режим sync '{sync_mode}' ({SYNC_MODE_ENV} / sync_mode): допустимо {', '.join(SYNC_MODES)}."
+        ) from None
+    raw_json_policy = (
+        (os.environ.get(RAW_JSON_POLICY_ENV) or str(data.get("raw_json_policy") or "")).strip().lower()
+        or RAW_POLICY_FULL
+    )
+    if raw_json_policy not in RAW_POLICIES:
+        raise ValueError(
+            f"Неизвестная политика raw_json '{raw_json_policy}' ({RAW_JSON_POLICY_ENV} / raw_json_policy): "
+            f"допустимо {', '.join(RAW_POLICIES)}."
+        ) from None
+    env_cache = os.environ.get(HTTP_CACHE_ENV)
+    if env_cache is not None and env_cache.strip():
+        http_cache = _parse_flag(env_cache, HTTP_CACHE_ENV)
+    else:
+        http_cache = _parse_flag(data.get("http_cache", False), "config/wp-sites.yml: http_cache")
+    http_cache_max_mb = int(data.get("http_cache_max_mb", DEFAULT_HTTP_CACHE_MAX_MB))
+    if http_cache_max_mb < 1:
+        http_cache_max_mb = DEFAULT_HTTP_CACHE_MAX_MB
+    keyset_latency_sec = float(data.get("keyset_latency_sec", 10.0))
+    if keyset_latency_sec < 0:
+        keyset_latency_sec = 0.0
+    env_adaptive = os.environ.get(ADAPTIVE_RATE_ENV)
+    if env_adaptive is not None and env_adaptive.strip():
+        adaptive_rate = _parse_flag(env_adaptive, ADAPTIVE_RATE_ENV)
+    else:
+        adaptive_rate = _parse_flag(data.get("adaptive_rate", False), "config/wp-sites.yml: adaptive_rate")
+    max_rps = float(data.get("max_requests_per_second", DEFAULT_MAX_RATE))
+    if max_rps <= 0:
+        max_rps = DEFAULT_MAX_RATE
+    env_media = os.environ.get(MEDIA_MIRROR_ENV)
+    if env_media is not None and env_media.strip():
+        media_mirror = _parse_flag(env_media, MEDIA_MIRROR_ENV)
+    else:
+        media_mirror = _parse_flag(data.get("media_mirror", False), "config/wp-sites.yml: media_mirror")
+    media_concurrency = int(data.get("media_concurrency", DEFAULT_MEDIA_CONCURRENCY))
+    if media_concurrency < 1:
+        media_concurrency = 1
     storage_backend = (data.get("storage_backend") or "").strip().lower() or None
     if storage_backend and storage_backend not in ("sqlite", "postgres"):
         storage_backend = None
@@ -133,4 +227,15 @@ def load_config(
         retries=retries,
         requests_per_second=rps,
         storage_backend=storage_backend,
+        page_concurrency=page_concurrency,
+        max_concurrent_sites=max_concurrent_sites,
+        sync_mode=sync_mode,
+        raw_json_policy=raw_json_policy,
+        http_cache=http_cache,
+        http_cache_max_mb=http_cache_max_mb,
+        keyset_latency_sec=keyset_latency_sec,
+        adaptive_rate=adaptive_rate,
+        max_requests_per_second=max_rps,
+        media_mirror=media_mirror,
+        media_concurrency=media_concurrency,
     )
@@ -2,15 +2,40 @@
 
 Этап 3: пагинация по X-WP-TotalPages с fallback, фильтры status=publish и _embed,
 маппинг в AuthorRow/TermRow/ContentRow/ContentTermRow.
+
+Первая страница запрашивается отдельно: её X-WP-TotalPages задаёт число страниц,
+страницы 2..N идут параллельно (`page_concurrency` потоков) под общим лимитом
+req/s клиента и отдаются в порядке номеров. `iter_posts`/`iter_pages` отдают
+строки постранично — sync пишет их пачками, не держа сайт целиком в памяти.
+
+Проекция (`full_payload=False`): посты/страницы запрашиваются с `_fields` из
+`mapper.CONTENT_FIELDS` и `_embed=wp:term` — сервер не рендерит и не отдаёт
+поля и встроенные объекты, которые маппинг не читает.
+
+Глубокие архивы: `page=N` в WP — это LIMIT/OFFSET в MySQL, поздние страницы
+медленные. Если страница постов/страниц отвечает дольше `keyset_latency_sec`
+или не отвечает, обход продолжается окнами по курсору даты (`before` для
+полного sync, `modified_after` для incremental) — см. `_iter_result_pages`.
+
+Incremental (`modified_after`): посты/страницы запрашиваются с
+`modified_after` + `orderby=modified`, на клиенте остаются только изменённые
+не раньше watermark. Новый watermark sync пишет отдельной транзакцией после
+записи всего контента (первый прогон сайта — полный).
 """
 
 from __future__ import annotations
 
 import logging
-from typing import Any, Dict, List, Optional, Tuple
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Deque, Dict, Iterator, List, NamedTuple, Optional, Tuple
 
-from .client import WPRestClient
+from .client import WPClientError, WPRestClient
 from .mapper import (
+    CONTENT_EMBED,
+    CONTENT_FIELDS,
     AuthorRow,
     ContentRow,
     ContentTermRow,
@@ -25,6 +50,31 @@ from .mapper import (
 
 logger = logging.getLogger("wp.fetcher")
 
+# Сколько страниц одного эндпоинта запрашивать одновременно.
+DEFAULT_PAGE_CONCURRENCY = 4
+
+# Страница постов/страниц медленнее этого (сек) — обход переключается с page=N на keyset-курсор.
+DEFAULT_KEYSET_LATENCY_SEC = 10.0
+
+# WP сравнивает modified_after с локальным post_modified (часовой пояс сайта), а watermark — в GMT:
+# запрос берётся с запасом на любой пояс, точная отсечка — по modified_gmt на клиенте.
+MODIFIED_AFTER_OVERLAP = timedelta(days=1)
+
+
+def _as_utc(d: Optional[datetime]) -> Optional[datetime]:
+    """modified_gmt из WP приходит без зоны: считаем его UTC."""
+    if d is None:
+        return None
+    return d.replace(tzinfo=timezone.utc) if d.tzinfo is None else d.astimezone(timezone.utc)
+
+
+def latest_modified(rows: List[ContentRow], previous: Optional[datetime] = None) -> Optional[datetime]:
+    """Новый watermark: максимум modified_at по строкам и предыдущему значению (UTC)."""
+    stamps = [_as_utc(r.modified_at) for r in rows if r.modified_at is not None]
+    if previous is not None:
+        stamps.append(_as_utc(previous))
+    return max(stamps) if stamps else None
+
 
 def _total_pages(headers: Optional[Dict[str, Any]]) -> int:
     """Число страниц из X-WP-TotalPages. Защита от невалидных значений: не падать, возвращать >= 1."""
@@ -38,36 +88,319 @@ def _total_pages(headers: Optional[Dict[str, Any]]) -> int:
         return 1
 
 
+def _total_items(headers: Optional[Dict[str, Any]]) -> Optional[int]:
+    """Число объектов из X-WP-Total (None, если заголовка нет или он невалиден)."""
+    if not headers:
+        return None
+    try:
+        return int(headers.get("X-WP-Total") or headers.get("x-wp-total"))
+    except (ValueError, TypeError):
+        return None
+
+
+class _Keyset(NamedTuple):
+    """Курсор keyset-обхода: параметр запроса, поле объекта и направление сортировки."""
+
+    param: str  # before | modified_after
+    field: str  # date | modified (локальное время сайта, как и фильтр WP)
+    descending: bool
+
+
+# Полный sync: порядок WP по умолчанию (date desc), курсор — before=<самая ранняя дата + 1 с>
+# (граница WP строгая: запас в секунду повторно захватывает записи с той же датой).
+KEYSET_BY_DATE = _Keyset("before", "date", True)
+# Incremental: orderby=modified asc, курсор — modified_after=<самая поздняя дата - 1 с>.
+KEYSET_BY_MODIFIED = _Keyset("modified_after", "modified", False)
+
+
+def _keyset_bound(value: Any, keyset: _Keyset) -> Optional[str]:
+    """Значение параметра курсора для следующего окна; с запасом в секунду — дубли отсекает дедупликация по id."""
+    try:
+        stamp = datetime.fromisoformat(str(value).replace("Z", "+00:00")).replace(tzinfo=None)
+    except (TypeError, ValueError):
+        return None
+    stamp += timedelta(seconds=1) if keyset.descending else -timedelta(seconds=1)
+    return stamp.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def _iter_result_pages(
+    client: WPRestClient,
+    path: str,
+    params: Dict[str, Any],
+    site_id: str,
+    per_page: int,
+    run_id: Optional[str],
+    page_concurrency: int,
+    keyset: Optional[_Keyset] = None,
+    keyset_latency_sec: Optional[float] = None,
+) -> Iterator[List[Any]]:
+    """Объекты эндпоинта постранично, в порядке страниц.
+
+    Вперёд запрашивается не больше `page_concurrency` страниц: пока потребитель
+    не забрал страницу, следующие не качаются (память не растёт с размером сайта).
+    Если за время обхода страницы сдвинулись (публикация/удаление), объекты
+    дедуплицируются по id, а выросшее X-WP-TotalPages догружается. 400 на
+    странице > 1 (WP: rest_*_invalid_page_number) означает, что страниц стало меньше.
+
+    keyset: если страница отвечала дольше `keyset_latency_sec` или не ответила
+    (timeout после retry), обход переходит с `page=N` (LIMIT/OFFSET в MySQL — чем
+    дальше, тем медленнее) на окна по курсору: `page=1` с фильтром по дате
+    последнего полученного объекта. Уже запрошенные страницы дочитываются.
+    """
+    name = path.lstrip("/")
+
+    def get_page(page: int, page_params: Dict[str, Any]) -> Tuple[Any, Optional[Dict[str, Any]], float]:
+        t0 = time.monotonic()
+        try:
+            data, headers = client.get_with_headers(
+                path, params={**page_params, "per_page": per_page, "page": page}, run_id=run_id
+            )
+        except WPClientError as e:
+            if page > 1 and e.status_code == 400:
+                logger.info(
+                    "WP API /%s: страницы %s уже нет (400), конец пагинации",
+                    name,
+                    page,
+                    extra={"site_id": site_id, "run_id": run_id},
+                )
+                return [], None, time.monotonic() - t0
+            raise
+        latency = time.monotonic() - t0
+        logger.debug(
+            "WP API /%s page=%s latency_sec=%.2f",
+            name,
+            page,
+            latency,
+            extra={"site_id": site_id, "run_id": run_id},
+        )
+        return data, headers, latency
+
+    def not_list(data: Any) -> bool:
+        if isinstance(data, list):
+            return False
+        logger.warning(
+            "WP API /%s вернул не список (type=%s), завершаем пагинацию",
+            name,
+            type(data).__name__,
+            extra={"site_id": site_id, "run_id": run_id},
+        )
+        return True
+
+    seen_ids = set()
+    cursor: Optional[str] = None  # крайнее значение keyset.field среди полученных объектов
+
+    def fresh(page_items: List[Any]) -> List[Any]:
+        nonlocal cursor
+        out = []
+        for item in page_items:
+            if keyset is not None and isinstance(item, dict) and item.get(keyset.field):
+                value = str(item[keyset.field])
+                if cursor is None or (value < cursor if keyset.descending else value > cursor):
+                    cursor = value
+            item_id = item.get("id") if isinstance(item, dict) else None
+            if item_id is not None:
+                if item_id in seen_ids:
+                    continue
+                seen_ids.add(item_id)
+            out.append(item)
+        return out
+
+    def too_slow(page: int, latency: float) -> bool:
+        if keyset is None or not keyset_latency_sec or latency <= keyset_latency_sec or cursor is None:
+            return False
+        logger.warning(
+            "WP API /%s: страница %s отвечала %.1f с (порог %.1f с), переход на keyset-обход по %s",
+            name,
+            page,
+            latency,
+            keyset_latency_sec,
+            keyset.param,
+            extra={"site_id": site_id, "run_id": run_id},
+        )
+        return True
+
+    data, headers, latency = get_page(1, params)
+    if not_list(data):
+        return
+    pages_count = 1
+    total_pages = _total_pages(headers)
+    total_items = _total_items(headers)
+    yield fresh(data)
+    more = total_pages > 1 and len(data) >= per_page
+    switch = more and too_slow(1, latency)
+    if more and not switch:
+        window = max(1, page_concurrency)
+        with ThreadPoolExecutor(max_workers=window) as pool:
+            pending: Deque[Tuple[int, Future]] = deque()
+            next_page = 2
+            while pending or (next_page <= total_pages and not switch):
+                while not switch and next_page <= total_pages and len(pending) < window:
+                    pending.append((next_page, pool.submit(get_page, next_page, params)))
+                    next_page += 1
+                page, future = pending.popleft()
+                try:
+                    data, headers, latency = future.result()
+                except WPClientError as e:
+                    # Timeout/сеть после всех retry на глубокой странице — keyset ещё может дочитать
+                    if keyset is None or e.status_code is not None or cursor is None:
+                        raise
+                    logger.warning(
+                        "WP API /%s: страница %s не получена (%s), переход на keyset-обход по %s",
+                        name,
+                        page,
+                        e,
+                        keyset.param,
+                        extra={"site_id": site_id, "run_id": run_id},
+                    )
+                    switch = True
+                    for _, f in pending:
+                        f.cancel()
+                    break
+                if not_list(data):
+                    for _, f in pending:
+                        f.cancel()
+                    break
+                pages_count += 1
+                if headers:
+                    total_pages = max(total_pages, _total_pages(headers))
+                    total_items = _total_items(headers) or total_items
+                yield fresh(data)
+                if not switch and too_slow(page, latency):
+                    switch = True
+                    # Не начатые страницы отменяются, уже запрошенные дочитываются
+                    pending = deque((p, f) for p, f in pending if not f.cancel())
+
+    if switch:
+        bound = _keyset_bound(cursor, keyset)
+        window_page = 1
+        while bound is not None:
+            data, headers, latency = get_page(window_page, {**params, keyset.param: bound})
+            if not_list(data):
+                break
+            pages_count += 1
+            yield fresh(data)
+            if len(data) < per_page:
+                break
+            next_bound = _keyset_bound(cursor, keyset)
+            # Всё окно — объекты одной секунды: курсор не сдвинулся, листаем внутри окна
+            window_page = window_page + 1 if next_bound == bound else 1
+            bound = next_bound
+
+    if total_items is not None and len(seen_ids) < total_items and pages_count > 1:
+        logger.warning(
+            "WP API /%s: получено %s из %s объектов (страницы сдвинулись во время обхода)",
+            name,
+            len(seen_ids),
+            total_items,
+            extra={"site_id": site_id, "run_id": run_id},
+        )
+
+
+def _fetch_all_pages(
+    client: WPRestClient,
+    path: str,
+    params: Dict[str, Any],
+    site_id: str,
+    per_page: int,
+    run_id: Optional[str],
+    page_concurrency: int,
+) -> List[Any]:
+    """Все объекты эндпоинта в порядке страниц (см. `_iter_result_pages`)."""
+    return [
+        item
+        for page_items in _iter_result_pages(client, path, params, site_id, per_page, run_id, page_concurrency)
+        for item in page_items
+    ]
+
+
+def _fetch_mapped(
+    client: WPRestClient,
+    path: str,
+    params: Dict[str, Any],
+    site_id: str,
+    per_page: int,
+    run_id: Optional[str],
+    page_concurrency: int,
+    mapper: Callable[[str, Dict[str, Any]], Any],
+) -> List[Any]:
+    items = _fetch_all_pages(client, path, params, site_id, per_page, run_id, page_concurrency)
+    return [mapper(site_id, item) for item in items if isinstance(item, dict)]
+
+
+def _iter_content(
+    client: WPRestClient,
+    path: str,
+    content_type: str,
+    site_id: str,
+    per_page: int,
+    run_id: Optional[str],
+    page_concurrency: int,
+    mapper: Callable[[str, Dict[str, Any]], ContentRow],
+    modified_after: Optional[datetime] = None,
+    full_payload: bool = True,
+    keyset_latency_sec: Optional[float] = DEFAULT_KEYSET_LATENCY_SEC,
+) -> Iterator[Tuple[List[ContentRow], List[ContentTermRow]]]:
+    params: Dict[str, Any] = {"status": "publish", "_embed": ""}
+    keyset = KEYSET_BY_DATE
+    if not full_payload:
+        params["_embed"] = CONTENT_EMBED
+        params["_fields"] = ",".join(CONTENT_FIELDS)
+    since = _as_utc(modified_after)
+    if since is not None:
+        params["modified_after"] = (since - MODIFIED_AFTER_OVERLAP).strftime("%Y-%m-%dT%H:%M:%S")
+        params["orderby"] = "modified"
+        params["order"] = "asc"
+        keyset = KEYSET_BY_MODIFIED
+    for page_items in _iter_result_pages(
+        client, path, params, site_id, per_page, run_id, page_concurrency, keyset, keyset_latency_sec
+    ):
+        contents: List[ContentRow] = []
+        content_terms: List[ContentTermRow] = []
+        for item in page_items:
+            if not isinstance(item, dict):
+                continue
+            row = mapper(site_id, item)
+            # >= : объект с тем же modified, что и watermark, перезапишется идемпотентно, но не потеряется
+            if since is not None and row.modified_at is not None and _as_utc(row.modified_at) < since:
+                continue
+            contents.append(row)
+            content_terms.extend(content_embedded_terms(site_id, content_type, int(item.get("id", 0)), item))
+        yield contents, content_terms
+
+
+def _fetch_content(
+    client: WPRestClient,
+    path: str,
+    content_type: str,
+    site_id: str,
+    per_page: int,
+    run_id: Optional[str],
+    page_concurrency: int,
+    mapper: Callable[[str, Dict[str, Any]], ContentRow],
+    modified_after: Optional[datetime] = None,
+    full_payload: bool = True,
+    keyset_latency_sec: Optional[float] = DEFAULT_KEYSET_LATENCY_SEC,
+) -> Tuple[List[ContentRow], List[ContentTermRow]]:
+    contents: List[ContentRow] = []
+    content_terms: List[ContentTermRow] = []
+    for rows, terms in _iter_content(
+        client, path, content_type, site_id, per_page, run_id, page_concurrency, mapper, modified_after,
+        full_payload, keyset_latency_sec,
+    ):
+        contents.extend(rows)
+        content_terms.extend(terms)
+    return contents, content_terms
+
+
 def fetch_users(
     client: WPRestClient,
     site_id: str,
     per_page: int = 100,
     run_id: Optional[str] = None,
+    page_concurrency: int = DEFAULT_PAGE_CONCURRENCY,
 ) -> List[AuthorRow]:
     """Загрузить всех пользователей (авторов). GET /users с пагинацией."""
-    result: List[AuthorRow] = []
-    page = 1
-    while True:
-        data, headers = client.get_with_headers(
-            "/users",
-            params={"per_page": per_page, "page": page},
-            run_id=run_id,
-        )
-        if not isinstance(data, list):
-            logger.warning(
-                "WP API /users вернул не список (type=%s), завершаем пагинацию",
-                type(data).__name__,
-                extra={"site_id": site_id, "run_id": run_id},
-            )
-            break
-        for item in data:
-            if isinstance(item, dict):
-                result.append(user_to_author(site_id, item))
-        total_pages = _total_pages(headers)
-        if page >= total_pages or len(data) < per_page:
-            break
-        page += 1
-    return result
+    return _fetch_mapped(client, "/users", {}, site_id, per_page, run_id, page_concurrency, user_to_author)
 
 
 def fetch_categories(
@@ -75,31 +408,10 @@ def fetch_categories(
     site_id: str,
     per_page: int = 100,
     run_id: Optional[str] = None,
+    page_concurrency: int = DEFAULT_PAGE_CONCURRENCY,
 ) -> List[TermRow]:
     """Загрузить все категории. GET /categories с пагинацией."""
-    result: List[TermRow] = []
-    page = 1
-    while True:
-        data, headers = client.get_with_headers(
-            "/categories",
-            params={"per_page": per_page, "page": page},
-            run_id=run_id,
-        )
-        if not isinstance(data, list):
-            logger.warning(
-                "WP API /categories вернул не список (type=%s), завершаем пагинацию",
-                type(data).__name__,
-                extra={"site_id": site_id, "run_id": run_id},
-            )
-            break
-        for item in data:
-            if isinstance(item, dict):
-                result.append(category_to_term(site_id, item))
-        total_pages = _total_pages(headers)
-        if page >= total_pages or len(data) < per_page:
-            break
-        page += 1
-    return result
+    return _fetch_mapped(client, "/categories", {}, site_id, per_page, run_id, page_concurrency, category_to_term)
 
 
 def fetch_tags(
@@ -107,31 +419,10 @@ def fetch_tags(
     site_id: str,
     per_page: int = 100,
     run_id: Optional[str] = None,
+    page_concurrency: int = DEFAULT_PAGE_CONCURRENCY,
 ) -> List[TermRow]:
     """Загрузить все теги. GET /tags с пагинацией."""
-    result: List[TermRow] = []
-    page = 1
-    while True:
-        data, headers = client.get_with_headers(
-            "/tags",
-            params={"per_page": per_page, "page": page},
-            run_id=run_id,
-        )
-        if not isinstance(data, list):
-            logger.warning(
-                "WP API /tags вернул не список (type=%s), завершаем пагинацию",
-                type(data).__name__,
-                extra={"site_id": site_id, "run_id": run_id},
-            )
-            break
-        for item in data:
-            if isinstance(item, dict):
-                result.append(tag_to_term(site_id, item))
-        total_pages = _total_pages(headers)
-        if page >= total_pages or len(data) < per_page:
-            break
-        page += 1
-    return result
+    return _fetch_mapped(client, "/tags", {}, site_id, per_page, run_id, page_concurrency, tag_to_term)
 
 
 def fetch_posts(
@@ -139,41 +430,21 @@ def fetch_posts(
     site_id: str,
     per_page: int = 100,
     run_id: Optional[str] = None,
+    page_concurrency: int = DEFAULT_PAGE_CONCURRENCY,
+    modified_after: Optional[datetime] = None,
+    full_payload: bool = True,
+    keyset_latency_sec: Optional[float] = DEFAULT_KEYSET_LATENCY_SEC,
 ) -> Tuple[List[ContentRow], List[ContentTermRow]]:
-    """Загрузить все посты (status=publish) с _embed. Возвращает (content_rows, content_term_rows)."""
-    contents: List[ContentRow] = []
-    content_terms: List[ContentTermRow] = []
-    page = 1
-    while True:
-        data, headers = client.get_with_headers(
-            "/posts",
-            params={
-                "status": "publish",
-                "per_page": per_page,
-                "page": page,
-                "_embed": "",
-            },
-            run_id=run_id,
-        )
-        if not isinstance(data, list):
-            logger.warning(
-                "WP API /posts вернул не список (type=%s), завершаем пагинацию",
-                type(data).__name__,
-                extra={"site_id": site_id, "run_id": run_id},
-            )
-            break
-        for item in data:
-            if not isinstance(item, dict):
-                continue
-            contents.append(post_to_content(site_id, item))
-            content_terms.extend(
-                content_embedded_terms(site_id, "post", int(item.get("id", 0)), item)
-            )
-        total_pages = _total_pages(headers)
-        if page >= total_pages or len(data) < per_page:
-            break
-        page += 1
-    return contents, content_terms
+    """Загрузить все посты (status=publish) с _embed. Возвращает (content_rows, content_term_rows).
+
+    modified_after: только изменённые не раньше этого момента (incremental sync).
+    full_payload: False — проекция `_fields` + `_embed=wp:term` вместо полного ответа.
+    keyset_latency_sec: порог латентности страницы для перехода на keyset-обход (None/0 — выключено).
+    """
+    return _fetch_content(
+        client, "/posts", "post", site_id, per_page, run_id, page_concurrency, post_to_content, modified_after,
+        full_payload, keyset_latency_sec,
+    )
 
 
 def fetch_pages(
@@ -181,38 +452,52 @@ def fetch_pages(
     site_id: str,
     per_page: int = 100,
     run_id: Optional[str] = None,
+    page_concurrency: int = DEFAULT_PAGE_CONCURRENCY,
+    modified_after: Optional[datetime] = None,
+    full_payload: bool = True,
+    keyset_latency_sec: Optional[float] = DEFAULT_KEYSET_LATENCY_SEC,
 ) -> Tuple[List[ContentRow], List[ContentTermRow]]:
-    """Загрузить все страницы (status=publish) с _embed. Возвращает (content_rows, content_term_rows)."""
-    contents: List[ContentRow] = []
-    content_terms: List[ContentTermRow] = []
-    page = 1
-    while True:
-        data, headers = client.get_with_headers(
-            "/pages",
-            params={
-                "status": "publish",
-                "per_page": per_page,
-                "page": page,
-                "_embed": "",
-            },
-            run_id=run_id,
-        )
-        if not isinstance(data, list):
-            logger.warning(
-                "WP API /pages вернул не список (type=%s), завершаем пагинацию",
-                type(data).__name__,
-                extra={"site_id": site_id, "run_id": run_id},
-            )
-            break
-        for item in data:
-            if not isinstance(item, dict):
-                continue
-            contents.append(page_to_content(site_id, item))
-            content_terms.extend(
-                content_embedded_terms(site_id, "page", int(item.get("id", 0)), item)
-            )
-        total_pages = _total_pages(headers)
-        if page >= total_pages or len(data) < per_page:
-            break
-        page += 1
-    return contents, content_terms
+    """Загрузить все страницы (status=publish) с _embed. Возвращает (content_rows, content_term_rows).
+
+    modified_after: только изменённые не раньше этого момента (incremental sync).
+    full_payload: False — проекция `_fields` + `_embed=wp:term` вместо полного ответа.
+    keyset_latency_sec: порог латентности страницы для перехода на keyset-обход (None/0 — выключено).
+    """
+    return _fetch_content(
+        client, "/pages", "page", site_id, per_page, run_id, page_concurrency, page_to_content, modified_after,
+        full_payload, keyset_latency_sec,
+    )
+
+
+def iter_posts(
+    client: WPRestClient,
+    site_id: str,
+    per_page: int = 100,
+    run_id: Optional[str] = None,
+    page_concurrency: int = DEFAULT_PAGE_CONCURRENCY,
+    modified_after: Optional[datetime] = None,
+    full_payload: bool = True,
+    keyset_latency_sec: Optional[float] = DEFAULT_KEYSET_LATENCY_SEC,
+) -> Iterator[Tuple[List[ContentRow], List[ContentTermRow]]]:
+    """Посты постранично: (content_rows, content_term_rows) на каждую страницу API. Параметры как у fetch_posts."""
+    return _iter_content(
+        client, "/posts", "post", site_id, per_page, run_id, page_concurrency, post_to_content, modified_after,
+        full_payload, keyset_latency_sec,
+    )
+
+
+def iter_pages(
+    client: WPRestClient,
+    site_id: str,
+    per_page: int = 100,
+    run_id: Optional[str] = None,
+    page_concurrency: int = DEFAULT_PAGE_CONCURRENCY,
+    modified_after: Optional[datetime] = None,
+    full_payload: bool = True,
+    keyset_latency_sec: Optional[float] = DEFAULT_KEYSET_LATENCY_SEC,
+) -> Iterator[Tuple[List[ContentRow], List[ContentTermRow]]]:
+    """Страницы WP постранично: (content_rows, content_term_rows) на каждую страницу API. Параметры как у fetch_pages."""
+    return _iter_content(
+        client, "/pages", "page", site_id, per_page, run_id, page_concurrency, page_to_content, modified_after,
+        full_payload, keyset_latency_sec,
+    )
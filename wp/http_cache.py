@@ -0,0 +1,169 @@
+"""Дисковый кэш GET-ответов WP REST API для условных запросов.
+
+Запись — JSON-файл на ключ (sha256 от URL + отсортированных params): тело
+ответа, заголовки (X-WP-Total, X-WP-TotalPages) и валидаторы ETag /
+Last-Modified. Клиент отправляет If-None-Match / If-Modified-Since и на 304
+отдаёт тело из кэша: сервер не рендерит страницу, по сети идут только заголовки.
+
+Ответы без валидаторов не кэшируются. Размер каталога ограничен `max_bytes`:
+при превышении удаляются давно не использованные записи (LRU по mtime файла,
+обращение к записи обновляет mtime). Кэш общий для потоков и сайтов прогона.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from jsonio import dumps_bytes, loads
+
+logger = logging.getLogger("wp.http_cache")
+
+HTTP_CACHE_ENV = "WP_HTTP_CACHE"  # 1/true — включить кэш (переопределяет http_cache в YAML)
+HTTP_CACHE_DIR_ENV = "WP_HTTP_CACHE_DIR"
+DEFAULT_HTTP_CACHE_MAX_MB = 256
+
+# Заголовки ответа, которые нужны вызывающему коду (пагинация) и валидаторы.
+_KEPT_HEADERS = ("X-WP-Total", "X-WP-TotalPages", "ETag", "Last-Modified")
+
+
+def cache_key(url: str, params: Optional[Mapping[str, Any]]) -> str:
+    canonical = json.dumps([url, sorted((str(k), str(v)) for k, v in (params or {}).items())], ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _header(headers: Mapping[str, Any], name: str) -> Optional[str]:
+    for k, v in headers.items():
+        if k.lower() == name.lower():
+            return str(v)
+    return None
+
+
+class CacheEntry:
+    """Закэшированный ответ: тело, заголовки и валидаторы."""
+
+    def __init__(self, data: Any, headers: Dict[str, str]):
+        self.data = data
+        self.headers = headers
+
+    def validators(self) -> Dict[str, str]:
+        """Заголовки условного запроса: If-None-Match / If-Modified-Since."""
+        out: Dict[str, str] = {}
+        etag = self.headers.get("ETag")
+        if etag:
+            out["If-None-Match"] = etag
+        last_modified = self.headers.get("Last-Modified")
+        if last_modified:
+            out["If-Modified-Since"] = last_modified
+        return out
+
+
+class HTTPResponseCache:
+    """Каталог с ответами и LRU-вытеснением по суммарному размеру.
+
+    Args:
+        directory: Каталог кэша (создаётся при необходимости).
+        max_bytes: Верхняя граница суммарного размера файлов.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int = DEFAULT_HTTP_CACHE_MAX_MB * 1024 * 1024):
+        self.directory = Path(directory)
+        self.max_bytes = max(0, int(max_bytes))
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # key -> (размер, время последнего обращения); заполняется с диска один раз.
+        self._index: Dict[str, Tuple[int, float]] = {}
+        for path in self.directory.glob("*.json"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            self._index[path.stem] = (st.st_size, st.st_mtime)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    @property
+    def size_bytes(self) -> int:
+        with self._lock:
+            return sum(size for size, _ in self._index.values())
+
+    def get(self, url: str, params: Optional[Mapping[str, Any]]) -> Optional[CacheEntry]:
+        key = cache_key(url, params)
+        path = self._path(key)
+        with self._lock:
+            if key not in self._index:
+                return None
+        try:
+            record = loads(path.read_bytes())
+        except (OSError, ValueError):
+            self._forget(key)
+            return None
+        if not isinstance(record, dict) or record.get("url") != url:
+            self._forget(key)
+            return None
+        return CacheEntry(record.get("data"), dict(record.get("headers") or {}))
+
+    def touch(self, url: str, params: Optional[Mapping[str, Any]]) -> None:
+        """Отметить обращение (запись поднимается в LRU)."""
+        key = cache_key(url, params)
+        path = self._path(key)
+        with self._lock:
+            if key not in self._index:
+                return
+            size, _ = self._index[key]
+            now = time.time()
+            try:
+                os.utime(path, (now, now))
+            except OSError:
+                self._index.pop(key, None)
+                return
+            self._index[key] = (size, now)
+
+    def put(self, url: str, params: Optional[Mapping[str, Any]], data: Any, headers: Mapping[str, Any]) -> bool:
+        """Сохранить ответ, если у него есть ETag или Last-Modified. Возвращает True, если записан."""
+        kept = {name: value for name in _KEPT_HEADERS if (value := _header(headers, name)) is not None}
+        if "ETag" not in kept and "Last-Modified" not in kept:
+            return False
+        key = cache_key(url, params)
+        body = dumps_bytes({"url": url, "headers": kept, "data": data})
+        if len(body) > self.max_bytes:
+            return False
+        path = self._path(key)
+        tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        try:
+            tmp.write_bytes(body)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning("HTTP cache: не удалось записать %s: %s", path, e)
+            tmp.unlink(missing_ok=True)
+            return False
+        with self._lock:
+            self._index[key] = (len(body), time.time())
+            self._evict()
+        return True
+
+    def _forget(self, key: str) -> None:
+        with self._lock:
+            self._index.pop(key, None)
+        self._path(key).unlink(missing_ok=True)
+
+    def _evict(self) -> None:
+        """Удалять самые старые по обращению записи, пока каталог больше max_bytes (под self._lock)."""
+        total = sum(size for size, _ in self._index.values())
+        if total <= self.max_bytes:
+            return
+        for key, (size, _) in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if total <= self.max_bytes:
+                break
+            self._path(key).unlink(missing_ok=True)
+            del self._index[key]
+            total -= size
+            self.evictions += 1
@@ -2,11 +2,24 @@
 
 from __future__ import annotations
 
+import hashlib
+import json
 from dataclasses import dataclass
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 
 
+# Поля поста/страницы, которые читают _raw_to_content и content_embedded_terms: проекция `_fields`
+# для запросов без полного ответа. `_links` обязателен — без него WP не встраивает `_embedded`.
+CONTENT_FIELDS = (
+    "id", "slug", "status", "title", "content", "excerpt", "author",
+    "date", "date_gmt", "modified", "modified_gmt", "yoast_head_json",
+    "_links", "_embedded",
+)
+# Встроенные объекты, которые нужны маппингу: только термины (content_embedded_terms).
+CONTENT_EMBED = "wp:term"
+
+
 @dataclass
 class AuthorRow:
     site_id: str
@@ -45,6 +58,7 @@ class ContentRow:
     seo_description: Optional[str]
     seo_json: Optional[Dict[str, Any]]
     raw_json: Optional[Dict[str, Any]]
+    content_hash: Optional[str] = None  # sha256 исходного объекта WP (см. content_fingerprint)
 
 
 @dataclass
@@ -56,6 +70,16 @@ class ContentTermRow:
     wp_term_id: int
 
 
+@dataclass
+class MediaRow:
+    site_id: str
+    source_url: str
+    sha256: str
+    local_path: str  # относительно каталога зеркала медиа (wp.media)
+    size_bytes: int
+    mime_type: Optional[str]
+
+
 def _parse_iso(s: Optional[str]) -> Optional[datetime]:
     if not s:
         return None
@@ -143,6 +167,12 @@ def page_to_content(site_id: str, raw: Dict[str, Any]) -> ContentRow:
     return _raw_to_content(site_id, "page", raw)
 
 
+def content_fingerprint(raw: Dict[str, Any]) -> str:
+    """sha256 канонического JSON объекта WP: одинаковый ответ API — одинаковый отпечаток."""
+    canonical = json.dumps(raw, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
 def _raw_to_content(site_id: str, content_type: str, raw: Dict[str, Any]) -> ContentRow:
     wp_id = int(raw.get("id", 0))
     title = _rendered_str(raw, "title")
@@ -173,6 +203,7 @@ def _raw_to_content(site_id: str, content_type: str, raw: Dict[str, Any]) -> Con
         seo_description=seo_description,
         seo_json=seo_json,
         raw_json=raw,
+        content_hash=content_fingerprint(raw),
     )
 
 
@@ -0,0 +1,254 @@
+"""Зеркало медиафайлов WP: картинки постов и страниц скачиваются локально.
+
+URL берутся из `_embedded['wp:featuredmedia'][].source_url` и из `<img src>` /
+`srcset` в `content.rendered`. Зеркалятся только файлы сайта: тот же хост или
+путь `/wp-content/uploads/` (CDN-оффлоад), внешние картинки не трогаются.
+
+Файлы качаются параллельно (`concurrency` потоков) под лимитом запросов
+сайта (общий AdaptiveRateLimiter с API-клиентом) и хранятся по содержимому:
+`<каталог>/<sha256[:2]>/<sha256><ext>`. Один и тот же файл, встреченный по
+разным URL или на разных сайтах, лежит на диске один раз — как дедупликация
+по sha256 в `media-index.json` Telegram-экспорта. Скачанное записывается в
+wp_media (site_id, source_url -> local_path); при повторном прогоне URL, для
+которых запись есть и файл на месте, пропускаются. Ошибка загрузки не
+прерывает sync: URL не записывается и будет скачан следующим прогоном.
+При включённом зеркале посты и страницы запрашиваются без проекции
+`_fields`: featured media есть только в полном `_embed`.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import html
+import logging
+import mimetypes
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .client import _retry_delay, _should_retry
+from .mapper import MediaRow
+from .rate_limiter import AdaptiveRateLimiter
+
+logger = logging.getLogger("wp.media")
+
+MEDIA_MIRROR_ENV = "WP_MEDIA_MIRROR"  # 1/true — зеркалить медиа (переопределяет media_mirror в YAML)
+MEDIA_DIR_ENV = "WP_MEDIA_DIR"
+DEFAULT_MEDIA_CONCURRENCY = 4
+UPLOADS_PATH = "/wp-content/uploads/"
+CHUNK_SIZE = 256 * 1024
+
+_IMG_TAG = re.compile(r"<img\b[^>]*>", re.IGNORECASE)
+_ATTR = re.compile(r"""\b(src|srcset|data-src)\s*=\s*(["'])(.*?)\2""", re.IGNORECASE | re.DOTALL)
+_EXT = re.compile(r"^\.[a-z0-9]{1,5}$")
+
+
+def _normalize_url(url: str, base_url: str) -> Optional[str]:
+    url = html.unescape(url.strip())
+    if not url or url.startswith("data:"):
+        return None
+    parts = urlsplit(urljoin(base_url + "/", url))
+    if parts.scheme not in ("http", "https") or not parts.netloc:
+        return None
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, parts.query, ""))
+
+
+def _is_site_media(url: str, site_host: str) -> bool:
+    parts = urlsplit(url)
+    return parts.netloc.lower() == site_host or UPLOADS_PATH in parts.path
+
+
+def extract_media_urls(raw: Optional[Mapping[str, Any]], base_url: str) -> List[str]:
+    """URL медиа объекта WP: featured media и картинки из content.rendered (без повторов, в порядке появления)."""
+    if not raw:
+        return []
+    candidates: List[str] = []
+    embedded = raw.get("_embedded") or {}
+    for media in embedded.get("wp:featuredmedia") or []:
+        if isinstance(media, dict) and media.get("source_url"):
+            candidates.append(str(media["source_url"]))
+    content = raw.get("content")
+    rendered = content.get("rendered") if isinstance(content, dict) else None
+    for tag in _IMG_TAG.findall(rendered or ""):
+        for name, _, value in _ATTR.findall(tag):
+            if name.lower() == "srcset":
+                candidates.extend(item.strip().split(" ")[0] for item in value.split(",") if item.strip())
+            else:
+                candidates.append(value)
+    site_host = urlsplit(base_url).netloc.lower()
+    urls: Dict[str, None] = {}
+    for candidate in candidates:
+        url = _normalize_url(candidate, base_url)
+        if url and _is_site_media(url, site_host):
+            urls.setdefault(url)
+    return list(urls)
+
+
+def _extension(url: str, mime_type: Optional[str]) -> str:
+    ext = PurePosixPath(urlsplit(url).path).suffix.lower()
+    if _EXT.match(ext):
+        return ext
+    guessed = mimetypes.guess_extension(mime_type or "") if mime_type else None
+    return guessed or ""
+
+
+class MediaMirror:
+    """Загрузка медиа в каталог с адресацией по sha256.
+
+    Args:
+        directory: Корень зеркала (создаётся при необходимости).
+        concurrency: Сколько файлов качается одновременно.
+        timeout_sec: Таймаут одного запроса.
+        max_retries: Повторы на timeout / 429 / 5xx.
+        limiter: Лимит запросов сайта; None — без ограничения.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        concurrency: int = DEFAULT_MEDIA_CONCURRENCY,
+        timeout_sec: int = 30,
+        max_retries: int = 3,
+        limiter: Optional[AdaptiveRateLimiter] = None,
+    ) -> None:
+        self.directory = Path(directory)
+        self.concurrency = max(1, int(concurrency))
+        self.timeout_sec = timeout_sec
+        self.max_retries = max_retries
+        self.limiter = limiter
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=self.concurrency)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self._place_lock = threading.Lock()  # проверка «файл с этим sha256 уже есть» + перенос — атомарно
+        self.stats: Dict[str, int] = {
+            "urls": 0,
+            "skipped": 0,
+            "downloaded": 0,
+            "dedup_hits": 0,
+            "errors": 0,
+            "bytes": 0,
+        }
+
+    def close(self) -> None:
+        self._session.close()
+
+    def __enter__(self) -> "MediaMirror":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.stats[key] += n
+
+    def mirror(
+        self,
+        site_id: str,
+        urls: Iterable[str],
+        mirrored: Optional[Mapping[str, str]] = None,
+    ) -> List[MediaRow]:
+        """Скачать URL, которых ещё нет в зеркале. mirrored: source_url -> local_path из wp_media.
+
+        Возвращает строки для wp_media (только успешно скачанные в этом вызове).
+        """
+        pending: List[str] = []
+        for url in dict.fromkeys(urls):
+            self._count("urls")
+            local = (mirrored or {}).get(url)
+            if local and (self.directory / local).is_file():
+                self._count("skipped")
+                continue
+            pending.append(url)
+        if not pending:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(pending)), thread_name_prefix="wp-media") as pool:
+            results = list(pool.map(lambda url: self._mirror_one(site_id, url), pending))
+        return [row for row in results if row is not None]
+
+    def _mirror_one(self, site_id: str, url: str) -> Optional[MediaRow]:
+        try:
+            tmp, sha256, size, mime_type = self._download(url)
+        except (requests.RequestException, OSError) as e:
+            self._count("errors")
+            logger.warning("Медиа не скачано %s: %s", url, e, extra={"site_id": site_id})
+            return None
+        # Тот же sha256 мог прийти по URL с другим расширением — файл ищется по хешу, а не по имени.
+        with self._place_lock:
+            existing = next(iter(sorted((self.directory / sha256[:2]).glob(f"{sha256}*"))), None)
+            if existing is not None:
+                rel = f"{sha256[:2]}/{existing.name}"
+                tmp.unlink(missing_ok=True)
+            else:
+                rel = f"{sha256[:2]}/{sha256}{_extension(url, mime_type)}"
+                final = self.directory / rel
+                final.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp, final)
+        if existing is not None:
+            self._count("dedup_hits")
+        else:
+            self._count("downloaded")
+            self._count("bytes", size)
+        return MediaRow(
+            site_id=site_id,
+            source_url=url,
+            sha256=sha256,
+            local_path=rel,
+            size_bytes=size,
+            mime_type=mime_type,
+        )
+
+    def _download(self, url: str) -> Tuple[Path, str, int, Optional[str]]:
+        """Скачать во временный файл, считая sha256 на лету. Возвращает (tmp, sha256, размер, mime)."""
+        tmp_dir = self.directory / ".tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        for attempt in range(self.max_retries + 1):
+            if self.limiter is not None:
+                delay = self.limiter.reserve()
+                if delay > 0:
+                    time.sleep(delay)
+            try:
+                t0 = time.monotonic()
+                with self._session.get(url, timeout=self.timeout_sec, stream=True) as resp:
+                    if resp.status_code != 200:
+                        if _should_retry(resp.status_code, None):
+                            # 429 / 5xx — как у API-клиента: Retry-After и сигнал лимитеру сайта.
+                            delay = _retry_delay(self.limiter, resp.status_code, resp.headers, attempt)
+                            if attempt < self.max_retries:
+                                time.sleep(delay)
+                                continue
+                        raise requests.HTTPError(f"HTTP {resp.status_code}", response=resp)
+                    if self.limiter is not None:
+                        # Латентность — до заголовков ответа: время передачи тела зависит от размера файла.
+                        self.limiter.on_success(time.monotonic() - t0)
+                    mime_type = (resp.headers.get("Content-Type") or "").split(";")[0].strip() or None
+                    tmp = tmp_dir / f"{uuid.uuid4().hex}.part"
+                    h = hashlib.sha256()
+                    size = 0
+                    try:
+                        with tmp.open("wb") as f:
+                            for chunk in resp.iter_content(CHUNK_SIZE):
+                                h.update(chunk)
+                                f.write(chunk)
+                                size += len(chunk)
+                    except BaseException:
+                        tmp.unlink(missing_ok=True)
+                        raise
+                    return tmp, h.hexdigest(), size, mime_type
+            except (requests.Timeout, requests.ConnectionError):
+                delay = _retry_delay(self.limiter, None, None, attempt)
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(delay)
+        raise requests.RequestException(f"retries exhausted: {url}")
@@ -6,17 +6,34 @@
 Контракт документа контента:
   source, site_id, content_type, wp_id, slug, title, post_content, excerpt,
   status, author_id, published_at, modified_at, taxonomies, seo.
-Контракт summary: run_id, site_id, status, run_at, error_code, *_count.
+Контракт summary: run_id, site_id, status, run_at, error_code, *_count
+  (в т.ч. inserted/updated/unchanged_count — запись wp_content),
+  sync_mode, watermark (incremental), duration_sec, wait_sec, queued_sec (тайминги сайта в прогоне),
+  cache_hits, cache_misses (условные GET через HTTP-кэш; null — кэш выключен),
+  rate_limiter (статистика адаптивного темпа wp.rate_limiter; null — adaptive_rate выключен),
+  media (зеркало медиа wp.media: urls, skipped, downloaded, dedup_hits, errors, bytes; null — выключено).
 Отсутствующие поля отдаются как null.
+
+NDJSON (`--output-format ndjson`): документы контента по одному на строку по
+мере записи пачек, последней строкой — summary (тот же объект, что в JSON, но
+без массивов content) с полем "record": "summary". Уже выведенные документы
+валидны и при сбое посередине: их пачки записаны в БД.
 """
 
 from __future__ import annotations
 
+import threading
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, TextIO, Tuple
+
+from jsonio import dumps
 
 from .mapper import ContentRow, ContentTermRow, TermRow
 
+OUTPUT_FORMAT_JSON = "json"
+OUTPUT_FORMAT_NDJSON = "ndjson"
+OUTPUT_FORMATS = (OUTPUT_FORMAT_JSON, OUTPUT_FORMAT_NDJSON)
+
 
 def _terms_lookup(terms: List[TermRow]) -> Dict[Tuple[str, str, int], TermRow]:
     """(site_id, taxonomy, wp_term_id) -> TermRow."""
@@ -112,6 +129,18 @@ def summary_to_export_dict(summary: Dict[str, Any]) -> Dict[str, Any]:
         "pages_count": summary.get("pages_count", 0),
         "terms_count": summary.get("terms_count", 0),
         "authors_count": summary.get("authors_count", 0),
+        "inserted_count": summary.get("inserted_count", 0),
+        "updated_count": summary.get("updated_count", 0),
+        "unchanged_count": summary.get("unchanged_count", 0),
+        "sync_mode": summary.get("sync_mode"),
+        "watermark": summary.get("watermark"),
+        "duration_sec": summary.get("duration_sec"),
+        "wait_sec": summary.get("wait_sec"),
+        "queued_sec": summary.get("queued_sec"),
+        "cache_hits": summary.get("cache_hits"),
+        "cache_misses": summary.get("cache_misses"),
+        "rate_limiter": summary.get("rate_limiter"),
+        "media": summary.get("media"),
     }
 
 
@@ -134,9 +163,11 @@ def build_multisite_aggregated(
     run_id: str,
     exit_code: int,
     site_outputs: List[Dict[str, Any]],
+    timing: Optional[Dict[str, Any]] = None,
 ) -> Dict[str, Any]:
-    """Multi-site: один объект с run_id, status, totals и массивом sites.
+    """Multi-site: один объект с run_id, status, totals, timing и массивом sites.
     exit_code: 0=success, 2=partial, 1=failed.
+    timing: wall_sec прогона и max_concurrent_sites планировщика; суммы по сайтам считаются здесь.
     """
     status = "success" if exit_code == 0 else ("partial" if exit_code == 2 else "failed")
     success_count = sum(1 for s in site_outputs if s.get("status") == "success")
@@ -149,10 +180,50 @@ def build_multisite_aggregated(
         "pages_count": sum(s.get("pages_count", 0) for s in site_outputs),
         "terms_count": sum(s.get("terms_count", 0) for s in site_outputs),
         "authors_count": sum(s.get("authors_count", 0) for s in site_outputs),
+        "inserted_count": sum(s.get("inserted_count", 0) for s in site_outputs),
+        "updated_count": sum(s.get("updated_count", 0) for s in site_outputs),
+        "unchanged_count": sum(s.get("unchanged_count", 0) for s in site_outputs),
+        "cache_hits": sum(s.get("cache_hits") or 0 for s in site_outputs),
+        "cache_misses": sum(s.get("cache_misses") or 0 for s in site_outputs),
     }
-    return {
+    out: Dict[str, Any] = {
         "run_id": run_id,
         "status": status,
         "totals": totals,
-        "sites": site_outputs,
     }
+    if timing is not None:
+        out["timing"] = {
+            "wall_sec": timing.get("wall_sec"),
+            "max_concurrent_sites": timing.get("max_concurrent_sites"),
+            "sites_duration_sec": round(sum(s.get("duration_sec") or 0 for s in site_outputs), 2),
+            "sites_wait_sec": round(sum(s.get("wait_sec") or 0 for s in site_outputs), 2),
+        }
+    out["sites"] = site_outputs
+    return out
+
+
+class NdjsonWriter:
+    """Потоковый NDJSON-вывод: строка на документ, flush после каждой — потребитель читает сразу.
+
+    Сайты синхронизируются в своих потоках, запись строки идёт под lock.
+    """
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+        self.records = 0
+        self._lock = threading.Lock()
+
+    def write(self, doc: Dict[str, Any]) -> None:
+        line = dumps(doc) + "\n"
+        with self._lock:
+            self.stream.write(line)
+            self.stream.flush()
+            self.records += 1
+
+    def write_summary(self, out: Dict[str, Any]) -> None:
+        """Завершающая запись: summary сайта или агрегат multi-site, без массивов content."""
+        record: Dict[str, Any] = {"record": "summary"}
+        record.update({k: v for k, v in out.items() if k != "content"})
+        if isinstance(record.get("sites"), list):
+            record["sites"] = [{k: v for k, v in s.items() if k != "content"} for s in record["sites"]]
+        self.write(record)
@@ -0,0 +1,191 @@
+"""Лимит запросов к сайту WP: равномерные слоты и адаптивный (AIMD) темп.
+
+AdaptiveRateLimiter выдаёт потокам клиента моменты запросов не чаще `rate`
+в секунду. С adaptive=True темп подстраивается под сайт:
+
+- каждые `EVAL_EVERY` успешных ответов, если p95 латентности не выше
+  `P95_TARGET_SEC` и доля ошибок в окне не выше `ERROR_RATE_MAX`, темп растёт
+  на `RATE_INCREASE` (до `max_rate`);
+- 429, 5xx и timeout вдвое снижают темп (не ниже `min_rate`).
+
+Retry-After в любом режиме ставит на паузу все потоки клиента, а не только
+повторяющий. Без adaptive темп фиксирован (прежнее поведение), статистика
+всё равно собирается. Выученный темп сохраняется между запусками в RateStateStore
+(`data/wp_rate_state.json`) по site_id.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Optional
+
+logger = logging.getLogger("wp.rate_limiter")
+
+ADAPTIVE_RATE_ENV = "WP_ADAPTIVE_RATE"  # 1/true — адаптивный темп (переопределяет adaptive_rate в YAML)
+RATE_STATE_PATH_ENV = "WP_RATE_STATE_PATH"
+
+DEFAULT_MAX_RATE = 10.0
+DEFAULT_MIN_RATE = 0.2
+RATE_INCREASE = 0.5  # запросов/с за одно повышение
+RATE_DECREASE = 0.5  # множитель при 429/5xx/timeout
+EVAL_EVERY = 20  # успешных ответов между повышениями
+WINDOW = 50  # ответов в окне для p95 и доли ошибок
+P95_TARGET_SEC = 2.0
+ERROR_RATE_MAX = 0.05
+RETRY_AFTER_CAP_SEC = 60.0
+
+
+class AdaptiveRateLimiter:
+    """Потокобезопасный лимит запросов одного сайта.
+
+    Args:
+        rate: Начальный темп, запросов в секунду.
+        adaptive: Подстраивать темп по латентности и ошибкам.
+        max_rate: Потолок темпа (adaptive).
+        min_rate: Нижняя граница темпа после снижений (adaptive).
+        clock: Источник монотонного времени (для тестов).
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        adaptive: bool = False,
+        max_rate: float = DEFAULT_MAX_RATE,
+        min_rate: float = DEFAULT_MIN_RATE,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        rate = max(float(rate), 0.1)
+        self.adaptive = adaptive
+        self.max_rate = max(float(max_rate), rate) if adaptive else rate
+        self.min_rate = min(float(min_rate), rate)
+        self.rate = rate
+        self.initial_rate = rate
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._last_slot = 0.0
+        self._paused_until = 0.0
+        self._latencies: Deque[float] = deque(maxlen=WINDOW)
+        self._outcomes: Deque[bool] = deque(maxlen=WINDOW)  # True — ошибка
+        self._since_eval = 0
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.rate_increases = 0
+        self.rate_decreases = 0
+        self.retry_after_pauses = 0
+
+    @property
+    def min_delay(self) -> float:
+        return 1.0 / self.rate
+
+    def reserve(self) -> float:
+        """Сколько ждать до своего запроса; слот резервируется сразу (с учётом паузы Retry-After)."""
+        with self._lock:
+            now = self._clock()
+            slot = max(now, self._last_slot + 1.0 / self.rate, self._paused_until)
+            self._last_slot = slot
+            return slot - now
+
+    def on_success(self, latency_sec: float) -> None:
+        with self._lock:
+            self.requests += 1
+            self._latencies.append(latency_sec)
+            self._outcomes.append(False)
+            if not self.adaptive:
+                return
+            self._since_eval += 1
+            if self._since_eval < EVAL_EVERY:
+                return
+            self._since_eval = 0
+            p95 = self._p95()
+            error_rate = sum(self._outcomes) / len(self._outcomes)
+            if p95 is not None and p95 <= P95_TARGET_SEC and error_rate <= ERROR_RATE_MAX and self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + RATE_INCREASE)
+                self.rate_increases += 1
+
+    def on_error(self, status_code: Optional[int] = None, retry_after: Optional[float] = None) -> None:
+        """429 / 5xx / timeout (status_code=None): снизить темп; Retry-After — пауза для всех потоков."""
+        with self._lock:
+            self.requests += 1
+            self.errors += 1
+            self._outcomes.append(True)
+            if status_code == 429:
+                self.throttled += 1
+            if retry_after is not None and retry_after > 0:
+                self._paused_until = max(self._paused_until, self._clock() + min(float(retry_after), RETRY_AFTER_CAP_SEC))
+                self.retry_after_pauses += 1
+            if not self.adaptive:
+                return
+            self._since_eval = 0
+            old = self.rate
+            self.rate = max(self.min_rate, self.rate * RATE_DECREASE)
+            if self.rate < old:
+                self.rate_decreases += 1
+        if self.adaptive:
+            logger.info("Темп снижен %.2f -> %.2f req/s (status=%s)", old, self.rate, status_code)
+
+    def _p95(self) -> Optional[float]:
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            p95 = self._p95()
+            return {
+                "adaptive": self.adaptive,
+                "rate_per_sec": round(self.rate, 3),
+                "initial_rate_per_sec": round(self.initial_rate, 3),
+                "max_rate_per_sec": round(self.max_rate, 3),
+                "requests": self.requests,
+                "errors": self.errors,
+                "throttled": self.throttled,
+                "rate_increases": self.rate_increases,
+                "rate_decreases": self.rate_decreases,
+                "retry_after_pauses": self.retry_after_pauses,
+                "p95_latency_sec": round(p95, 3) if p95 is not None else None,
+            }
+
+
+class RateStateStore:
+    """Выученный темп по сайтам между запусками: site_id -> rate_per_sec (JSON-файл)."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            data = {}
+        sites = data.get("sites") if isinstance(data, dict) else None
+        self._sites: Dict[str, Dict[str, Any]] = dict(sites) if isinstance(sites, dict) else {}
+
+    def get(self, site_id: str) -> Optional[float]:
+        record = self._sites.get(site_id)
+        try:
+            rate = float(record["rate_per_sec"]) if isinstance(record, dict) else None
+        except (KeyError, TypeError, ValueError):
+            return None
+        return rate if rate and rate > 0 else None
+
+    def set(self, site_id: str, rate: float) -> None:
+        with self._lock:
+            self._sites[site_id] = {
+                "rate_per_sec": round(rate, 3),
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+            }
+            self.save()
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps({"sites": self._sites}, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, self.path)
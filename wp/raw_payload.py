@@ -0,0 +1,110 @@
+"""Политика хранения исходного JSON объектов WP (колонка raw_json).
+
+- full — ответ API как есть (по умолчанию, прежнее поведение);
+- slim — без `_links`, `_embedded` и HTML `yoast_head`: авторы, термины и
+  SEO уже разложены по таблицам и колонкам. Sync при slim запрашивает посты и
+  страницы с проекцией `_fields` (см. needs_full_payload), поэтому в raw_json
+  остаются только поля, которые читает маппинг;
+- compressed — полный ответ сжатым blob в wp_content.raw_json_z (zstd, если
+  установлен `zstandard`, иначе gzip), raw_json = NULL. Авторы и термины
+  в этом режиме пишутся как slim: отдельной blob-колонки у них нет.
+
+Горячие колонки (title, slug, status, даты, seo_*) и content_hash считаются
+по ответу API до применения политики. В wp_content.content_hash пишется
+отпечаток с учётом политики (stored_content_hash): после смены
+raw_json_policy неизменённые строки один раз переписываются в новом формате.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+from typing import Any, Dict, Optional, Tuple
+
+from jsonio import dumps_bytes, loads
+
+try:
+    import zstandard
+except ImportError:  # zstandard — необязательная зависимость
+    zstandard = None
+
+RAW_JSON_POLICY_ENV = "WP_RAW_JSON_POLICY"
+RAW_POLICY_FULL = "full"
+RAW_POLICY_SLIM = "slim"
+RAW_POLICY_COMPRESSED = "compressed"
+RAW_POLICIES = (RAW_POLICY_FULL, RAW_POLICY_SLIM, RAW_POLICY_COMPRESSED)
+
+# Ключи ответа WP, которые slim отбрасывает.
+SLIM_DROP_KEYS = ("_links", "_embedded", "yoast_head")
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+ZSTD_LEVEL = 3
+
+
+def slim_payload(raw: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Копия объекта без `_links`, `_embedded` и `yoast_head` (исходный dict не меняется)."""
+    if raw is None:
+        return None
+    return {k: v for k, v in raw.items() if k not in SLIM_DROP_KEYS}
+
+
+def compress_payload(raw: Dict[str, Any]) -> bytes:
+    """JSON объекта -> zstd (если доступен) или gzip. Формат распознаётся по magic bytes."""
+    data = dumps_bytes(raw)
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return gzip.compress(data, mtime=0)
+
+
+def decompress_payload(blob: bytes) -> Dict[str, Any]:
+    """Blob из raw_json_z -> dict. ValueError, если формат не распознан или zstandard не установлен."""
+    blob = bytes(blob)
+    if blob.startswith(_GZIP_MAGIC):
+        data = gzip.decompress(blob)
+    elif blob.startswith(_ZSTD_MAGIC):
+        if zstandard is None:
+            raise ValueError("raw_json_z сжат zstd: установите пакет zstandard")
+        data = zstandard.ZstdDecompressor().decompress(blob)
+    else:
+        raise ValueError("raw_json_z: неизвестный формат сжатия")
+    return loads(data)
+
+
+def needs_full_payload(policy: str) -> bool:
+    """full и compressed архивируют ответ API целиком; slim обходится проекцией `_fields`."""
+    return policy != RAW_POLICY_SLIM
+
+
+def prepare_raw(
+    raw: Optional[Dict[str, Any]],
+    policy: str = RAW_POLICY_FULL,
+    compressible: bool = True,
+) -> Tuple[Optional[Dict[str, Any]], Optional[bytes]]:
+    """Значения для (raw_json, raw_json_z) по политике.
+
+    compressible=False — у таблицы нет blob-колонки: compressed пишется как slim.
+    """
+    if raw is None or policy == RAW_POLICY_FULL:
+        return raw, None
+    if policy == RAW_POLICY_COMPRESSED and compressible:
+        return None, compress_payload(raw)
+    if policy in (RAW_POLICY_SLIM, RAW_POLICY_COMPRESSED):
+        return slim_payload(raw), None
+    raise ValueError(f"Неизвестная политика raw_json '{policy}': допустимо {', '.join(RAW_POLICIES)}.")
+
+
+def stored_content_hash(content_hash: Optional[str], policy: str = RAW_POLICY_FULL) -> Optional[str]:
+    """content_hash для wp_content: у slim/compressed в отпечаток подмешана политика, у full — как есть."""
+    if content_hash is None or policy == RAW_POLICY_FULL:
+        return content_hash
+    return hashlib.sha256(f"{policy}:{content_hash}".encode("ascii")).hexdigest()
+
+
+def load_raw_payload(raw_json: Any, raw_json_z: Optional[bytes]) -> Optional[Dict[str, Any]]:
+    """Прочитать исходный объект из строки wp_content: raw_json (dict или JSON-строка SQLite) или raw_json_z."""
+    if raw_json_z is not None:
+        return decompress_payload(raw_json_z)
+    if isinstance(raw_json, (str, bytes)):
+        return loads(raw_json)
+    return raw_json
@@ -5,18 +5,33 @@ from __future__ import annotations
 import logging
 import os
 import sqlite3
+import time
 from contextlib import contextmanager
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Iterator, List, Optional, Union
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
-from .mapper import AuthorRow, ContentRow, ContentTermRow, TermRow
+from errors import WP_INCREMENTAL_STATE_ERROR
+
+from .mapper import AuthorRow, ContentRow, ContentTermRow, MediaRow, TermRow
+from .raw_payload import RAW_POLICY_FULL, prepare_raw, stored_content_hash
 
 logger = logging.getLogger("wp.storage")
 
 STORAGE_BACKEND_ENV = "WP_STORAGE_BACKEND"
 STORAGE_FALLBACK_ENV = "WP_STORAGE_FALLBACK"  # auto | off (по умолчанию off — fail fast при недоступности Postgres)
 DATABASE_URL_ENV = "WP_DATABASE_URL"
+BATCH_SIZE_ENV = "WP_STORAGE_BATCH_SIZE"  # строк на один multi-row INSERT
+DEFAULT_BATCH_SIZE = 500
+
+# Условие DO UPDATE для wp_content: переписывать только при смене отпечатка (строки без отпечатка — всегда).
+CONTENT_CHANGED_PG = "EXCLUDED.content_hash IS NULL OR wp_content.content_hash IS DISTINCT FROM EXCLUDED.content_hash"
+
+
+class SyncStateError(Exception):
+    """Ошибка чтения/записи wp_sync_state (watermark incremental sync)."""
+
+    error_code = WP_INCREMENTAL_STATE_ERROR
 
 
 def _pg_connect():
@@ -131,134 +146,213 @@ def upsert_site(
         )
 
 
+def get_batch_size() -> int:
+    """Строк на один multi-row INSERT (WP_STORAGE_BATCH_SIZE, по умолчанию 500)."""
+    raw = (os.environ.get(BATCH_SIZE_ENV) or "").strip()
+    try:
+        return max(1, int(raw)) if raw else DEFAULT_BATCH_SIZE
+    except ValueError:
+        logger.warning("%s=%r не число, используется %s", BATCH_SIZE_ENV, raw, DEFAULT_BATCH_SIZE)
+        return DEFAULT_BATCH_SIZE
+
+
+def _dedupe(rows: List[Any], key: Callable[[Any], Tuple]) -> List[Any]:
+    """Последняя версия строки на ключ: один INSERT ... ON CONFLICT не может обновить строку дважды."""
+    by_key: Dict[Tuple, Any] = {}
+    for r in rows:
+        by_key[key(r)] = r
+    return list(by_key.values())
+
+
+def log_write(
+    table: str,
+    site_id: str,
+    rows: int,
+    t0: float,
+    batch_size: int,
+    counts: Optional[Dict[str, int]] = None,
+) -> None:
+    """Итог записи таблицы: строк, пачек, строк/сек (и inserted/updated/unchanged, если известны)."""
+    elapsed = time.monotonic() - t0
+    logger.info(
+        "DB write %s site_id=%s rows=%s batches=%s elapsed_sec=%.3f rows_per_sec=%s%s",
+        table,
+        site_id,
+        rows,
+        -(-rows // batch_size),
+        elapsed,
+        int(rows / elapsed) if elapsed > 0 else rows,
+        "".join(f" {k}={v}" for k, v in (counts or {}).items()),
+        extra={"site_id": site_id},
+    )
+
+
+def _pg_upsert(
+    conn: object,
+    table: str,
+    columns: Sequence[str],
+    conflict: Sequence[str],
+    update: Sequence[str],
+    values: List[Tuple],
+    batch_size: int,
+    where: Optional[str] = None,
+    returning: Optional[str] = None,
+) -> List[Tuple]:
+    """Multi-row INSERT ... ON CONFLICT DO UPDATE пачками по batch_size (psycopg2 execute_values).
+
+    where: условие DO UPDATE (строка, не прошедшая его, не переписывается и не попадает в RETURNING).
+    returning: выражение RETURNING — тогда возвращаются строки всех пачек.
+    """
+    import psycopg2.extras
+
+    sql = (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s "
+        f"ON CONFLICT ({', '.join(conflict)}) DO UPDATE SET "
+        + ", ".join(f"{c} = EXCLUDED.{c}" for c in update)
+    )
+    if where:
+        sql += f" WHERE {where}"
+    if returning:
+        sql += f" RETURNING {returning}"
+    with conn.cursor() as cur:
+        result = psycopg2.extras.execute_values(cur, sql, values, page_size=batch_size, fetch=bool(returning))
+    return result or []
+
+
 def upsert_authors(
     conn: Union[object, sqlite3.Connection],
     rows: List[AuthorRow],
     synced_at: datetime,
+    raw_policy: str = RAW_POLICY_FULL,
 ) -> None:
     if isinstance(conn, sqlite3.Connection):
-        return _get_sqlite().upsert_authors(conn, rows, synced_at)
+        return _get_sqlite().upsert_authors(conn, rows, synced_at, raw_policy)
     if not rows:
         return
     site_id = rows[0].site_id if rows else ""
     logger.debug("upsert_authors site_id=%s count=%s", site_id, len(rows), extra={"site_id": site_id})
-    with conn.cursor() as cur:
-        for r in rows:
-            cur.execute(
-                """
-                INSERT INTO wp_authors (site_id, wp_user_id, login, name, slug, raw_json, synced_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (site_id, wp_user_id) DO UPDATE SET
-                    login = EXCLUDED.login,
-                    name = EXCLUDED.name,
-                    slug = EXCLUDED.slug,
-                    raw_json = EXCLUDED.raw_json,
-                    synced_at = EXCLUDED.synced_at
-                """,
-                (
-                    r.site_id,
-                    r.wp_user_id,
-                    r.login,
-                    r.name,
-                    r.slug,
-                    _pg_json(r.raw_json),
-                    synced_at,
-                ),
+    t0 = time.monotonic()
+    batch_size = get_batch_size()
+    rows = _dedupe(rows, lambda r: (r.site_id, r.wp_user_id))
+    _pg_upsert(
+        conn,
+        "wp_authors",
+        ("site_id", "wp_user_id", "login", "name", "slug", "raw_json", "synced_at"),
+        ("site_id", "wp_user_id"),
+        ("login", "name", "slug", "raw_json", "synced_at"),
+        [
+            (
+                r.site_id, r.wp_user_id, r.login, r.name, r.slug,
+                _pg_json(prepare_raw(r.raw_json, raw_policy, compressible=False)[0]), synced_at,
             )
+            for r in rows
+        ],
+        batch_size,
+    )
+    log_write("wp_authors", site_id, len(rows), t0, batch_size)
 
 
 def upsert_terms(
     conn: Union[object, sqlite3.Connection],
     rows: List[TermRow],
     synced_at: datetime,
+    raw_policy: str = RAW_POLICY_FULL,
 ) -> None:
     if isinstance(conn, sqlite3.Connection):
-        return _get_sqlite().upsert_terms(conn, rows, synced_at)
+        return _get_sqlite().upsert_terms(conn, rows, synced_at, raw_policy)
     if not rows:
         return
     site_id = rows[0].site_id if rows else ""
     logger.debug("upsert_terms site_id=%s count=%s", site_id, len(rows), extra={"site_id": site_id})
-    with conn.cursor() as cur:
-        for r in rows:
-            cur.execute(
-                """
-                INSERT INTO wp_terms (site_id, taxonomy, wp_term_id, name, slug, parent_id, raw_json, synced_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (site_id, taxonomy, wp_term_id) DO UPDATE SET
-                    name = EXCLUDED.name,
-                    slug = EXCLUDED.slug,
-                    parent_id = EXCLUDED.parent_id,
-                    raw_json = EXCLUDED.raw_json,
-                    synced_at = EXCLUDED.synced_at
-                """,
-                (
-                    r.site_id,
-                    r.taxonomy,
-                    r.wp_term_id,
-                    r.name,
-                    r.slug,
-                    r.parent_id,
-                    _pg_json(r.raw_json),
-                    synced_at,
-                ),
+    t0 = time.monotonic()
+    batch_size = get_batch_size()
+    rows = _dedupe(rows, lambda r: (r.site_id, r.taxonomy, r.wp_term_id))
+    _pg_upsert(
+        conn,
+        "wp_terms",
+        ("site_id", "taxonomy", "wp_term_id", "name", "slug", "parent_id", "raw_json", "synced_at"),
+        ("site_id", "taxonomy", "wp_term_id"),
+        ("name", "slug", "parent_id", "raw_json", "synced_at"),
+        [
+            (
+                r.site_id, r.taxonomy, r.wp_term_id, r.name, r.slug, r.parent_id,
+                _pg_json(prepare_raw(r.raw_json, raw_policy, compressible=False)[0]), synced_at,
             )
+            for r in rows
+        ],
+        batch_size,
+    )
+    log_write("wp_terms", site_id, len(rows), t0, batch_size)
 
 
 def upsert_content(
     conn: Union[object, sqlite3.Connection],
     rows: List[ContentRow],
     synced_at: datetime,
-) -> None:
+    raw_policy: str = RAW_POLICY_FULL,
+) -> Dict[str, int]:
+    """Upsert wp_content. Строка с тем же content_hash не переписывается (ни WAL, ни dead tuple).
+
+    raw_policy: full | slim | compressed — что писать в raw_json / raw_json_z (см. wp.raw_payload).
+    Политика входит в записываемый отпечаток: после её смены строка переписывается один раз.
+
+    Returns:
+        {"inserted": N, "updated": N, "unchanged": N}.
+    """
     if isinstance(conn, sqlite3.Connection):
-        return _get_sqlite().upsert_content(conn, rows, synced_at)
+        return _get_sqlite().upsert_content(conn, rows, synced_at, raw_policy)
     if not rows:
-        return
+        return {"inserted": 0, "updated": 0, "unchanged": 0}
     site_id = rows[0].site_id if rows else ""
     logger.debug("upsert_content site_id=%s count=%s", site_id, len(rows), extra={"site_id": site_id})
-    with conn.cursor() as cur:
-        for r in rows:
-            cur.execute(
-                """
-                INSERT INTO wp_content (
-                    site_id, content_type, wp_id, title, slug, post_content, excerpt,
-                    status, author_id, published_at, modified_at,
-                    seo_title, seo_description, seo_json, raw_json, synced_at
-                )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (site_id, content_type, wp_id) DO UPDATE SET
-                    title = EXCLUDED.title,
-                    slug = EXCLUDED.slug,
-                    post_content = EXCLUDED.post_content,
-                    excerpt = EXCLUDED.excerpt,
-                    status = EXCLUDED.status,
-                    author_id = EXCLUDED.author_id,
-                    published_at = EXCLUDED.published_at,
-                    modified_at = EXCLUDED.modified_at,
-                    seo_title = EXCLUDED.seo_title,
-                    seo_description = EXCLUDED.seo_description,
-                    seo_json = EXCLUDED.seo_json,
-                    raw_json = EXCLUDED.raw_json,
-                    synced_at = EXCLUDED.synced_at
-                """,
-                (
-                    r.site_id,
-                    r.content_type,
-                    r.wp_id,
-                    r.title,
-                    r.slug,
-                    r.post_content,
-                    r.excerpt,
-                    r.status,
-                    r.author_id,
-                    _ts(r.published_at),
-                    _ts(r.modified_at),
-                    r.seo_title,
-                    r.seo_description,
-                    _pg_json(r.seo_json),
-                    _pg_json(r.raw_json),
-                    synced_at,
-                ),
+    t0 = time.monotonic()
+    batch_size = get_batch_size()
+    rows = _dedupe(rows, lambda r: (r.site_id, r.content_type, r.wp_id))
+    raws = [prepare_raw(r.raw_json, raw_policy) for r in rows]
+    written = _pg_upsert(
+        conn,
+        "wp_content",
+        (
+            "site_id", "content_type", "wp_id", "title", "slug", "post_content", "excerpt",
+            "status", "author_id", "published_at", "modified_at",
+            "seo_title", "seo_description", "seo_json", "raw_json", "raw_json_z", "synced_at", "content_hash",
+        ),
+        ("site_id", "content_type", "wp_id"),
+        (
+            "title", "slug", "post_content", "excerpt", "status", "author_id", "published_at", "modified_at",
+            "seo_title", "seo_description", "seo_json", "raw_json", "raw_json_z", "synced_at", "content_hash",
+        ),
+        [
+            (
+                r.site_id,
+                r.content_type,
+                r.wp_id,
+                r.title,
+                r.slug,
+                r.post_content,
+                r.excerpt,
+                r.status,
+                r.author_id,
+                _ts(r.published_at),
+                _ts(r.modified_at),
+                r.seo_title,
+                r.seo_description,
+                _pg_json(r.seo_json),
+                _pg_json(raw_json),
+                raw_json_z,
+                synced_at,
+                stored_content_hash(r.content_hash, raw_policy),
             )
+            for r, (raw_json, raw_json_z) in zip(rows, raws)
+        ],
+        batch_size,
+        where=CONTENT_CHANGED_PG,
+        returning="(xmax = 0) AS inserted",
+    )
+    inserted = sum(1 for (is_new,) in written if is_new)
+    counts = {"inserted": inserted, "updated": len(written) - inserted, "unchanged": len(rows) - len(written)}
+    log_write("wp_content", site_id, len(rows), t0, batch_size, counts)
+    return counts
 
 
 def upsert_content_terms(
@@ -272,17 +366,63 @@ def upsert_content_terms(
         return
     site_id = rows[0].site_id if rows else ""
     logger.debug("upsert_content_terms site_id=%s count=%s", site_id, len(rows), extra={"site_id": site_id})
+    t0 = time.monotonic()
+    batch_size = get_batch_size()
+    rows = _dedupe(rows, lambda r: (r.site_id, r.content_type, r.wp_content_id, r.taxonomy, r.wp_term_id))
+    _pg_upsert(
+        conn,
+        "wp_content_terms",
+        ("site_id", "content_type", "wp_content_id", "taxonomy", "wp_term_id", "synced_at"),
+        ("site_id", "content_type", "wp_content_id", "taxonomy", "wp_term_id"),
+        ("synced_at",),
+        [(r.site_id, r.content_type, r.wp_content_id, r.taxonomy, r.wp_term_id, synced_at) for r in rows],
+        batch_size,
+    )
+    log_write("wp_content_terms", site_id, len(rows), t0, batch_size)
+
+
+def upsert_media(
+    conn: Union[object, sqlite3.Connection],
+    rows: List[MediaRow],
+    synced_at: datetime,
+) -> None:
+    """Записать скачанные медиа (wp.media): source_url -> local_path, sha256."""
+    if isinstance(conn, sqlite3.Connection):
+        return _get_sqlite().upsert_media(conn, rows, synced_at)
+    if not rows:
+        return
+    site_id = rows[0].site_id
+    t0 = time.monotonic()
+    batch_size = get_batch_size()
+    rows = _dedupe(rows, lambda r: (r.site_id, r.source_url))
+    _pg_upsert(
+        conn,
+        "wp_media",
+        ("site_id", "source_url", "sha256", "local_path", "size_bytes", "mime_type", "synced_at"),
+        ("site_id", "source_url"),
+        ("sha256", "local_path", "size_bytes", "mime_type", "synced_at"),
+        [(r.site_id, r.source_url, r.sha256, r.local_path, r.size_bytes, r.mime_type, synced_at) for r in rows],
+        batch_size,
+    )
+    log_write("wp_media", site_id, len(rows), t0, batch_size)
+
+
+def get_mirrored_media(
+    conn: Union[object, sqlite3.Connection],
+    site_id: str,
+    urls: Sequence[str],
+) -> Dict[str, str]:
+    """Уже зеркалированные URL сайта: source_url -> local_path (только из переданных urls)."""
+    if isinstance(conn, sqlite3.Connection):
+        return _get_sqlite().get_mirrored_media(conn, site_id, urls)
+    if not urls:
+        return {}
     with conn.cursor() as cur:
-        for r in rows:
-            cur.execute(
-                """
-                INSERT INTO wp_content_terms (site_id, content_type, wp_content_id, taxonomy, wp_term_id, synced_at)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                ON CONFLICT (site_id, content_type, wp_content_id, taxonomy, wp_term_id) DO UPDATE SET
-                    synced_at = EXCLUDED.synced_at
-                """,
-                (r.site_id, r.content_type, r.wp_content_id, r.taxonomy, r.wp_term_id, synced_at),
-            )
+        cur.execute(
+            "SELECT source_url, local_path FROM wp_media WHERE site_id = %s AND source_url = ANY(%s)",
+            (site_id, list(urls)),
+        )
+        return {row[0]: row[1] for row in cur.fetchall()}
 
 
 def insert_sync_run(
@@ -342,3 +482,64 @@ def update_sync_run(
             ),
         )
         return cur.rowcount
+
+
+def _parse_state_ts(value: Any) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return _ts(value)
+    try:
+        return _ts(datetime.fromisoformat(str(value)))
+    except ValueError as e:
+        raise SyncStateError(f"wp_sync_state: невалидная дата {value!r}") from e
+
+
+def get_sync_state(
+    conn: Union[object, sqlite3.Connection],
+    site_id: str,
+) -> Optional[Dict[str, Any]]:
+    """Watermark сайта: {last_modified_gmt (aware UTC | None), last_run_id, updated_at} или None, если записи нет."""
+    if isinstance(conn, sqlite3.Connection):
+        row = _get_sqlite().get_sync_state(conn, site_id)
+    else:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT last_modified_gmt, last_run_id, updated_at FROM wp_sync_state WHERE site_id = %s",
+                (site_id,),
+            )
+            found = cur.fetchone()
+        row = None if found is None else {
+            "last_modified_gmt": found[0],
+            "last_run_id": found[1],
+            "updated_at": found[2],
+        }
+    if row is None:
+        return None
+    return {
+        "last_modified_gmt": _parse_state_ts(row["last_modified_gmt"]),
+        "last_run_id": row["last_run_id"],
+        "updated_at": _parse_state_ts(row["updated_at"]),
+    }
+
+
+def upsert_sync_state(
+    conn: Union[object, sqlite3.Connection],
+    site_id: str,
+    last_modified_gmt: Optional[datetime],
+    run_id: str,
+) -> None:
+    """Сдвинуть watermark сайта. Вызывать только после того, как весь контент прогона закоммичен."""
+    if isinstance(conn, sqlite3.Connection):
+        return _get_sqlite().upsert_sync_state(conn, site_id, last_modified_gmt, run_id)
+    logger.debug("upsert_sync_state site_id=%s", site_id, extra={"site_id": site_id})
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO wp_sync_state (site_id, last_modified_gmt, last_run_id, updated_at)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (site_id) DO UPDATE SET
+                last_modified_gmt = EXCLUDED.last_modified_gmt,
+                last_run_id = EXCLUDED.last_run_id,
+                updated_at = EXCLUDED.updated_at
+            """,
+            (site_id, _ts(last_modified_gmt), run_id, datetime.now(timezone.utc)),
+        )
@@ -2,21 +2,26 @@
 
 from __future__ import annotations
 
-import json
 import logging
 import os
 import sqlite3
+import time
 from contextlib import contextmanager
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Iterator, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
 
-from .mapper import AuthorRow, ContentRow, ContentTermRow, TermRow
+from jsonio import dumps
+
+from .mapper import AuthorRow, ContentRow, ContentTermRow, MediaRow, TermRow
+from .raw_payload import RAW_POLICY_FULL, prepare_raw, stored_content_hash
+from .storage import get_batch_size, log_write
 
 logger = logging.getLogger("wp.storage.sqlite")
 
 STORAGE_PATH_ENV = "WP_STORAGE_PATH"
 SQLITE_DEFAULT_NAME = "wp_sync.db"
+SQLITE_BUSY_TIMEOUT_SEC = 30
 
 
 def get_sqlite_path(project_root: Optional[Path] = None) -> Path:
@@ -32,7 +37,8 @@ def get_sqlite_path(project_root: Optional[Path] = None) -> Path:
 def get_connection(project_root: Optional[Path] = None) -> Iterator[sqlite3.Connection]:
     path = get_sqlite_path(project_root)
     path.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(str(path))
+    # Сайты синхронизируются параллельно: писатель ждёт освобождения файла, а не падает с "database is locked".
+    conn = sqlite3.connect(str(path), timeout=SQLITE_BUSY_TIMEOUT_SEC)
     conn.execute("PRAGMA foreign_keys = ON")
     try:
         _ensure_schema(conn)
@@ -45,22 +51,54 @@ def get_connection(project_root: Optional[Path] = None) -> Iterator[sqlite3.Conn
         conn.close()
 
 
-def _ensure_schema(conn: sqlite3.Connection) -> None:
-    cur = conn.execute(
+# Версия схемы — номер последней применённой миграции (PRAGMA user_version).
+# Базы, созданные до учёта версий, содержат 001–006.
+_LEGACY_SCHEMA_VERSION = 6
+
+
+def _migration_files() -> List[Tuple[int, Path]]:
+    migrations_dir = Path(__file__).resolve().parent.parent / "migrations" / "wp" / "sqlite"
+    return [(int(p.name.split("_", 1)[0]), p) for p in sorted(migrations_dir.glob("*.sql"))]
+
+
+def _schema_version(conn: sqlite3.Connection) -> int:
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version == 0 and conn.execute(
         "SELECT name FROM sqlite_master WHERE type='table' AND name='wp_sites'"
-    )
-    if cur.fetchone():
+    ).fetchone():
+        return _LEGACY_SCHEMA_VERSION
+    return version
+
+
+def _apply_migration(conn: sqlite3.Connection, path: Path) -> None:
+    sql = path.read_text(encoding="utf-8").strip()
+    for stmt in sql.split(";"):
+        stmt = stmt.strip()
+        # Убрать ведущие строки-комментарии
+        while stmt and stmt.split("\n")[0].strip().startswith("--"):
+            stmt = "\n".join(stmt.split("\n")[1:]).strip()
+        if stmt and not stmt.startswith("--"):
+            conn.execute(stmt)
+
+
+def _ensure_schema(conn: sqlite3.Connection) -> None:
+    """Применить недостающие миграции из migrations/wp/sqlite/ (новая база — все, старая — только новые)."""
+    migrations = _migration_files()
+    if not migrations or _schema_version(conn) >= migrations[-1][0]:
         return
-    migrations_dir = Path(__file__).resolve().parent.parent / "migrations" / "wp" / "sqlite"
-    for name in sorted(migrations_dir.glob("*.sql")):
-        sql = name.read_text(encoding="utf-8").strip()
-        for stmt in sql.split(";"):
-            stmt = stmt.strip()
-            # Убрать ведущие строки-комментарии
-            while stmt and stmt.split("\n")[0].strip().startswith("--"):
-                stmt = "\n".join(stmt.split("\n")[1:]).strip()
-            if stmt and not stmt.startswith("--"):
-                conn.execute(stmt)
+    # Несколько потоков/процессов: миграции применяет тот, кто первым взял блокировку записи.
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = _schema_version(conn)
+        for number, path in migrations:
+            if number > version:
+                _apply_migration(conn, path)
+                version = number
+        conn.execute(f"PRAGMA user_version = {version}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
 
 
 def _ts(d: Optional[datetime]) -> Optional[str]:
@@ -74,7 +112,13 @@ def _ts(d: Optional[datetime]) -> Optional[str]:
 def _json_val(obj) -> Optional[str]:
     if obj is None:
         return None
-    return json.dumps(obj, ensure_ascii=False)
+    return dumps(obj)
+
+
+def _executemany(conn: sqlite3.Connection, sql: str, values: List[tuple], batch_size: int) -> None:
+    """executemany пачками по batch_size: один подготовленный statement на всю таблицу."""
+    for i in range(0, len(values), batch_size):
+        conn.executemany(sql, values[i:i + batch_size])
 
 
 def upsert_site(
@@ -102,79 +146,154 @@ def upsert_authors(
     conn: sqlite3.Connection,
     rows: List[AuthorRow],
     synced_at: datetime,
+    raw_policy: str = RAW_POLICY_FULL,
 ) -> None:
     if not rows:
         return
     site_id = rows[0].site_id if rows else ""
     logger.debug("upsert_authors site_id=%s count=%s", site_id, len(rows), extra={"site_id": site_id})
+    t0 = time.monotonic()
+    batch_size = get_batch_size()
     synced = _ts(synced_at)
-    for r in rows:
-        conn.execute(
-            """
-            INSERT INTO wp_authors (site_id, wp_user_id, login, name, slug, raw_json, synced_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT (site_id, wp_user_id) DO UPDATE SET
-                login = excluded.login, name = excluded.name, slug = excluded.slug,
-                raw_json = excluded.raw_json, synced_at = excluded.synced_at
-            """,
-            (r.site_id, r.wp_user_id, r.login, r.name, r.slug, _json_val(r.raw_json), synced),
-        )
+    _executemany(
+        conn,
+        """
+        INSERT INTO wp_authors (site_id, wp_user_id, login, name, slug, raw_json, synced_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (site_id, wp_user_id) DO UPDATE SET
+            login = excluded.login, name = excluded.name, slug = excluded.slug,
+            raw_json = excluded.raw_json, synced_at = excluded.synced_at
+        """,
+        [
+            (
+                r.site_id, r.wp_user_id, r.login, r.name, r.slug,
+                _json_val(prepare_raw(r.raw_json, raw_policy, compressible=False)[0]), synced,
+            )
+            for r in rows
+        ],
+        batch_size,
+    )
+    log_write("wp_authors", site_id, len(rows), t0, batch_size)
 
 
 def upsert_terms(
     conn: sqlite3.Connection,
     rows: List[TermRow],
     synced_at: datetime,
+    raw_policy: str = RAW_POLICY_FULL,
 ) -> None:
     if not rows:
         return
     site_id = rows[0].site_id if rows else ""
     logger.debug("upsert_terms site_id=%s count=%s", site_id, len(rows), extra={"site_id": site_id})
+    t0 = time.monotonic()
+    batch_size = get_batch_size()
     synced = _ts(synced_at)
-    for r in rows:
-        conn.execute(
-            """
-            INSERT INTO wp_terms (site_id, taxonomy, wp_term_id, name, slug, parent_id, raw_json, synced_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT (site_id, taxonomy, wp_term_id) DO UPDATE SET
-                name = excluded.name, slug = excluded.slug, parent_id = excluded.parent_id,
-                raw_json = excluded.raw_json, synced_at = excluded.synced_at
-            """,
-            (r.site_id, r.taxonomy, r.wp_term_id, r.name, r.slug, r.parent_id, _json_val(r.raw_json), synced),
-        )
+    _executemany(
+        conn,
+        """
+        INSERT INTO wp_terms (site_id, taxonomy, wp_term_id, name, slug, parent_id, raw_json, synced_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (site_id, taxonomy, wp_term_id) DO UPDATE SET
+            name = excluded.name, slug = excluded.slug, parent_id = excluded.parent_id,
+            raw_json = excluded.raw_json, synced_at = excluded.synced_at
+        """,
+        [
+            (
+                r.site_id, r.taxonomy, r.wp_term_id, r.name, r.slug, r.parent_id,
+                _json_val(prepare_raw(r.raw_json, raw_policy, compressible=False)[0]), synced,
+            )
+            for r in rows
+        ],
+        batch_size,
+    )
+    log_write("wp_terms", site_id, len(rows), t0, batch_size)
+
+
+# Не больше параметров в одном IN (...): старые сборки SQLite ограничивают их 999.
+_IN_CHUNK = 500
+
+
+def _stored_hashes(
+    conn: sqlite3.Connection,
+    site_id: str,
+    rows: List[ContentRow],
+) -> Dict[Tuple[str, int], Optional[str]]:
+    """(content_type, wp_id) -> content_hash только для ключей пачки (индекс по PK, не весь сайт)."""
+    keys = {(r.content_type, r.wp_id) for r in rows}
+    wp_ids = sorted({wp_id for _, wp_id in keys})
+    stored: Dict[Tuple[str, int], Optional[str]] = {}
+    for i in range(0, len(wp_ids), _IN_CHUNK):
+        chunk = wp_ids[i:i + _IN_CHUNK]
+        placeholders = ", ".join("?" * len(chunk))
+        for content_type, wp_id, content_hash in conn.execute(
+            f"SELECT content_type, wp_id, content_hash FROM wp_content WHERE site_id = ? AND wp_id IN ({placeholders})",
+            (site_id, *chunk),
+        ):
+            if (content_type, wp_id) in keys:
+                stored[(content_type, wp_id)] = content_hash
+    return stored
 
 
 def upsert_content(
     conn: sqlite3.Connection,
     rows: List[ContentRow],
     synced_at: datetime,
-) -> None:
+    raw_policy: str = RAW_POLICY_FULL,
+) -> Dict[str, int]:
     if not rows:
-        return
+        return {"inserted": 0, "updated": 0, "unchanged": 0}
     site_id = rows[0].site_id if rows else ""
     logger.debug("upsert_content site_id=%s count=%s", site_id, len(rows), extra={"site_id": site_id})
-    synced = _ts(synced_at)
+    t0 = time.monotonic()
+    batch_size = get_batch_size()
+    # Отпечатки уже записанных строк: совпавшие не пишем вовсе, по остальным считаем inserted/updated.
+    stored = _stored_hashes(conn, site_id, rows)
+    changed: List[Tuple[ContentRow, Optional[str]]] = []
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
     for r in rows:
-        conn.execute(
-            """
-            INSERT INTO wp_content (
-                site_id, content_type, wp_id, title, slug, post_content, excerpt,
-                status, author_id, published_at, modified_at,
-                seo_title, seo_description, seo_json, raw_json, synced_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT (site_id, content_type, wp_id) DO UPDATE SET
-                title = excluded.title, slug = excluded.slug, post_content = excluded.post_content,
-                excerpt = excluded.excerpt, status = excluded.status, author_id = excluded.author_id,
-                published_at = excluded.published_at, modified_at = excluded.modified_at,
-                seo_title = excluded.seo_title, seo_description = excluded.seo_description,
-                seo_json = excluded.seo_json, raw_json = excluded.raw_json, synced_at = excluded.synced_at
-            """,
+        key = (r.content_type, r.wp_id)
+        content_hash = stored_content_hash(r.content_hash, raw_policy)
+        if key not in stored:
+            counts["inserted"] += 1
+        elif content_hash is not None and stored[key] == content_hash:
+            counts["unchanged"] += 1
+            continue
+        else:
+            counts["updated"] += 1
+        stored[key] = content_hash
+        changed.append((r, content_hash))
+    synced = _ts(synced_at)
+    raws = [prepare_raw(r.raw_json, raw_policy) for r, _ in changed]
+    _executemany(
+        conn,
+        """
+        INSERT INTO wp_content (
+            site_id, content_type, wp_id, title, slug, post_content, excerpt,
+            status, author_id, published_at, modified_at,
+            seo_title, seo_description, seo_json, raw_json, raw_json_z, synced_at, content_hash
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (site_id, content_type, wp_id) DO UPDATE SET
+            title = excluded.title, slug = excluded.slug, post_content = excluded.post_content,
+            excerpt = excluded.excerpt, status = excluded.status, author_id = excluded.author_id,
+            published_at = excluded.published_at, modified_at = excluded.modified_at,
+            seo_title = excluded.seo_title, seo_description = excluded.seo_description,
+            seo_json = excluded.seo_json, raw_json = excluded.raw_json, raw_json_z = excluded.raw_json_z,
+            synced_at = excluded.synced_at, content_hash = excluded.content_hash
+        """,
+        [
             (
                 r.site_id, r.content_type, r.wp_id, r.title, r.slug, r.post_content, r.excerpt,
                 r.status, r.author_id, _ts(r.published_at), _ts(r.modified_at),
-                r.seo_title, r.seo_description, _json_val(r.seo_json), _json_val(r.raw_json), synced,
-            ),
-        )
+                r.seo_title, r.seo_description, _json_val(r.seo_json), _json_val(raw_json), raw_json_z, synced,
+                content_hash,
+            )
+            for (r, content_hash), (raw_json, raw_json_z) in zip(changed, raws)
+        ],
+        batch_size,
+    )
+    log_write("wp_content", site_id, len(rows), t0, batch_size, counts)
+    return counts
 
 
 def upsert_content_terms(
@@ -186,17 +305,64 @@ def upsert_content_terms(
         return
     site_id = rows[0].site_id if rows else ""
     logger.debug("upsert_content_terms site_id=%s count=%s", site_id, len(rows), extra={"site_id": site_id})
+    t0 = time.monotonic()
+    batch_size = get_batch_size()
     synced = _ts(synced_at)
-    for r in rows:
-        conn.execute(
-            """
-            INSERT INTO wp_content_terms (site_id, content_type, wp_content_id, taxonomy, wp_term_id, synced_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-            ON CONFLICT (site_id, content_type, wp_content_id, taxonomy, wp_term_id) DO UPDATE SET
-                synced_at = excluded.synced_at
-            """,
-            (r.site_id, r.content_type, r.wp_content_id, r.taxonomy, r.wp_term_id, synced),
-        )
+    _executemany(
+        conn,
+        """
+        INSERT INTO wp_content_terms (site_id, content_type, wp_content_id, taxonomy, wp_term_id, synced_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (site_id, content_type, wp_content_id, taxonomy, wp_term_id) DO UPDATE SET
+            synced_at = excluded.synced_at
+        """,
+        [(r.site_id, r.content_type, r.wp_content_id, r.taxonomy, r.wp_term_id, synced) for r in rows],
+        batch_size,
+    )
+    log_write("wp_content_terms", site_id, len(rows), t0, batch_size)
+
+
+def upsert_media(
+    conn: sqlite3.Connection,
+    rows: List[MediaRow],
+    synced_at: datetime,
+) -> None:
+    if not rows:
+        return
+    site_id = rows[0].site_id
+    t0 = time.monotonic()
+    batch_size = get_batch_size()
+    synced = _ts(synced_at)
+    _executemany(
+        conn,
+        """
+        INSERT INTO wp_media (site_id, source_url, sha256, local_path, size_bytes, mime_type, synced_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (site_id, source_url) DO UPDATE SET
+            sha256 = excluded.sha256,
+            local_path = excluded.local_path,
+            size_bytes = excluded.size_bytes,
+            mime_type = excluded.mime_type,
+            synced_at = excluded.synced_at
+        """,
+        [(r.site_id, r.source_url, r.sha256, r.local_path, r.size_bytes, r.mime_type, synced) for r in rows],
+        batch_size,
+    )
+    log_write("wp_media", site_id, len(rows), t0, batch_size)
+
+
+def get_mirrored_media(conn: sqlite3.Connection, site_id: str, urls: Sequence[str]) -> Dict[str, str]:
+    found: Dict[str, str] = {}
+    urls = list(urls)
+    for i in range(0, len(urls), _IN_CHUNK):
+        chunk = urls[i:i + _IN_CHUNK]
+        placeholders = ", ".join("?" * len(chunk))
+        for source_url, local_path in conn.execute(
+            f"SELECT source_url, local_path FROM wp_media WHERE site_id = ? AND source_url IN ({placeholders})",
+            (site_id, *chunk),
+        ):
+            found[source_url] = local_path
+    return found
 
 
 def insert_sync_run(
@@ -233,3 +399,33 @@ def update_sync_run(
         (_ts(finished_at), status, error_code, posts_count, pages_count, terms_count, authors_count, run_id, site_id),
     )
     return cur.rowcount
+
+
+def get_sync_state(conn: sqlite3.Connection, site_id: str) -> Optional[Dict[str, Any]]:
+    row = conn.execute(
+        "SELECT last_modified_gmt, last_run_id, updated_at FROM wp_sync_state WHERE site_id = ?",
+        (site_id,),
+    ).fetchone()
+    if row is None:
+        return None
+    return {"last_modified_gmt": row[0], "last_run_id": row[1], "updated_at": row[2]}
+
+
+def upsert_sync_state(
+    conn: sqlite3.Connection,
+    site_id: str,
+    last_modified_gmt: Optional[datetime],
+    run_id: str,
+) -> None:
+    logger.debug("upsert_sync_state site_id=%s", site_id, extra={"site_id": site_id})
+    conn.execute(
+        """
+        INSERT INTO wp_sync_state (site_id, last_modified_gmt, last_run_id, updated_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (site_id) DO UPDATE SET
+            last_modified_gmt = excluded.last_modified_gmt,
+            last_run_id = excluded.last_run_id,
+            updated_at = excluded.updated_at
+        """,
+        (site_id, _ts(last_modified_gmt), run_id, _ts(datetime.now(timezone.utc))),
+    )
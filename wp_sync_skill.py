@@ -8,9 +8,12 @@ import json
 import logging
 import os
 import sys
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import Callable
 
 from dotenv import load_dotenv
 
@@ -20,31 +23,49 @@ load_dotenv()
 
 from errors import CONFIG_ERROR, WP_AUTH_ERROR  # noqa: E402
 from exit_codes import EXIT_FAILURE, EXIT_PARTIAL, EXIT_SUCCESS  # noqa: E402
+from jsonio import dumps  # noqa: E402
 from logging_setup import set_run_id, setup_app_logging  # noqa: E402
-from wp.client import WPClientError, WPRestClient  # noqa: E402
-from wp.config import load_config, load_sites_list  # noqa: E402
+from wp.client import DEFAULT_POOL_MAXSIZE, WPClientError, WPRestClient  # noqa: E402
+from wp.config import SYNC_MODE_FULL, SYNC_MODE_INCREMENTAL, load_config, load_sites_list  # noqa: E402
 from wp.fetcher import (  # noqa: E402
+    DEFAULT_KEYSET_LATENCY_SEC,
+    DEFAULT_PAGE_CONCURRENCY,
     fetch_categories,
-    fetch_pages,
-    fetch_posts,
     fetch_tags,
     fetch_users,
+    iter_pages,
+    iter_posts,
+    latest_modified,
 )
+from wp.http_cache import HTTP_CACHE_DIR_ENV, HTTPResponseCache  # noqa: E402
+from wp.media import DEFAULT_MEDIA_CONCURRENCY, MEDIA_DIR_ENV, MediaMirror, extract_media_urls  # noqa: E402
 from wp.output import (  # noqa: E402
+    OUTPUT_FORMAT_JSON,
+    OUTPUT_FORMAT_NDJSON,
+    OUTPUT_FORMATS,
+    NdjsonWriter,
     build_content_export_list,
     build_multi_site_output,
     build_multisite_aggregated,
     build_single_site_output,
 )
+from wp.rate_limiter import DEFAULT_MAX_RATE, RATE_STATE_PATH_ENV, AdaptiveRateLimiter, RateStateStore  # noqa: E402
+from wp.raw_payload import RAW_POLICY_FULL, needs_full_payload  # noqa: E402
 from wp.storage import (  # noqa: E402
     STORAGE_BACKEND_ENV,
+    SyncStateError,
+    get_batch_size,
     get_connection,
+    get_mirrored_media,
+    get_sync_state,
     insert_sync_run,
     update_sync_run,
     upsert_authors,
     upsert_content,
     upsert_content_terms,
+    upsert_media,
     upsert_site,
+    upsert_sync_state,
     upsert_terms,
 )
 
@@ -85,6 +106,12 @@ def build_parser() -> argparse.ArgumentParser:
         default=None,
         help="Путь к config/wp-sites.yml (по умолчанию config/wp-sites.yml в корне проекта)",
     )
+    p.add_argument(
+        "--output-format",
+        choices=OUTPUT_FORMATS,
+        default=OUTPUT_FORMAT_JSON,
+        help="json — один документ в конце; ndjson — контент построчно по мере записи, summary последней строкой",
+    )
     return p
 
 
@@ -119,13 +146,38 @@ def run_sync_site(
     timeout_sec: int,
     retries: int,
     requests_per_second: float,
+    page_concurrency: int = DEFAULT_PAGE_CONCURRENCY,
+    sync_mode: str = SYNC_MODE_FULL,
+    raw_json_policy: str = RAW_POLICY_FULL,
+    http_cache: HTTPResponseCache | None = None,
+    keyset_latency_sec: float | None = DEFAULT_KEYSET_LATENCY_SEC,
+    adaptive_rate: bool = False,
+    max_requests_per_second: float = DEFAULT_MAX_RATE,
+    rate_state: RateStateStore | None = None,
+    media_dir: Path | None = None,
+    media_concurrency: int = DEFAULT_MEDIA_CONCURRENCY,
+    emit_content: Callable[[dict], None] | None = None,
 ) -> dict:
-    """Выполнить full sync одного сайта. Возвращает словарь с ключами:
-    summary, contents, content_terms, terms — для формирования JSON output.
+    """Выполнить sync одного сайта: авторы, термины, затем посты и страницы потоком пачек.
+
     Запись в wp_sync_runs создаётся в отдельной транзакции до сетевых вызовов,
     чтобы при ошибке sync run всегда был зафиксирован и обновлён.
+
+    Args:
+        sync_mode: full | incremental (watermark из wp_sync_state, см. wp.fetcher).
+        raw_json_policy: full | slim | compressed (wp.raw_payload).
+        http_cache: Общий для прогона кэш ответов (wp.http_cache); None — без условных GET.
+        keyset_latency_sec: Порог перехода на курсор по дате (wp.fetcher); None/0 — только page=N.
+        adaptive_rate: Адаптивный темп до max_requests_per_second (wp.rate_limiter).
+        rate_state: Выученный темп между прогонами; None — не сохранять.
+        media_dir: Каталог зеркала медиа (wp.media); None — зеркало выключено.
+        emit_content: Потребитель документов контента по мере записи пачек (NDJSON, wp.output).
+
+    Returns:
+        {"summary": ..., "content": [...]} — для JSON output; с emit_content content пуст.
     """
     started_at = datetime.now(timezone.utc)
+    t0 = time.monotonic()
     summary = {
         "run_id": run_id,
         "site_id": site_id,
@@ -137,8 +189,18 @@ def run_sync_site(
         "pages_count": 0,
         "terms_count": 0,
         "authors_count": 0,
+        "sync_mode": sync_mode,
+        "watermark": None,
+        "inserted_count": 0,
+        "updated_count": 0,
+        "unchanged_count": 0,
     }
+    incremental = sync_mode == SYNC_MODE_INCREMENTAL
     synced_at = started_at
+    initial_rate = requests_per_second
+    if adaptive_rate and rate_state is not None:
+        initial_rate = min(rate_state.get(site_id) or requests_per_second, max_requests_per_second)
+    limiter = AdaptiveRateLimiter(initial_rate, adaptive=adaptive_rate, max_rate=max_requests_per_second)
     client = WPRestClient(
         base_url=base_url,
         user=user,
@@ -147,7 +209,15 @@ def run_sync_site(
         max_retries=retries,
         requests_per_second=requests_per_second,
         site_id=site_id,
+        pool_maxsize=max(DEFAULT_POOL_MAXSIZE, page_concurrency),
+        cache=http_cache,
+        limiter=limiter,
     )
+    mirror = None
+    if media_dir is not None:
+        mirror = MediaMirror(
+            media_dir, concurrency=media_concurrency, timeout_sec=timeout_sec, max_retries=retries, limiter=limiter
+        )
 
     # Отдельная короткая транзакция: запись о старте run (commit сразу)
     LOG.info("DB: starting run site_id=%s run_id=%s", site_id, run_id, extra={"site_id": site_id, "run_id": run_id})
@@ -155,6 +225,10 @@ def run_sync_site(
         upsert_site(conn, site_id, base_url, name)
         insert_sync_run(conn, run_id, site_id, started_at)
 
+    def _count_writes(counts: dict) -> None:
+        for key in ("inserted", "updated", "unchanged"):
+            summary[f"{key}_count"] += counts.get(key, 0)
+
     def _update_run(status: str, error_code: str | None) -> None:
         with get_connection() as conn:
             n = update_sync_run(
@@ -178,44 +252,126 @@ def run_sync_site(
                 )
 
     try:
+        modified_after = None
+        if incremental:
+            try:
+                with get_connection() as conn:
+                    state = get_sync_state(conn, site_id)
+            except SyncStateError:
+                raise
+            except Exception as e:
+                raise SyncStateError(f"wp_sync_state: чтение не удалось: {e}") from e
+            modified_after = state["last_modified_gmt"] if state else None
+            summary["watermark"] = modified_after.isoformat() if modified_after else None
+            LOG.info(
+                "Incremental sync site_id=%s modified_after=%s",
+                site_id,
+                summary["watermark"] or "- (первый прогон, полная выгрузка)",
+                extra={"site_id": site_id, "run_id": run_id},
+            )
+
         # Сетевые вызовы вне транзакции БД
-        authors = fetch_users(client, site_id, per_page=per_page, run_id=run_id)
+        authors = fetch_users(client, site_id, per_page=per_page, run_id=run_id, page_concurrency=page_concurrency)
         summary["authors_count"] = len(authors)
 
-        categories = fetch_categories(client, site_id, per_page=per_page, run_id=run_id)
-        tags = fetch_tags(client, site_id, per_page=per_page, run_id=run_id)
+        categories = fetch_categories(client, site_id, per_page=per_page, run_id=run_id, page_concurrency=page_concurrency)
+        tags = fetch_tags(client, site_id, per_page=per_page, run_id=run_id, page_concurrency=page_concurrency)
         all_terms = categories + tags
         summary["terms_count"] = len(all_terms)
 
-        posts, post_terms = fetch_posts(client, site_id, per_page=per_page, run_id=run_id)
-        summary["posts_count"] = len(posts)
-
-        pages, page_terms = fetch_pages(client, site_id, per_page=per_page, run_id=run_id)
-        summary["pages_count"] = len(pages)
-
+        # Авторы и термины — до контента: на wp_terms ссылаются wp_content_terms.
         # Короткие транзакции на запись (без долгого удержания соединения)
         with get_connection() as conn:
-            upsert_authors(conn, authors, synced_at)
+            upsert_authors(conn, authors, synced_at, raw_json_policy)
         with get_connection() as conn:
-            upsert_terms(conn, all_terms, synced_at)
-        with get_connection() as conn:
-            upsert_content(conn, posts, synced_at)
-            upsert_content_terms(conn, post_terms, synced_at)
-        with get_connection() as conn:
-            upsert_content(conn, pages, synced_at)
-            upsert_content_terms(conn, page_terms, synced_at)
+            upsert_terms(conn, all_terms, synced_at, raw_json_policy)
+
+        # Посты и страницы: страница API -> строки -> запись пачками по batch_size.
+        # В памяти — не больше пачки строк с raw_json; для stdout копятся только экспортные документы.
+        batch_size = get_batch_size()
+        full_payload = needs_full_payload(raw_json_policy) or mirror is not None
+        content_export: list = []
+        watermark = modified_after
+
+        def _mirror_media(rows: list) -> None:
+            urls = list(dict.fromkeys(url for r in rows for url in extract_media_urls(r.raw_json, base_url)))
+            if not urls:
+                return
+            with get_connection() as conn:
+                mirrored = get_mirrored_media(conn, site_id, urls)
+            media_rows = mirror.mirror(site_id, urls, mirrored)
+            if media_rows:
+                with get_connection() as conn:
+                    upsert_media(conn, media_rows, synced_at)
+
+        def _store(batches, count_key: str) -> None:
+            rows: list = []
+            terms: list = []
+
+            def flush() -> None:
+                nonlocal watermark
+                with get_connection() as conn:
+                    _count_writes(upsert_content(conn, rows, synced_at, raw_json_policy))
+                    upsert_content_terms(conn, terms, synced_at)
+                summary[count_key] += len(rows)
+                watermark = latest_modified(rows, watermark)
+                docs = build_content_export_list(rows, terms, all_terms)
+                if emit_content is not None:
+                    for doc in docs:
+                        emit_content(doc)
+                else:
+                    content_export.extend(docs)
+                if mirror is not None:
+                    _mirror_media(rows)
+                rows.clear()
+                terms.clear()
+
+            for page_rows, page_terms in batches:
+                rows.extend(page_rows)
+                terms.extend(page_terms)
+                if len(rows) >= batch_size:
+                    flush()
+            if rows:
+                flush()
+
+        _store(
+            iter_posts(
+                client, site_id, per_page=per_page, run_id=run_id, page_concurrency=page_concurrency,
+                modified_after=modified_after, full_payload=full_payload,
+                keyset_latency_sec=keyset_latency_sec,
+            ),
+            "posts_count",
+        )
+        _store(
+            iter_pages(
+                client, site_id, per_page=per_page, run_id=run_id, page_concurrency=page_concurrency,
+                modified_after=modified_after, full_payload=full_payload,
+                keyset_latency_sec=keyset_latency_sec,
+            ),
+            "pages_count",
+        )
+
+        if incremental:
+            # Watermark сдвигается только после записи всего контента: при сбое посередине
+            # следующий прогон начнёт со старого watermark (upsert идемпотентен).
+            try:
+                with get_connection() as conn:
+                    upsert_sync_state(conn, site_id, watermark, run_id)
+            except Exception as e:
+                raise SyncStateError(f"wp_sync_state: запись watermark не удалась: {e}") from e
+            summary["watermark"] = watermark.isoformat() if watermark else None
 
         _update_run("success", None)
         LOG.info("DB: run completed site_id=%s run_id=%s", site_id, run_id, extra={"site_id": site_id, "run_id": run_id})
         return {
             "summary": summary,
-            "contents": posts + pages,
-            "content_terms": post_terms + page_terms,
-            "terms": all_terms,
+            "content": content_export,
         }
 
     except WPClientError as e:
-        summary["status"] = "failed" if summary["authors_count"] == 0 and summary["terms_count"] == 0 else "partial"
+        # Что-то уже записано (в т.ч. пачки контента до сбоя) — partial, иначе failed
+        written = ("authors_count", "terms_count", "posts_count", "pages_count")
+        summary["status"] = "failed" if not any(summary[k] for k in written) else "partial"
         summary["error_code"] = getattr(e, "error_code", WP_AUTH_ERROR)
         summary["partial_failure"] = summary["status"] == "partial"
         LOG.error(
@@ -226,10 +382,35 @@ def run_sync_site(
         _update_run(summary["status"], summary["error_code"])
         return {
             "summary": summary,
-            "contents": [],
-            "content_terms": [],
-            "terms": [],
+            "content": [],
+        }
+    except SyncStateError as e:
+        summary["status"] = "failed"
+        summary["error_code"] = e.error_code
+        LOG.error(
+            "Incremental state error: %s",
+            e,
+            extra={"site_id": site_id, "run_id": run_id, "error_code": e.error_code},
+        )
+        _update_run(summary["status"], summary["error_code"])
+        return {
+            "summary": summary,
+            "content": [],
         }
+    finally:
+        client.close()
+        if mirror is not None:
+            mirror.close()
+            summary["media"] = dict(mirror.stats)
+        summary["duration_sec"] = round(time.monotonic() - t0, 2)
+        summary["wait_sec"] = round(client.wait_sec, 2)
+        if http_cache is not None:
+            summary["cache_hits"] = client.cache_hits
+            summary["cache_misses"] = client.cache_misses
+        if adaptive_rate:
+            summary["rate_limiter"] = limiter.stats()
+            if rate_state is not None:
+                rate_state.set(site_id, limiter.rate)
 
 
 def run_sync(args: argparse.Namespace, run_id: str) -> tuple[int, list]:
@@ -252,10 +433,29 @@ def run_sync(args: argparse.Namespace, run_id: str) -> tuple[int, list]:
         _print_err_utf8(f"Error: site '{args.site}' not found in config")
         return EXIT_FAILURE, []
 
-    summaries = []
-    has_partial = False
-    has_failure = False
-    for site in sites:
+    http_cache = None
+    if cfg.http_cache:
+        cache_dir = Path(os.environ.get(HTTP_CACHE_DIR_ENV) or project_root / "data" / "wp_http_cache")
+        http_cache = HTTPResponseCache(cache_dir, max_bytes=cfg.http_cache_max_mb * 1024 * 1024)
+    media_dir = None
+    if cfg.media_mirror:
+        media_dir = Path(os.environ.get(MEDIA_DIR_ENV) or project_root / "data" / "wp_media")
+    rate_state = None
+    if cfg.adaptive_rate:
+        rate_state = RateStateStore(
+            Path(os.environ.get(RATE_STATE_PATH_ENV) or project_root / "data" / "wp_rate_state.json")
+        )
+
+    output_format = getattr(args, "output_format", None) or OUTPUT_FORMAT_JSON
+    writer = NdjsonWriter(sys.stdout) if output_format == OUTPUT_FORMAT_NDJSON else None
+
+    workers = max(1, min(cfg.max_concurrent_sites, len(sites)))
+    run_t0 = time.monotonic()
+
+    def _sync_site(site) -> tuple[dict, bool]:
+        """Синк одного сайта в потоке планировщика. Возвращает (data, raised)."""
+        queued_sec = round(time.monotonic() - run_t0, 2)
+        site_t0 = time.monotonic()
         try:
             data = run_sync_site(
                 site_id=site.site_id,
@@ -267,51 +467,92 @@ def run_sync(args: argparse.Namespace, run_id: str) -> tuple[int, list]:
                 per_page=cfg.per_page,
                 timeout_sec=cfg.timeout_sec,
                 retries=cfg.retries,
-                requests_per_second=cfg.requests_per_second,
+                requests_per_second=site.requests_per_second or cfg.requests_per_second,
+                page_concurrency=cfg.page_concurrency,
+                sync_mode=cfg.sync_mode,
+                raw_json_policy=cfg.raw_json_policy,
+                http_cache=http_cache,
+                keyset_latency_sec=cfg.keyset_latency_sec,
+                adaptive_rate=cfg.adaptive_rate,
+                max_requests_per_second=cfg.max_requests_per_second,
+                rate_state=rate_state,
+                media_dir=media_dir,
+                media_concurrency=cfg.media_concurrency,
+                emit_content=writer.write if writer is not None else None,
             )
-            summaries.append(data)
+            data["summary"]["queued_sec"] = queued_sec
             s = data["summary"]
             LOG.info(
-                "Site sync summary run_id=%s site_id=%s status=%s posts=%s pages=%s terms=%s authors=%s",
+                "Site sync summary run_id=%s site_id=%s status=%s posts=%s pages=%s terms=%s authors=%s "
+                "duration_sec=%s wait_sec=%s",
                 run_id, s["site_id"], s["status"], s["posts_count"], s["pages_count"], s["terms_count"], s["authors_count"],
+                s.get("duration_sec"), s.get("wait_sec"),
                 extra={"run_id": run_id, "site_id": s["site_id"], "error_code": s.get("error_code")},
             )
-            if data["summary"].get("partial_failure"):
-                has_partial = True
-            if data["summary"].get("status") == "failed":
-                has_failure = True
+            return data, False
         except Exception as e:
-            has_failure = True
             err_code = getattr(e, "error_code", None) or "SYNC_ERROR"
             LOG.error(
                 "Sync failed: %s",
                 e,
                 extra={"site_id": site.site_id, "run_id": run_id, "error_code": err_code},
             )
-            if summaries and any(x["summary"].get("status") == "success" for x in summaries):
-                has_partial = True
-            summaries.append({
+            LOG.info(
+                "Site sync summary run_id=%s site_id=%s status=failed error_code=%s",
+                run_id, site.site_id, err_code,
+                extra={"run_id": run_id, "site_id": site.site_id, "error_code": err_code},
+            )
+            return {
                 "summary": {
                     "run_id": run_id,
                     "site_id": site.site_id,
                     "run_at": datetime.now(timezone.utc).isoformat(),
                     "status": "failed",
-                    "error_code": getattr(e, "error_code", None) or "SYNC_ERROR",
+                    "error_code": err_code,
                     "partial_failure": False,
                     "posts_count": 0,
                     "pages_count": 0,
                     "terms_count": 0,
                     "authors_count": 0,
+                    "sync_mode": cfg.sync_mode,
+                    "watermark": None,
+                    "inserted_count": 0,
+                    "updated_count": 0,
+                    "unchanged_count": 0,
+                    "duration_sec": round(time.monotonic() - site_t0, 2),
+                    "wait_sec": None,
+                    "queued_sec": queued_sec,
                 },
-                "contents": [],
-                "content_terms": [],
-                "terms": [],
-            })
-            LOG.info(
-                "Site sync summary run_id=%s site_id=%s status=failed error_code=%s",
-                run_id, site.site_id, err_code,
-                extra={"run_id": run_id, "site_id": site.site_id, "error_code": err_code},
-            )
+                "content": [],
+            }, True
+
+    # Сайты независимы (свой клиент, свой лимит req/s): до max_concurrent_sites одновременно.
+    # Порядок результатов — как в конфиге.
+    LOG.info(
+        "Sync scheduler run_id=%s sites=%s max_concurrent_sites=%s",
+        run_id, len(sites), workers,
+        extra={"run_id": run_id},
+    )
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wp-site") as pool:
+        results = list(pool.map(_sync_site, sites))
+    wall_sec = round(time.monotonic() - run_t0, 2)
+    if http_cache is not None:
+        LOG.info(
+            "HTTP cache run_id=%s hits=%s misses=%s evictions=%s size_bytes=%s",
+            run_id,
+            sum(d["summary"].get("cache_hits") or 0 for d, _ in results),
+            sum(d["summary"].get("cache_misses") or 0 for d, _ in results),
+            http_cache.evictions,
+            http_cache.size_bytes,
+            extra={"run_id": run_id},
+        )
+
+    summaries = [data for data, _ in results]
+    has_partial = any(d["summary"].get("partial_failure") for d in summaries)
+    has_failure = any(raised or d["summary"].get("status") == "failed" for d, raised in results)
+    # Упавший с исключением сайт при успешных соседях — частичный прогон.
+    if any(raised for _, raised in results) and any(d["summary"].get("status") == "success" for d in summaries):
+        has_partial = True
 
     if has_failure and not has_partial:
         exit_code = EXIT_FAILURE
@@ -321,23 +562,28 @@ def run_sync(args: argparse.Namespace, run_id: str) -> tuple[int, list]:
         exit_code = EXIT_SUCCESS
 
     LOG.info(
-        "Run finished run_id=%s exit_code=%s sites=%s",
-        run_id, exit_code, [(d["summary"]["site_id"], d["summary"]["status"], d["summary"].get("error_code")) for d in summaries],
+        "Run finished run_id=%s exit_code=%s wall_sec=%s sites=%s",
+        run_id, exit_code, wall_sec, [(d["summary"]["site_id"], d["summary"]["status"], d["summary"].get("error_code")) for d in summaries],
         extra={"run_id": run_id},
     )
     if summaries:
         site_outputs = [
-            build_single_site_output(
-                d["summary"],
-                build_content_export_list(d["contents"], d["content_terms"], d["terms"]),
-            )
+            build_single_site_output(d["summary"], d["content"])
             for d in summaries
         ]
         if len(site_outputs) == 1:
             out = site_outputs[0]
         else:
-            out = build_multisite_aggregated(run_id, exit_code, site_outputs)
-        print(json.dumps(out, ensure_ascii=False, indent=2))
+            out = build_multisite_aggregated(
+                run_id,
+                exit_code,
+                site_outputs,
+                timing={"wall_sec": wall_sec, "max_concurrent_sites": workers},
+            )
+        if writer is not None:
+            writer.write_summary(out)
+        else:
+            print(dumps(out, pretty=True))
     return exit_code, summaries
 
 